@@ -0,0 +1,142 @@
+# arrivals.py
+# Sources of rider requests for RideSharingSimulation. Each source is an
+# iterator of (time, start_location, destination, rider_id) tuples in time
+# order; the simulation pulls one request at a time, so a source never has to
+# hold more than a small batch in memory. Sources are picklable, so they
+# can be saved in a simulation checkpoint (see checkpoint.py).
+import json
+
+import numpy as np
+
+
+class SyntheticArrivals:
+    """
+    Poisson arrivals with uniformly random start and destination points.
+
+    Inter-arrival gaps and coordinates are drawn in vectorised batches from a
+    NumPy generator seeded with seed, so runs with the same seed reproduce
+    exactly. Start points are drawn from bounds and destinations from
+    dest_bounds (default: bounds too). The first request arrives at time 0
+    unless first_at_zero is False. rider_id is None (the simulation numbers
+    synthetic riders itself).
+
+    Unlike a generator the source pickles, so a checkpointed run resumes
+    the same stream: the RNG state from before the current batch is saved
+    with the position in it, and the batch is drawn again on load.
+    """
+
+    def __init__(self, mean_arrival_time, bounds, seed=None, batch_size=4096,
+                 dest_bounds=None, first_at_zero=True):
+        self.mean_arrival_time = mean_arrival_time
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+        min_x, min_y, max_x, max_y = bounds
+        dmin_x, dmin_y, dmax_x, dmax_y = dest_bounds if dest_bounds is not None else bounds
+        self.low = np.array([min_x, min_y, dmin_x, dmin_y], dtype=float)
+        self.high = np.array([max_x, max_y, dmax_x, dmax_y], dtype=float)
+        self.t = 0.0
+        self.first = first_at_zero
+        self.batch = []  # the current batch of arrivals
+        self.i = 0  # next one to hand out
+        self.batch_start = None  # (RNG state, t, first) the batch was drawn from
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.i == len(self.batch):
+            self._draw()
+        arrival = self.batch[self.i]
+        self.i += 1
+        return arrival
+
+    def _draw(self):
+        self.batch_start = (self.rng.bit_generator.state, self.t, self.first)
+        gaps = self.rng.exponential(self.mean_arrival_time, self.batch_size)
+        if self.first:
+            gaps[0] = 0.0
+            self.first = False
+        times = self.t + np.cumsum(gaps)
+        points = self.rng.uniform(self.low, self.high, size=(self.batch_size, 4))
+        self.t = float(times[-1])
+        self.batch = [(when, (sx, sy), (ex, ey), None)
+                      for when, (sx, sy, ex, ey) in zip(times.tolist(), points.tolist())]
+        self.i = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["batch"] = None  # redrawn from batch_start
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.batch = []
+        if self.batch_start is not None:
+            i = self.i
+            rng_state, self.t, self.first = self.batch_start
+            self.rng.bit_generator.state = rng_state
+            self._draw()
+            self.i = i
+
+
+class TraceArrivals:
+    """
+    Replay timestamped requests from a JSONL trace, one line per request:
+
+        {"time": 12.5, "start": [x, y], "dest": [x, y], "id": 17}
+
+    "id" is optional. Lines are read lazily, so traces of any length can be
+    replayed. Timestamps must not decrease. Pickling saves the file offset;
+    the unpickled source reopens the trace there.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, 'rb')
+        self.line_no = 0
+        self.last_time = float('-inf')
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.file is None:
+            raise StopIteration
+        for line in self.file:
+            self.line_no += 1
+            if line.strip():
+                return self._parse(line)
+        self.close()
+        raise StopIteration
+
+    def _parse(self, line):
+        where = f"{self.filename}:{self.line_no}"
+        try:
+            record = json.loads(line)
+            when = float(record["time"])
+            start = (float(record["start"][0]), float(record["start"][1]))
+            dest = (float(record["dest"][0]), float(record["dest"][1]))
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise ValueError(f"{where}: bad trace record ({e})") from e
+        if when < self.last_time:
+            raise ValueError(f"{where}: time {when} is earlier than {self.last_time}")
+        self.last_time = when
+        return when, start, dest, record.get("id")
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["file"] = None
+        state["offset"] = self.file.tell() if self.file is not None else None
+        return state
+
+    def __setstate__(self, state):
+        offset = state.pop("offset")
+        self.__dict__.update(state)
+        if offset is not None:
+            self.file = open(self.filename, 'rb')
+            self.file.seek(offset)
@@ -0,0 +1,231 @@
+# bench_suite.py
+# Repeatable benchmark suite on generated maps from 1k to 1M nodes.
+#
+# For every map kind and size it measures map loading (CSV and .bin),
+# nearest-vertex snapping, k-nearest car queries, routing, and end-to-end
+# simulation throughput in events/sec. Results are written as JSON so two
+# runs can be compared for regressions:
+#
+#     python bench_suite.py --sizes 1000 10000 100000 --out baseline.json
+#     ... change code ...
+#     python bench_suite.py --sizes 1000 10000 100000 --out new.json --compare baseline.json
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from compact_graph import CompactGraph, load_graph
+from event_log import NullSink
+from generators import generate_demand, generate_fleet, generate_map
+from quadtree import Quadtree, Rectangle
+from routing import ENGINES, make_engine
+
+
+def _timed(fn, repeat):
+    # Median wall time of repeat calls, and the last result
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def bench_map_load(csv_file, bin_file, repeat):
+    csv_s, graph = _timed(lambda: load_graph(csv_file), repeat)
+    CompactGraph.from_graph(graph).save(bin_file)
+    bin_s, _ = _timed(lambda: CompactGraph.load(bin_file), repeat)
+    return graph, {"csv_load_s": csv_s, "bin_load_s": bin_s,
+                   "csv_edges_per_sec": sum(map(len, graph.adjacency_list.values())) / csv_s}
+
+
+def bench_snapping(graph, points, repeat):
+    index_s, _ = _timed(graph.build_spatial_index, 1)
+    single_s, _ = _timed(lambda: [graph.find_nearest_vertex(p) for p in points], repeat)
+    bulk_s, _ = _timed(lambda: graph.snap_points(points), repeat)
+    return {"index_build_s": index_s, "nearest_us": single_s / len(points) * 1e6,
+            "snap_points_us": bulk_s / len(points) * 1e6}
+
+
+def bench_knn(graph, cars, points, repeat, k=5):
+    min_x, min_y, max_x, max_y = graph.get_bounds()
+
+    def build():
+        tree = Quadtree(Rectangle(min_x, min_y, max_x - min_x + 1, max_y - min_y + 1), capacity=4)
+        for car in cars:
+            tree.insert(car.position, car)
+        return tree
+
+    build_s, tree = _timed(build, 1)
+    query_s, _ = _timed(lambda: [tree.find_k_nearest(p, k) for p in points], repeat)
+    return {"quadtree_build_s": build_s, "knn_query_us": query_s / len(points) * 1e6}
+
+
+def bench_routing(graph, pairs, repeat, engines):
+    out = {}
+    reference = None
+    for name in engines:
+        build_s, engine = _timed(lambda: make_engine(name, graph), 1)
+        query_s, costs = _timed(lambda: [engine.shortest_path(a, b)[1] for a, b in pairs], repeat)
+        if reference is None:
+            reference = costs
+        # every engine must return optimal costs
+        assert all(abs(c - r) <= 1e-9 * max(1.0, abs(r)) for c, r in zip(costs, reference)), name
+        out[f"{name}_build_s"] = build_s
+        out[f"{name}_query_ms"] = query_s / len(pairs) * 1e3
+    return out
+
+
+def bench_simulation(graph, map_file, fleet_size, trace_file, max_time, repeat, seed):
+    from simulation import RideSharingSimulation
+
+    def run():
+        sim = RideSharingSimulation(max_time=max_time, map_file=map_file, graph=graph, seed=seed,
+                                    trace_file=trace_file, event_log=NullSink())
+        sim.add_cars(generate_fleet(graph, fleet_size, seed))
+        sim.run()
+        return sim
+
+    wall_s, sim = _timed(run, repeat)
+    m = sim.calculate_metrics()
+    return {"sim_wall_s": wall_s, "events_per_sec": sim.events.processed / wall_s,
+            "requests_per_sec": m["total_riders_generated"] / wall_s,
+            "dispatch_cpu_per_request_ms": m["dispatch_cpu_per_request"] * 1e3}
+
+
+# Metrics where a larger value is better; everything else is a time
+HIGHER_IS_BETTER = {"csv_edges_per_sec", "events_per_sec", "requests_per_sec"}
+
+
+def run_suite(kinds=("grid", "geometric"), sizes=(1000, 10000), repeat=3, seed=0, queries=2000,
+              routes=50, fleet_size=None, requests=2000, max_time=200.0, ch_max_nodes=5000,
+              alt_max_nodes=200000, workdir=None, log=print):
+    """
+    Generate each map and run every benchmark on it. Returns a list of
+    {"map", "size", "nodes", "edges", "benchmark", "metric", "value"} rows.
+    Maps and traces go to workdir (a temporary directory by default).
+    """
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = workdir or tmp
+        for kind in kinds:
+            for size in sizes:
+                csv_file = os.path.join(workdir, f"{kind}_{size}.csv")
+                bin_file = os.path.join(workdir, f"{kind}_{size}.bin")
+                start = time.perf_counter()
+                nodes, edges = generate_map(kind, size, csv_file, seed=seed)
+                log(f"{kind} {size}: {nodes} nodes, {edges} edges "
+                    f"(generated in {time.perf_counter() - start:.1f}s)")
+
+                def record(benchmark, metrics):
+                    for metric, value in metrics.items():
+                        rows.append({"map": kind, "size": size, "nodes": nodes, "edges": edges,
+                                     "benchmark": benchmark, "metric": metric, "value": value})
+                    log("    " + ", ".join(f"{k}={v:.4g}" for k, v in metrics.items()))
+
+                graph, load = bench_map_load(csv_file, bin_file, repeat)
+                record("map_load", load)
+
+                rng = random.Random(seed)
+                min_x, min_y, max_x, max_y = graph.get_bounds()
+                points = [(rng.uniform(min_x, max_x), rng.uniform(min_y, max_y)) for _ in range(queries)]
+                record("snapping", bench_snapping(graph, points, repeat))
+
+                fleet = fleet_size or max(10, nodes // 100)
+                record("knn", bench_knn(graph, generate_fleet(graph, fleet, seed, placement="uniform"),
+                                        points, repeat))
+
+                node_list = list(graph.node_coordinates.keys())
+                pairs = [(rng.choice(node_list), rng.choice(node_list)) for _ in range(routes)]
+                engines = [name for name in ENGINES
+                           if not (name == "ch" and nodes > ch_max_nodes)
+                           and not (name == "alt" and nodes > alt_max_nodes)]
+                record("routing", bench_routing(graph, pairs, repeat, engines))
+
+                trace_file = os.path.join(workdir, f"{kind}_{size}_demand.jsonl")
+                generate_demand(trace_file, graph.get_bounds(), requests, max_time / requests,
+                                seed=seed, hotspots=4)
+                record("simulation", bench_simulation(graph, csv_file, fleet, trace_file, max_time,
+                                                      repeat, seed))
+                del graph
+    return rows
+
+
+def environment():
+    # What the numbers depend on, stored with them
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"python": sys.version.split()[0], "numpy": np.__version__, "platform": platform.platform(),
+            "processor": platform.processor(), "cpus": os.cpu_count(), "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def compare(results, baseline, threshold=0.10):
+    """
+    Rows whose value got worse than the baseline by more than threshold
+    (a fraction), matched on map, size, benchmark and metric.
+    """
+    before = {(r["map"], r["size"], r["benchmark"], r["metric"]): r["value"] for r in baseline}
+    changes = []
+    for r in results:
+        old = before.get((r["map"], r["size"], r["benchmark"], r["metric"]))
+        if not old or not r["value"]:
+            continue
+        # Express every change as a slowdown factor: > 1 means worse
+        slowdown = old / r["value"] if r["metric"] in HIGHER_IS_BETTER else r["value"] / old
+        changes.append(dict(r, baseline=old, slowdown=slowdown, regression=slowdown > 1 + threshold))
+    return changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark suite on generated maps")
+    parser.add_argument("--maps", nargs="+", default=["grid", "geometric"], choices=["grid", "geometric"])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000],
+                        help="Approximate node counts (up to 1000000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed repetitions; the median is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fleet-size", type=int, default=None, help="Cars (default: nodes / 100)")
+    parser.add_argument("--requests", type=int, default=2000, help="Riders in the simulated demand trace")
+    parser.add_argument("--max-time", type=float, default=200.0, help="Simulated time per run")
+    parser.add_argument("--ch-max-nodes", type=int, default=5000,
+                        help="Skip contraction hierarchies above this many nodes")
+    parser.add_argument("--alt-max-nodes", type=int, default=200000,
+                        help="Skip ALT above this many nodes")
+    parser.add_argument("--workdir", type=str, default=None, help="Keep generated maps and traces here")
+    parser.add_argument("--out", type=str, default="bench_results.json", help="JSON results file")
+    parser.add_argument("--compare", type=str, default=None, help="Baseline results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    rows = run_suite(args.maps, args.sizes, repeat=args.repeat, seed=args.seed, fleet_size=args.fleet_size,
+                     requests=args.requests, max_time=args.max_time, ch_max_nodes=args.ch_max_nodes,
+                     alt_max_nodes=args.alt_max_nodes, workdir=args.workdir)
+    settings = {k: v for k, v in vars(args).items() if k not in ("out", "compare", "threshold", "workdir")}
+    with open(args.out, "w") as f:
+        json.dump({"environment": environment(), "settings": settings, "results": rows}, f, indent=2)
+    print(f"Wrote {len(rows)} results to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        changes = compare(rows, baseline, args.threshold)
+        regressions = [c for c in changes if c["regression"]]
+        print(f"\n{'map':>10} {'size':>8} {'metric':>28} {'baseline':>12} {'now':>12} {'slowdown':>9}")
+        for c in changes:
+            flag = "  REGRESSION" if c["regression"] else ""
+            print(f"{c['map']:>10} {c['size']:>8} {c['metric']:>28} {c['baseline']:>12.4g} "
+                  f"{c['value']:>12.4g} {c['slowdown']:>8.2f}x{flag}")
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,341 @@
+# benchmark.py
+# Micro-benchmarks for the simulator's hot paths.
+# Run with: python benchmark.py
+import heapq
+import math
+import os
+import random
+import tempfile
+import time
+
+from compact_graph import CompactGraph
+from event_log import (DROPOFF, PICKUP, BinarySink, JsonlSink, NullSink, PrintSink,
+                       RingBufferSink, read_binary_log)
+from events import BACKENDS, EventQueue
+from generators import generate_fleet, generate_map
+from graph import Graph
+from quadtree import Quadtree, Rectangle
+from routing import ENGINES, make_engine
+
+
+class _BenchCar:
+    # Minimal stand-in for car.Car with plain attributes, so the quadtree
+    # timings do not include the FleetState-backed property lookups
+    def __init__(self, car_id, position, available):
+        self.car_id = car_id
+        self.position = position
+        self.available = available
+
+
+def _collect_cars(node, out):
+    out.extend(zip(node.points, node.items))
+    if node.divided:
+        for child in (node.nw, node.ne, node.sw, node.se):
+            _collect_cars(child, out)
+
+
+def collect_and_sort_k_nearest(quadtree, query_point, k=5, predicate=None):
+    # The previous find_k_nearest: collect every point, sort, filter afterwards
+    all_pts = []
+    _collect_cars(quadtree, all_pts)
+    all_pts.sort(key=lambda pc: math.hypot(pc[0][0] - query_point[0], pc[0][1] - query_point[1]))
+    if predicate is not None:
+        all_pts = [pc for pc in all_pts if predicate(pc[1])]
+    return [p for p, _ in all_pts[:k]]
+
+
+def _time_queries(fn, queries):
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def bench_k_nearest(n_cars, n_queries=50, k=5, available_fraction=0.5, size=1000.0, seed=0):
+    rng = random.Random(seed)
+    tree = Quadtree(Rectangle(0, 0, size, size), capacity=4)
+    for i in range(n_cars):
+        pos = (rng.uniform(0, size), rng.uniform(0, size))
+        tree.insert(pos, _BenchCar(i, pos, rng.random() < available_fraction))
+    queries = [(rng.uniform(0, size), rng.uniform(0, size)) for _ in range(n_queries)]
+    available = lambda car: car.available
+
+    # Both approaches must agree on the filtered result
+    for q in queries[:5]:
+        assert (tree.find_k_nearest(q, k, predicate=available) ==
+                collect_and_sort_k_nearest(tree, q, k, predicate=available))
+
+    old = _time_queries(lambda q: collect_and_sort_k_nearest(tree, q, k, predicate=available), queries)
+    new = _time_queries(lambda q: tree.find_k_nearest(q, k, predicate=available), queries)
+    return {"cars": n_cars, "collect_sort_ms": old * 1000, "best_first_ms": new * 1000,
+            "speedup": old / new if new else float('inf')}
+
+
+def bench_quadtree_updates(n_cars, n_moves=20_000, k=5, size=1000.0, seed=0):
+    # Fleet churn: cars repeatedly leave the index and come back elsewhere
+    rng = random.Random(seed)
+    positions = [(rng.uniform(0, size), rng.uniform(0, size)) for _ in range(n_cars)]
+    cars = [_BenchCar(i, p, True) for i, p in enumerate(positions)]
+    boundary = Rectangle(0, 0, size, size)
+
+    start = time.perf_counter()
+    tree = Quadtree(boundary, capacity=4)
+    for p, car in zip(positions, cars):
+        tree.insert(p, car)
+    insert_s = time.perf_counter() - start
+    start = time.perf_counter()
+    Quadtree.bulk_load(boundary, positions, cars)
+    bulk_s = time.perf_counter() - start
+
+    # Short hops, like position updates from moving cars
+    step = size / 100
+
+    def hops():
+        out = []
+        for _ in range(n_moves):
+            i = rng.randrange(n_cars)
+            x, y = cars[i].position
+            p = (min(max(x + rng.uniform(-step, step), 0.0), size - 1e-9),
+                 min(max(y + rng.uniform(-step, step), 0.0), size - 1e-9))
+            out.append((i, p))
+        return out
+
+    moves = hops()
+    start = time.perf_counter()
+    for i, p in moves:
+        tree.remove(cars[i].position)
+        cars[i].position = p
+        tree.insert(p, cars[i])
+    reinsert_s = time.perf_counter() - start
+    moves = hops()
+    start = time.perf_counter()
+    for i, p in moves:
+        cars[i].position = p
+        tree.move(i, p)
+    move_s = time.perf_counter() - start
+
+    queries = [(rng.uniform(0, size), rng.uniform(0, size)) for _ in range(200)]
+    packed = tree.pack()
+    for q in queries[:5]:
+        assert ([c.car_id for c in tree.find_k_nearest_cars(q, k)] ==
+                [c.car_id for c in packed.find_k_nearest_cars(q, k)])
+    nodes, leaves, depth = tree.depth_stats()
+    return {"cars": n_cars, "insert_us": insert_s / n_cars * 1e6, "bulk_us": bulk_s / n_cars * 1e6,
+            "reinsert_us": reinsert_s / n_moves * 1e6, "move_us": move_s / n_moves * 1e6,
+            "tree_query_us": _time_queries(lambda q: tree.find_k_nearest_cars(q, k), queries) * 1e6,
+            "packed_query_us": _time_queries(lambda q: packed.find_k_nearest_cars(q, k), queries) * 1e6,
+            "nodes": nodes, "depth": depth}
+
+
+def grid_map_file(directory, side, seed=0):
+    # side x side grid from generators.grid_map (the maps bench_suite.py
+    # uses too), written to directory and loaded as a Graph
+    csv_file = os.path.join(directory, "grid.csv")
+    generate_map("grid", side * side, csv_file, seed=seed)
+    g = Graph()
+    g.load_map_data(csv_file)
+    return csv_file, g
+
+
+def bench_routing(side, n_queries=30, seed=0):
+    with tempfile.TemporaryDirectory() as tmp:
+        _, g = grid_map_file(tmp, side, seed)
+    rng = random.Random(seed)
+    nodes = list(g.adjacency_list)
+    pairs = [(rng.choice(nodes), rng.choice(nodes)) for _ in range(n_queries)]
+    results = []
+    reference = None
+    for name in ENGINES:
+        start = time.perf_counter()
+        engine = make_engine(name, g)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        costs = [engine.shortest_path(a, b)[1] for a, b in pairs]
+        query = (time.perf_counter() - start) / n_queries
+        if reference is None:
+            reference = costs
+        # every engine must return optimal costs
+        assert all(abs(c - r) < 1e-9 for c, r in zip(costs, reference)), name
+        results.append({"engine": name, "nodes": len(nodes), "build_ms": build * 1000,
+                        "query_ms": query * 1000,
+                        "settled_per_query": engine.stats["nodes_settled"] / n_queries})
+    return results
+
+
+def linear_scan_nearest(graph, point):
+    # The previous find_nearest_vertex: full scan with math.sqrt
+    best_node, best_distance = None, float('inf')
+    for node_id, (node_x, node_y) in graph.node_coordinates.items():
+        distance = math.sqrt((point[0] - node_x)**2 + (point[1] - node_y)**2)
+        if distance < best_distance:
+            best_distance, best_node = distance, node_id
+    return best_node
+
+
+def bench_snapping(side, n_points=2000, seed=0):
+    with tempfile.TemporaryDirectory() as tmp:
+        _, g = grid_map_file(tmp, side, seed)
+    g.build_spatial_index()
+    rng = random.Random(seed)
+    pts = [(rng.uniform(0, side - 1), rng.uniform(0, side - 1)) for _ in range(n_points)]
+    sample = pts[:100]
+    assert [linear_scan_nearest(g, p) for p in sample] == [g.find_nearest_vertex(p) for p in sample]
+    old = _time_queries(lambda p: linear_scan_nearest(g, p), sample)
+    grid = _time_queries(g.find_nearest_vertex, pts)
+    start = time.perf_counter()
+    g.snap_points(pts)
+    bulk = (time.perf_counter() - start) / n_points
+    return {"nodes": side * side, "linear_us": old * 1e6, "grid_us": grid * 1e6, "bulk_us": bulk * 1e6}
+
+
+def bench_map_load(side, seed=0):
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, "map.csv")
+        bin_file = os.path.join(tmp, "map.bin")
+        generate_map("grid", side * side, csv_file, seed=seed)
+        CompactGraph.from_csv(csv_file).save(bin_file)
+
+        start = time.perf_counter()
+        report = Graph().load_map_data(csv_file)
+        csv_time = time.perf_counter() - start
+        start = time.perf_counter()
+        compact = CompactGraph.load(bin_file)
+        bin_time = time.perf_counter() - start
+        del compact
+    return {"nodes": side * side, "csv_ms": csv_time * 1000, "bin_ms": bin_time * 1000,
+            "edges_per_sec": report.edges_per_sec}
+
+
+def bench_dispatch(side=30, n_cars=60, mean_arrival_time=0.2, max_time=200, seed=0):
+    # Greedy vs batched dispatch on the same demand: wait time and CPU per request
+    from simulation import RideSharingSimulation
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file, g = grid_map_file(tmp, side, seed)
+        for policy in ("greedy", "batch"):
+            sim = RideSharingSimulation(max_time=max_time, mean_arrival_time=mean_arrival_time,
+                                        map_file=csv_file, dispatch=policy, seed=seed,
+                                        event_log=NullSink())
+            sim.add_cars(generate_fleet(g, n_cars, seed, placement="uniform"))
+            sim.run()
+            m = sim.calculate_metrics()
+            results.append({"policy": policy, "assigned": m["riders_assigned"],
+                            "avg_wait": m["avg_wait_time"],
+                            "cpu_ms_per_request": m["dispatch_cpu_per_request"] * 1000})
+    return results
+
+
+def _handle_event(car, rider):
+    pass
+
+
+def _legacy_hold(pending, n_events, rng):
+    # The previous loop: (time, seq, kind, data) tuples on heapq and an
+    # if/elif chain on the kind string
+    heap = []
+    kinds = ("rider_request", "pickup_arrival", "ride_complete")
+    for i in range(pending):
+        heapq.heappush(heap, (rng.expovariate(1.0) * pending, i, kinds[i % 3], (i, None)))
+    seq = pending
+    start = time.perf_counter()
+    for _ in range(n_events):
+        now, _, kind, data = heapq.heappop(heap)
+        if kind == "rider_request":
+            _handle_event(*data)
+        elif kind == "pickup_arrival":
+            _handle_event(*data)
+        elif kind == "ride_complete":
+            _handle_event(*data)
+        heapq.heappush(heap, (now + rng.expovariate(1.0) * pending, seq, kind, data))
+        seq += 1
+    return time.perf_counter() - start
+
+
+def _queue_hold(backend, pending, n_events, rng):
+    queue = EventQueue(backend)
+    kinds = ("rider_request", "pickup_arrival", "ride_complete")
+    for kind in kinds:
+        queue.register(kind, _handle_event)
+    for i in range(pending):
+        queue.schedule(rng.expovariate(1.0) * pending, kinds[i % 3], i, None)
+    start = time.perf_counter()
+    for _ in range(n_events):
+        event = queue.pop()
+        event.handler(*event.args)
+        queue.schedule(event.time + rng.expovariate(1.0) * pending, event.kind, *event.args)
+    return time.perf_counter() - start
+
+
+def bench_event_queue(pending, n_events=200_000, seed=0):
+    # Classic "hold" model: pop the next event, handle it, schedule one more,
+    # so the pending count stays fixed
+    results = {"pending": pending}
+    results["legacy"] = n_events / _legacy_hold(pending, n_events, random.Random(seed))
+    for backend in BACKENDS:
+        results[backend] = n_events / _queue_hold(backend, pending, n_events, random.Random(seed))
+    return results
+
+
+def bench_event_log(n_events=200_000):
+    # Records per second through each sink, as the simulation calls them
+    # (the enabled check first, then log)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull:
+        sinks = [("quiet", NullSink()), ("print", PrintSink(devnull)), ("ring", RingBufferSink()),
+                 ("jsonl", JsonlSink(os.path.join(tmp, "log.jsonl"))),
+                 ("binary", BinarySink(os.path.join(tmp, "log.bin"))),
+                 ("binary+thread", BinarySink(os.path.join(tmp, "log2.bin"), background=True))]
+        for name, sink in sinks:
+            start = time.perf_counter()
+            for i in range(n_events):
+                if sink.enabled:
+                    sink.log(i * 0.01, PICKUP if i % 2 else DROPOFF, i % 500, i // 2)
+            sink.close()
+            results.append({"sink": name, "events_per_sec": n_events / (time.perf_counter() - start)})
+        assert len(read_binary_log(os.path.join(tmp, "log.bin"))) == n_events
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{'cars':>8} {'collect+sort ms':>16} {'best-first ms':>14} {'speedup':>8}")
+    for n in (10_000, 100_000):
+        r = bench_k_nearest(n)
+        print(f"{r['cars']:>8} {r['collect_sort_ms']:>16.3f} {r['best_first_ms']:>14.3f} {r['speedup']:>7.1f}x")
+
+    print(f"\n{'cars':>8} {'insert us':>10} {'bulk us':>8} {'reinsert us':>12} {'move us':>8} "
+          f"{'query us':>9} {'packed us':>10} {'nodes':>7} {'depth':>6}")
+    for n in (10_000, 100_000):
+        r = bench_quadtree_updates(n)
+        print(f"{r['cars']:>8} {r['insert_us']:>10.2f} {r['bulk_us']:>8.2f} {r['reinsert_us']:>12.2f} "
+              f"{r['move_us']:>8.2f} {r['tree_query_us']:>9.1f} {r['packed_query_us']:>10.1f} "
+              f"{r['nodes']:>7} {r['depth']:>6}")
+
+    print(f"\n{'engine':>8} {'nodes':>8} {'build ms':>10} {'query ms':>10} {'settled/query':>14}")
+    for side in (50, 100):
+        for r in bench_routing(side):
+            print(f"{r['engine']:>8} {r['nodes']:>8} {r['build_ms']:>10.1f} {r['query_ms']:>10.3f} "
+                  f"{r['settled_per_query']:>14.1f}")
+
+    print(f"\n{'nodes':>8} {'linear us':>10} {'grid us':>10} {'snap_points us':>15}")
+    for side in (100, 300):
+        r = bench_snapping(side)
+        print(f"{r['nodes']:>8} {r['linear_us']:>10.1f} {r['grid_us']:>10.2f} {r['bulk_us']:>15.2f}")
+
+    print(f"\n{'nodes':>8} {'csv load ms':>12} {'parse edges/s':>14} {'bin load ms':>12}")
+    for side in (100, 300):
+        r = bench_map_load(side)
+        print(f"{r['nodes']:>8} {r['csv_ms']:>12.1f} {r['edges_per_sec']:>14,.0f} {r['bin_ms']:>12.2f}")
+
+    print(f"\n{'policy':>8} {'assigned':>9} {'avg wait':>9} {'cpu ms/request':>15}")
+    for r in bench_dispatch():
+        print(f"{r['policy']:>8} {r['assigned']:>9} {r['avg_wait']:>9.2f} {r['cpu_ms_per_request']:>15.3f}")
+
+    print(f"\n{'pending':>9} {'legacy ev/s':>12} {'heap ev/s':>12} {'calendar ev/s':>14}")
+    for pending in (1_000, 100_000, 1_000_000):
+        r = bench_event_queue(pending)
+        print(f"{r['pending']:>9} {r['legacy']:>12,.0f} {r['heap']:>12,.0f} {r['calendar']:>14,.0f}")
+
+    print(f"\n{'event log sink':>14} {'events/s':>12}")
+    for r in bench_event_log():
+        print(f"{r['sink']:>14} {r['events_per_sec']:>12,.0f}")
@@ -1,101 +1,240 @@
 # car.py
+# Fleet state for the simulation, stored as a struct of arrays: one NumPy
+# array per attribute (id, x, y, availability, completed rides) instead of
+# one object dict per car. Car is a thin view onto a row of that store.
+import numpy as np
 
+# Time per unit distance for calculate_route without a road graph
+TRAVEL_SPEED_FACTOR = 0.5
+
+
+class FleetState:
+    """
+    Struct-of-arrays storage for every car in a simulation. Row i belongs
+    to cars[i]; arrays grow by doubling. Vectorised code (snapping,
+    plotting, metrics) can use x, y and available directly, sliced to
+    len(fleet). The car_id column switches to object dtype if a
+    non-integer id (e.g. 'A') is ever added, as in TripLog.
+    """
+
+    _COLUMNS = (("car_id", np.int64), ("x", np.float64), ("y", np.float64),
+                ("available", np.bool_), ("rides_completed", np.int64))
+
+    def __init__(self, capacity=16):
+        self.size = 0
+        for name, dtype in self._COLUMNS:
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.cars = []  # Car views, in row order
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        capacity = 2 * len(self.x)
+        for name, _ in self._COLUMNS:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def attach(self, car):
+        # Move a detached car's values into a new row and make it a view
+        if car._fleet is not None:
+            raise ValueError(f"Car {car.car_id} already belongs to a fleet")
+        if self.size == len(self.x):
+            self._grow()
+        i = self.size
+        car_id = car._car_id
+        if self.car_id.dtype == np.int64 and not (isinstance(car_id, (int, np.integer))
+                                                  and not isinstance(car_id, bool)):
+            self.car_id = self.car_id.astype(object)
+        self.car_id[i] = car_id
+        self.x[i], self.y[i] = car._position
+        self.available[i] = car._available
+        self.rides_completed[i] = car._rides_completed
+        car._fleet, car._row = self, i
+        self.cars.append(car)
+        self.size += 1
+
+    def detach(self, car):
+        # Copy the row back into the car, then fill the gap with the last row
+        if car._fleet is not self:
+            raise ValueError(f"Car {car.car_id} does not belong to this fleet")
+        i = car._row
+        car._car_id, car._position = car.car_id, car.position
+        car._available, car._rides_completed = car.available, car.rides_completed
+        car._fleet = car._row = None
+
+        last = self.size - 1
+        if i != last:
+            for name, _ in self._COLUMNS:
+                column = getattr(self, name)
+                column[i] = column[last]
+            moved = self.cars[last]
+            moved._row = i
+            self.cars[i] = moved
+        self.cars.pop()
+        self.size -= 1
+
+    def positions(self):
+        """(n, 2) array of car positions."""
+        return np.column_stack((self.x[:self.size], self.y[:self.size]))
+
+
+def _restore_car(car_id, position, available, rides_completed, route, node):
+    car = Car(car_id, position)
+    car.available = available
+    car.rides_completed = rides_completed
+    car.route = route
+    car.node = node
+    return car
 
-# Constants
-TRAVEL_SPEED_FACTOR = 0.5  # Time per unit distance (for placeholder navigation)
 
 class Car:
-   def __init__(self, car_id, location):
-       """
-       Initialize a car for the ride-sharing simulation.
-       
-       Args:
-           car_id: Unique identifier for the car
-           location: Tuple (x, y) representing car's current position
-       """
-       self.id = car_id
-       self.location = location
-       self.route = []         # Planned path to destination
-       self.route_time = 0     # Expected travel time for current route
-       
-       # Status control - tracks car's current operational state
-       self.status = "available"  # available, en_route_to_pickup, en_route_to_destination
-       self.assigned_rider = None  # Link to rider when dispatched
-
-   def calculate_route(self, destination, graph=None):
-       """
-       Calculate route to destination using pathfinding algorithm.
-       Currently uses Manhattan distance as placeholder for realistic pathfinding.
-       
-       Args:
-           destination: Tuple (x, y) representing target location
-           graph: Graph object for pathfinding (None for prototype)
-       """
-       if graph:
-           # For final version with your graph and pathfinding:
-           # Use Dijkstra's algorithm or A* for optimal routing
-           pass
-       
-       # Placeholder calculation for prototype (Manhattan distance)
-       # In real implementation, this would use actual road network
-       distance = abs(self.location[0] - destination[0]) + abs(self.location[1] - destination[1])
-       self.route_time = distance * TRAVEL_SPEED_FACTOR
-       self.route = [self.location, destination]  # Simple two-point route
-
-   def is_available(self):
-       """
-       Check if car is available for assignment.
-       Used by simulation to filter available fleet for dispatch.
-       """
-       return self.status == "available"
-
-   def assign_rider(self, rider):
-       """
-       Assign a rider to this car and set status.
-       Transitions car from available to pickup mode.
-       """
-       self.assigned_rider = rider
-       self.status = "en_route_to_pickup"
-       # Calculate route to pickup location for time estimation
-       self.calculate_route(rider.start_location)
-
-   def complete_pickup(self):
-       """
-       Mark that car has completed pickup.
-       Transitions from pickup phase to dropoff phase of trip.
-       """
-       if self.assigned_rider:
-           # Move car to rider's pickup location
-           self.location = self.assigned_rider.start_location
-           self.status = "en_route_to_destination"
-           # Calculate route to final destination
-           self.calculate_route(self.assigned_rider.destination)
-
-   def complete_dropoff(self):
-       """
-       Mark that car has completed dropoff.
-       Returns car to available state and clears assignment.
-       """
-       if self.assigned_rider:
-           # Move car to dropoff location
-           self.location = self.assigned_rider.destination
-           # Reset car to available state
-           self.status = "available"
-           self.assigned_rider = None
-           self.route = []
-           self.route_time = 0
-
-   def __str__(self):
-       """
-       String representation of the car for debugging and logging.
-       Shows current status and assignment information.
-       """
-       rider_info = f" (assigned to Rider {self.assigned_rider.id})" if self.assigned_rider else ""
-       return f"Car {self.id} at {self.location} - Status: {self.status}{rider_info}"
-
-   def __repr__(self):
-       """
-       Technical representation of the car for development debugging.
-       Provides concise object state information.
-       """
-       return f"Car(id={self.id}, location={self.location}, status='{self.status}')"
\ No newline at end of file
+    """
+    A car in the simulation. Until it is added to a simulation (attached to
+    its FleetState) the values live on the object itself; afterwards
+    car_id, position, available and rides_completed read and write the
+    fleet arrays. status and assigned_rider are derived from availability
+    and the pending trip events.
+    """
+
+    __slots__ = ("_fleet", "_row", "_car_id", "_position", "_available", "_rides_completed",
+                 "route", "route_start", "route_time", "node", "trip_events", "_rider", "_phase")
+
+    def __init__(self, car_id, start_position):
+        self._fleet = None
+        self._row = None
+        self._car_id = car_id  # Unique identifier for the car
+        self._position = start_position  # Current (x, y) position
+        self._available = True  # True if the car can take a ride
+        self._rides_completed = 0  # Counter of completed trips
+        self.route = []  # Graph nodes still ahead on the current trip (pickup leg + ride)
+        self.route_start = 0.0  # Time the car is at route[0]
+        self.node = None  # Cached nearest graph node to position while parked
+        self.trip_events = ()  # Pending (pickup, dropoff) events of the current trip
+        self.route_time = 0  # Expected travel time of the route (calculate_route)
+        self._rider = None  # Rider and trip phase set by assign_rider() outside a simulation
+        self._phase = "en_route_to_pickup"
+
+    @property
+    def car_id(self):
+        if self._fleet is None:
+            return self._car_id
+        column = self._fleet.car_id
+        return int(column[self._row]) if column.dtype == np.int64 else column[self._row]
+
+    @property
+    def position(self):
+        if self._fleet is None:
+            return self._position
+        return (float(self._fleet.x[self._row]), float(self._fleet.y[self._row]))
+
+    @position.setter
+    def position(self, value):
+        if self._fleet is None:
+            self._position = value
+        else:
+            self._fleet.x[self._row], self._fleet.y[self._row] = value
+
+    @property
+    def available(self):
+        if self._fleet is None:
+            return self._available
+        return bool(self._fleet.available[self._row])
+
+    @available.setter
+    def available(self, value):
+        if self._fleet is None:
+            self._available = value
+        else:
+            self._fleet.available[self._row] = value
+
+    @property
+    def rides_completed(self):
+        if self._fleet is None:
+            return self._rides_completed
+        return int(self._fleet.rides_completed[self._row])
+
+    @rides_completed.setter
+    def rides_completed(self, value):
+        if self._fleet is None:
+            self._rides_completed = value
+        else:
+            self._fleet.rides_completed[self._row] = value
+
+    # Older names for the same attributes
+    id = car_id
+    location = position
+
+    @property
+    def assigned_rider(self):
+        if self.trip_events:
+            return self.trip_events[1].args[1]
+        return self._rider
+
+    @property
+    def status(self):
+        # available, en_route_to_pickup or en_route_to_destination
+        if self.available:
+            return "available"
+        if self.trip_events:
+            return "en_route_to_pickup" if self.trip_events[0].active else "en_route_to_destination"
+        return self._phase
+
+    def is_available(self):
+        return self.available
+
+    def calculate_route(self, destination, graph=None):
+        """
+        Route to destination: the shortest path between the nearest graph
+        nodes if a graph is given, otherwise a straight two-point route
+        timed by Manhattan distance.
+        """
+        if graph is not None:
+            from dijkstra import find_shortest_path
+            path, cost = find_shortest_path(graph, graph.find_nearest_vertex(self.position),
+                                            graph.find_nearest_vertex(destination))
+            self.route, self.route_time = path or [], cost
+            return
+        distance = abs(self.position[0] - destination[0]) + abs(self.position[1] - destination[1])
+        self.route_time = distance * TRAVEL_SPEED_FACTOR
+        self.route = [self.position, destination]
+
+    # Manual trip control, for using cars outside the event-driven simulation
+    def assign_rider(self, rider):
+        self._rider = rider
+        self._phase = "en_route_to_pickup"
+        self.available = False
+        self.calculate_route(rider.start_location)
+
+    def complete_pickup(self):
+        rider = self._rider
+        if rider:
+            self.position = rider.start_location
+            self._phase = "en_route_to_destination"
+            self.calculate_route(rider.destination)
+
+    def complete_dropoff(self):
+        rider = self._rider
+        if rider:
+            self.position = rider.destination
+            self.available = True
+            self._rider = None
+            self.route = []
+            self.route_time = 0
+
+    def __reduce__(self):
+        # Pickles as a detached car (e.g. when handed to another process);
+        # pending events belong to the sending simulation and are dropped
+        return _restore_car, (self.car_id, self.position, self.available, self.rides_completed,
+                              self.route, self.node)
+
+    def __str__(self):
+        rider = self.assigned_rider
+        rider_info = f" (assigned to Rider {rider.id})" if rider else ""
+        return f"Car {self.car_id} at {self.position} - Status: {self.status}{rider_info}"
+
+    def __repr__(self):
+        # Helpful for printing car info during debugging
+        return f"Car({self.car_id}, pos={self.position}, available={self.available})"
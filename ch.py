@@ -0,0 +1,316 @@
+# ch.py
+# Contraction hierarchy (CH) preprocessing and queries over a Graph.
+#
+# Offline step (writes map.csv.ch next to the map):
+#     python ch.py map.csv
+#
+# Nodes are contracted one at a time in order of importance; whenever removing
+# a node would lengthen a shortest path between two of its neighbours, a
+# shortcut edge is added. A query then only needs two small Dijkstra searches
+# that move "upwards" in the order, one from each end.
+import hashlib
+import heapq
+import json
+import os
+import tempfile
+
+
+class ContractionHierarchy:
+    def __init__(self):
+        self.rank = {}      # node -> contraction order (higher = more important)
+        self.up_out = {}    # node -> list of (higher_node, weight): forward search edges
+        self.up_in = {}     # node -> list of (higher_node, weight): backward search edges
+        self.middle = {}    # (u, v) -> contracted node a shortcut u->v skips over
+        self.fingerprint = None
+        self.last_settled = 0  # nodes settled by the most recent query
+
+    # ------------------------------------------------------------------ build
+    @classmethod
+    def build(cls, graph, witness_limit=50):
+        """
+        Contract every node of graph. witness_limit caps the number of nodes a
+        witness search may settle; when it is hit the shortcut is added anyway,
+        which costs a little query speed but never correctness.
+        """
+        ch = cls()
+        ch.fingerprint = _fingerprint(graph)
+        out_edges = {n: {} for n in graph.adjacency_list}
+        in_edges = {n: {} for n in graph.adjacency_list}
+        for u, neighbors in graph.adjacency_list.items():
+            for v, w in neighbors:
+                if u == v:
+                    continue
+                out_edges.setdefault(v, {})
+                in_edges.setdefault(v, {})
+                if w < out_edges[u].get(v, float('inf')):
+                    out_edges[u][v] = w
+                    in_edges[v][u] = w
+
+        contracted_neighbors = {n: 0 for n in out_edges}
+        level = {n: 0 for n in out_edges}  # depth of the hierarchy below each node
+
+        def priority(v):
+            # Edge difference keeps the graph sparse; contracted neighbours and
+            # level spread contraction evenly instead of growing one region
+            shortcuts = len(_shortcuts_for(v, out_edges, in_edges, witness_limit))
+            return (2 * (shortcuts - len(out_edges[v]) - len(in_edges[v]))
+                    + contracted_neighbors[v] + level[v])
+
+        heap = [(priority(v), v) for v in out_edges]
+        heapq.heapify(heap)
+        order = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            if v in ch.rank:
+                continue
+            # Lazy update: priorities go stale as neighbours are contracted
+            current = priority(v)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, v))
+                continue
+
+            for u, w_node, cost in _shortcuts_for(v, out_edges, in_edges, witness_limit):
+                if cost < out_edges[u].get(w_node, float('inf')):
+                    out_edges[u][w_node] = cost
+                    in_edges[w_node][u] = cost
+                    ch.middle[(u, w_node)] = v
+
+            # Every edge still attached to v leads to a higher-ranked node
+            ch.rank[v] = order
+            order += 1
+            ch.up_out[v] = list(out_edges[v].items())
+            ch.up_in[v] = list(in_edges[v].items())
+            neighbors = set(out_edges[v]) | set(in_edges[v])
+            for w_node in out_edges[v]:
+                del in_edges[w_node][v]
+            for u in in_edges[v]:
+                del out_edges[u][v]
+            del out_edges[v], in_edges[v]
+            for n in neighbors:
+                contracted_neighbors[n] += 1
+                level[n] = max(level[n], level[v] + 1)
+        return ch
+
+    # ------------------------------------------------------------------ query
+    def shortest_path(self, start_node, end_node):
+        """Returns (path_list, total_weight), or (None, inf) if unreachable."""
+        if start_node not in self.rank or end_node not in self.rank:
+            return None, float('inf')
+        if start_node == end_node:
+            return [start_node], 0.0
+
+        dist = ({start_node: 0.0}, {end_node: 0.0})
+        prev = ({start_node: None}, {end_node: None})
+        settled = (set(), set())
+        queues = ([(0.0, start_node)], [(0.0, end_node)])
+        edges = (self.up_out, self.up_in)
+        best, meet = float('inf'), None
+        self.last_settled = 0
+
+        while queues[0] or queues[1]:
+            # Advance the side with the smaller frontier key; stop once neither
+            # side can still improve on the best meeting point
+            side = 0 if (queues[0] and (not queues[1] or queues[0][0][0] <= queues[1][0][0])) else 1
+            d, u = heapq.heappop(queues[side])
+            if d >= best:
+                if not queues[1 - side] or queues[1 - side][0][0] >= best:
+                    break
+                continue
+            if u in settled[side]:
+                continue
+            settled[side].add(u)
+            self.last_settled += 1
+            other = dist[1 - side].get(u)
+            if other is not None and d + other < best:
+                best, meet = d + other, u
+            for v, w in edges[side].get(u, ()):
+                nd = d + w
+                if nd < dist[side].get(v, float('inf')):
+                    dist[side][v] = nd
+                    prev[side][v] = u
+                    heapq.heappush(queues[side], (nd, v))
+
+        if meet is None:
+            return None, float('inf')
+
+        # s .. meet from the forward tree, meet .. t from the backward tree
+        up = []
+        cur = meet
+        while cur is not None:
+            up.append(cur)
+            cur = prev[0][cur]
+        up.reverse()
+        cur = prev[1][meet]
+        while cur is not None:
+            up.append(cur)
+            cur = prev[1][cur]
+        return self.unpack(up), best
+
+    def upward_search(self, node, backward=False):
+        # Full search of the (small) upward space of node: {node: cost}
+        edges = self.up_in if backward else self.up_out
+        dist = {node: 0.0}
+        pq = [(0.0, node)]
+        settled = set()
+        while pq:
+            d, u = heapq.heappop(pq)
+            if u in settled:
+                continue
+            settled.add(u)
+            for v, w in edges.get(u, ()):
+                nd = d + w
+                if nd < dist.get(v, float('inf')):
+                    dist[v] = nd
+                    heapq.heappush(pq, (nd, v))
+        return dist
+
+    def unpack(self, path):
+        # Replace every shortcut edge by the original edges it stands for
+        if not path:
+            return path
+        out = [path[0]]
+        stack = []
+        for u, v in zip(path, path[1:]):
+            stack.append((u, v))
+            while stack:
+                a, b = stack.pop()
+                mid = self.middle.get((a, b))
+                if mid is None:
+                    out.append(b)
+                else:
+                    stack.append((mid, b))
+                    stack.append((a, mid))
+        return out
+
+    # ------------------------------------------------------------ persistence
+    def save(self, filename):
+        nodes = sorted(self.rank, key=self.rank.get)
+        index = {n: i for i, n in enumerate(nodes)}
+        edges = []
+        for u in nodes:
+            for v, w in self.up_out[u]:
+                mid = self.middle.get((u, v))
+                edges.append([index[u], index[v], w, -1 if mid is None else index[mid]])
+            for v, w in self.up_in[u]:
+                mid = self.middle.get((v, u))
+                edges.append([index[v], index[u], w, -1 if mid is None else index[mid]])
+        # Write to a private temp file and rename it into place, so a worker
+        # that loads the file while another is saving never sees half of it.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)),
+                                   prefix=os.path.basename(filename) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({"fingerprint": self.fingerprint, "nodes": nodes, "edges": edges}, f)
+            os.replace(tmp, filename)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'r') as f:
+            data = json.load(f)
+        ch = cls()
+        ch.fingerprint = data["fingerprint"]
+        nodes = data["nodes"]
+        ch.rank = {n: i for i, n in enumerate(nodes)}
+        ch.up_out = {n: [] for n in nodes}
+        ch.up_in = {n: [] for n in nodes}
+        for u, v, w, mid in data["edges"]:
+            u, v = nodes[u], nodes[v]
+            if ch.rank[u] < ch.rank[v]:
+                ch.up_out[u].append((v, w))
+            else:
+                ch.up_in[v].append((u, w))
+            if mid >= 0:
+                ch.middle[(u, v)] = nodes[mid]
+        return ch
+
+    @classmethod
+    def for_map(cls, graph, map_file):
+        """
+        Load the hierarchy stored next to map_file, or build and save it if it
+        is missing, unreadable, or was built from a different version of the map.
+        """
+        ch_file = map_file + ".ch"
+        if os.path.exists(ch_file):
+            try:
+                ch = cls.load(ch_file)
+            except (OSError, ValueError, KeyError, TypeError, IndexError):
+                ch = None
+            if ch is not None and ch.fingerprint == _fingerprint(graph):
+                return ch
+        ch = cls.build(graph)
+        ch.save(ch_file)
+        return ch
+
+
+def _shortcuts_for(v, out_edges, in_edges, witness_limit):
+    # Shortcuts (u, w, cost) needed if v were contracted now
+    shortcuts = []
+    outgoing = out_edges[v]
+    if not outgoing:
+        return shortcuts
+    max_out = max(outgoing.values())
+    for u, w_in in in_edges[v].items():
+        targets = {w: w_in + w_out for w, w_out in outgoing.items() if w != u}
+        if not targets:
+            continue
+        witness = _witness_search(u, v, targets, w_in + max_out, out_edges, witness_limit)
+        for w, cost in targets.items():
+            if witness.get(w, float('inf')) > cost:
+                shortcuts.append((u, w, cost))
+    return shortcuts
+
+
+def _witness_search(source, skip, targets, max_cost, out_edges, limit):
+    # Dijkstra from source that avoids skip, bounded by cost and settled count
+    dist = {source: 0.0}
+    pq = [(0.0, source)]
+    settled = 0
+    remaining = set(targets)
+    while pq and remaining and settled < limit:
+        d, u = heapq.heappop(pq)
+        if d > dist.get(u, float('inf')):
+            continue
+        if d > max_cost:
+            break
+        settled += 1
+        remaining.discard(u)
+        for v, w in out_edges[u].items():
+            if v == skip:
+                continue
+            nd = d + w
+            if nd < dist.get(v, float('inf')):
+                dist[v] = nd
+                heapq.heappush(pq, (nd, v))
+    return dist
+
+
+def _fingerprint(graph):
+    # Identity of a map: node and edge counts plus a hash of every (u, v, w)
+    # in adjacency order, so any edited, moved or reweighted edge rebuilds
+    digest = hashlib.sha256()
+    edges = 0
+    for u, neighbors in graph.adjacency_list.items():
+        digest.update(repr((u, [(v, float(w)) for v, w in neighbors])).encode())
+        edges += len(neighbors)
+    return [len(graph.adjacency_list), edges, digest.hexdigest()]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from graph import Graph
+
+    parser = argparse.ArgumentParser(description="Build the contraction hierarchy for a map")
+    parser.add_argument("map_file", help="Map CSV file; the hierarchy is written to <map_file>.ch")
+    args = parser.parse_args()
+
+    graph = Graph()
+    graph.load_map_data(args.map_file)
+    start = time.perf_counter()
+    ch = ContractionHierarchy.build(graph)
+    ch.save(args.map_file + ".ch")
+    print(f"Contracted {len(ch.rank)} nodes, {len(ch.middle)} shortcuts "
+          f"in {time.perf_counter() - start:.2f}s -> {args.map_file}.ch")
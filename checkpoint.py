@@ -0,0 +1,82 @@
+# checkpoint.py
+# Snapshot files for RideSharingSimulation, so long runs can resume after a
+# crash or fork into what-if branches from any saved point.
+#
+# A checkpoint holds everything that changes during a run: the pending
+# events, fleet arrays and car views, riders in flight and waiting, the
+# quadtree, the arrival source (RNG state and stream position), metrics
+# accumulators and the trip log. The map, the routing engine and the event
+# log sink are not saved; they are rebuilt (or passed in) on load, which
+# keeps the file small and the snapshot fast.
+#
+# File layout: a fixed header, then one zlib-compressed pickle.
+import copyreg
+import io
+import os
+import pickle
+import struct
+import zlib
+
+from car import Car
+
+MAGIC = b"RSCKPT1\0"
+# magic, simulation time, uncompressed pickle length
+HEADER = struct.Struct("<8sdq")
+
+
+def _reduce_car(car):
+    # Car.__reduce__ pickles a detached copy (for handing cars to other
+    # processes); a checkpoint keeps the fleet row and pending trip events
+    return copyreg.__newobj__, (Car,), (None, {name: getattr(car, name) for name in Car.__slots__})
+
+
+class _Pickler(pickle.Pickler):
+    dispatch_table = {**copyreg.dispatch_table, Car: _reduce_car}
+
+
+def write_checkpoint(sim, filename, level=1):
+    """
+    Save sim to filename. The file is written next to the target and then
+    renamed over it, so a crash mid-write never leaves a truncated
+    checkpoint. Returns the number of bytes written.
+    """
+    buffer = io.BytesIO()
+    _Pickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(sim)
+    raw = buffer.getbuffer()
+    data = zlib.compress(raw, level)
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = filename + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, float(sim.current_time), len(raw)))
+        f.write(data)
+    os.replace(tmp, filename)
+    return HEADER.size + len(data)
+
+
+def _read_header(f, filename):
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size or header[:8] != MAGIC:
+        raise ValueError(f"{filename} is not a simulation checkpoint")
+    return HEADER.unpack(header)
+
+
+def checkpoint_time(filename):
+    """Simulation time a checkpoint was taken at, without loading it."""
+    with open(filename, "rb") as f:
+        return _read_header(f, filename)[1]
+
+
+def read_checkpoint(filename):
+    """
+    The simulation object saved in filename, without its map, router or
+    event log; RideSharingSimulation.load_checkpoint() reattaches those.
+    Checkpoints are pickles: only load files you trust.
+    """
+    with open(filename, "rb") as f:
+        _, _, size = _read_header(f, filename)
+        raw = zlib.decompress(f.read())
+    if len(raw) != size:
+        raise ValueError(f"{filename} is truncated or corrupt")
+    return pickle.loads(raw)
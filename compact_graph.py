@@ -0,0 +1,276 @@
+# compact_graph.py
+# Array-backed (CSR) road graph with a memory-mappable binary map format.
+#
+# Convert an existing CSV map once:
+#     python compact_graph.py map.csv map.bin
+# and run the simulation with --map-file map.bin.
+#
+# Nodes are interned to integers 0..n-1 (node_ids[i] is the original id).
+# The edges leaving node u are targets[offsets[u]:offsets[u + 1]] with the
+# matching weights. CompactGraph exposes the same adjacency_list /
+# node_coordinates / find_nearest_vertex / get_bounds surface as Graph, so
+# dijkstra, the routing engines and the simulation run on it unchanged.
+import mmap
+import struct
+from array import array
+
+from graph import Graph
+from spatial_index import GridIndex
+
+MAGIC = b"RSMAP01\0"
+# magic, node count, edge count, byte length of the node-name blob
+HEADER = struct.Struct("<8sqqq")
+
+
+class _CSRAdjacency:
+    # Read-only mapping view: node -> iterable of (neighbor, weight)
+    def __init__(self, offsets, targets, weights):
+        self.offsets, self.targets, self.weights = offsets, targets, weights
+
+    def __getitem__(self, u):
+        a, b = self.offsets[u], self.offsets[u + 1]
+        return list(zip(self.targets[a:b], self.weights[a:b]))
+
+    def get(self, u, default=None):
+        if not 0 <= u < len(self.offsets) - 1:
+            return default
+        a, b = self.offsets[u], self.offsets[u + 1]
+        return zip(self.targets[a:b], self.weights[a:b])
+
+    def __contains__(self, u):
+        return isinstance(u, int) and 0 <= u < len(self.offsets) - 1
+
+    def __iter__(self):
+        return iter(range(len(self.offsets) - 1))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def keys(self):
+        return range(len(self))
+
+    def values(self):
+        return (self[u] for u in range(len(self)))
+
+    def items(self):
+        return ((u, self[u]) for u in range(len(self)))
+
+
+class _Coordinates:
+    # Read-only mapping view: node -> (x, y)
+    def __init__(self, xs, ys):
+        self.xs, self.ys = xs, ys
+
+    def __getitem__(self, u):
+        return (self.xs[u], self.ys[u])
+
+    def __contains__(self, u):
+        return isinstance(u, int) and 0 <= u < len(self.xs)
+
+    def __iter__(self):
+        return iter(range(len(self.xs)))
+
+    def __len__(self):
+        return len(self.xs)
+
+    def __bool__(self):
+        return len(self.xs) > 0
+
+    def keys(self):
+        return range(len(self.xs))
+
+    def values(self):
+        return zip(self.xs, self.ys)
+
+    def items(self):
+        return zip(range(len(self.xs)), zip(self.xs, self.ys))
+
+
+class CompactGraph:
+    def __init__(self, node_ids, xs, ys, offsets, targets, weights):
+        self.node_ids = node_ids                  # int -> original node id
+        self.xs, self.ys = xs, ys                 # float64 coordinates
+        self.offsets = offsets                    # int64, len n + 1
+        self.targets = targets                    # int32 edge heads
+        self.weights = weights                    # float64 edge weights
+        self.adjacency_list = _CSRAdjacency(offsets, targets, weights)
+        self.node_coordinates = _Coordinates(xs, ys)
+        self._reverse_adjacency = None
+        self._spatial_index = None
+        self._mmap = None
+        self.version = 0  # bumped on weight changes, like Graph.version
+
+    # --------------------------------------------------------------- builders
+    @classmethod
+    def from_graph(cls, graph):
+        # Intern the node ids of a dict-based Graph and pack its edges
+        node_ids = list(graph.node_coordinates)
+        index = {n: i for i, n in enumerate(node_ids)}
+        xs = array('d', (graph.node_coordinates[n][0] for n in node_ids))
+        ys = array('d', (graph.node_coordinates[n][1] for n in node_ids))
+        offsets = array('q', [0])
+        targets = array('i')
+        weights = array('d')
+        for n in node_ids:
+            for v, w in graph.adjacency_list.get(n, ()):
+                targets.append(index[v])
+                weights.append(w)
+            offsets.append(len(targets))
+        return cls(node_ids, xs, ys, offsets, targets, weights)
+
+    @classmethod
+    def from_csv(cls, filename, directed=False):
+        graph = Graph()
+        graph.load_map_data(filename, directed=directed)
+        return cls.from_graph(graph)
+
+    # ------------------------------------------------------------ binary file
+    def save(self, filename):
+        names = "\n".join(str(n) for n in self.node_ids).encode("utf-8")
+        with open(filename, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(self.node_ids), len(self.targets), len(names)))
+            # 8-byte arrays first so every section stays naturally aligned
+            for arr, code in ((self.xs, 'd'), (self.ys, 'd'), (self.offsets, 'q'),
+                              (self.weights, 'd'), (self.targets, 'i')):
+                f.write(array(code, arr).tobytes())
+            f.write(names)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Memory-map a binary map. The arrays are zero-copy views into the file,
+        so startup cost does not depend on the number of edges.
+        """
+        with open(filename, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n, m, names_len = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{filename} is not a binary map file")
+
+        view = memoryview(mm)
+        pos = HEADER.size
+        sections = []
+        for code, count, size in (('d', n, 8), ('d', n, 8), ('q', n + 1, 8),
+                                  ('d', m, 8), ('i', m, 4)):
+            sections.append(view[pos:pos + count * size].cast(code))
+            pos += count * size
+        xs, ys, offsets, weights, targets = sections
+        node_ids = bytes(view[pos:pos + names_len]).decode("utf-8").split("\n") if n else []
+
+        graph = cls(node_ids, xs, ys, offsets, targets, weights)
+        graph._mmap = mm  # keep the mapping alive as long as the graph
+        return graph
+
+    # ------------------------------------------------------ Graph-like surface
+    def reverse_adjacency(self):
+        # Incoming edges as a second CSR, built on first use
+        if self._reverse_adjacency is None:
+            n = len(self.node_ids)
+            counts = [0] * (n + 1)
+            for v in self.targets:
+                counts[v + 1] += 1
+            for i in range(n):
+                counts[i + 1] += counts[i]
+            offsets = array('q', counts)
+            fill = list(counts[:n])
+            targets = array('i', bytes(4 * len(self.targets)))
+            weights = array('d', bytes(8 * len(self.targets)))
+            for u in range(n):
+                for e in range(self.offsets[u], self.offsets[u + 1]):
+                    v = self.targets[e]
+                    targets[fill[v]] = u
+                    weights[fill[v]] = self.weights[e]
+                    fill[v] += 1
+            self._reverse_adjacency = _CSRAdjacency(offsets, targets, weights)
+        return self._reverse_adjacency
+
+    def set_edge_weight(self, start_node, end_node, weight, directed=False):
+        # Same contract as Graph.set_edge_weight
+        self.update_edge_weights([(start_node, end_node, weight)], directed=directed)
+
+    def _edges(self, u, v):
+        # Positions of the edges u -> v in targets/weights
+        return [e for e in range(self.offsets[u], self.offsets[u + 1]) if self.targets[e] == v]
+
+    def weight_changes(self, changes, directed=False):
+        # Same contract as Graph.weight_changes
+        resolved = {}
+        for start_node, end_node, weight in changes:
+            found = False
+            for u, v in ((start_node, end_node),) if directed else ((start_node, end_node), (end_node, start_node)):
+                for e in self._edges(u, v):
+                    found = True
+                    old = resolved[(u, v)][0] if (u, v) in resolved else self.weights[e]
+                    resolved[(u, v)] = (old, float(weight))
+            if not found:
+                raise KeyError(f"No edge {start_node} -> {end_node}")
+        return [(u, v, old, new) for (u, v), (old, new) in resolved.items() if old != new]
+
+    def update_edge_weights(self, changes, directed=False):
+        # Same contract as Graph.update_edge_weights. Memory-mapped weights
+        # are read-only, so they are copied into a private array on first write.
+        changed = self.weight_changes(changes, directed=directed)
+        if changed and not isinstance(self.weights, array):
+            self.weights = array('d', self.weights)
+            self.adjacency_list.weights = self.weights
+        reverse = self._reverse_adjacency
+        for u, v, _, weight in changed:
+            for e in self._edges(u, v):
+                self.weights[e] = weight
+            if reverse is not None:
+                for e in range(reverse.offsets[v], reverse.offsets[v + 1]):
+                    if reverse.targets[e] == u:
+                        reverse.weights[e] = weight
+        if changed:
+            self.version += 1
+        return changed
+
+    def build_spatial_index(self):
+        self._spatial_index = GridIndex(range(len(self.node_ids)), zip(self.xs, self.ys))
+        return self._spatial_index
+
+    def _get_spatial_index(self):
+        if not self.node_ids:
+            raise ValueError("No coordinates loaded")
+        if self._spatial_index is None:
+            self.build_spatial_index()
+        return self._spatial_index
+
+    def find_nearest_vertex(self, point):
+        return self._get_spatial_index().nearest(point)
+
+    def snap_points(self, points):
+        return self._get_spatial_index().snap_points(points)
+
+    def get_bounds(self):
+        if not self.node_ids:
+            return (0, 0, 7, 7)  # same fallback as Graph
+        return (min(self.xs), min(self.ys), max(self.xs), max(self.ys))
+
+    def node_name(self, node):
+        # Original id of an interned node (for printing routes)
+        return self.node_ids[node]
+
+
+def load_graph(filename, directed=False):
+    # Open a map in either format: binary (.bin) or the CSV edge list
+    # (plain or .gz; directed only applies to CSV input)
+    if filename.endswith(".bin"):
+        return CompactGraph.load(filename)
+    graph = Graph()
+    graph.load_map_data(filename, directed=directed)
+    return graph
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a CSV map to the binary CSR format")
+    parser.add_argument("csv_file", help="Input map in the load_map_data CSV format")
+    parser.add_argument("bin_file", help="Output binary map (.bin)")
+    parser.add_argument("--directed", action="store_true", help="Treat CSV rows as one-way edges")
+    args = parser.parse_args()
+
+    graph = CompactGraph.from_csv(args.csv_file, directed=args.directed)
+    graph.save(args.bin_file)
+    print(f"Wrote {len(graph.node_ids)} nodes and {len(graph.targets)} edges to {args.bin_file}")
@@ -1,30 +1,79 @@
 # dijkstra.py
 import heapq
 
-def find_shortest_path(graph, start_node, end_node):
+from instrumentation import stats
+
+
+def dijkstra(graph, source, targets=None, cutoff=None, reverse=False):
     """
-    Returns (path_list, total_weight) using Dijkstra over graph.adjacency_list.
-    If unreachable, returns (None, float('inf')).
+    Single-source Dijkstra over graph.adjacency_list with early termination.
+
+    targets: optional collection of nodes; the search stops as soon as every
+             target has been settled.
+    cutoff:  optional cost limit; nodes farther than this are never settled.
+    reverse: search the reverse graph (graph.reverse_adjacency()), so the
+             returned distances are costs from each node *to* source.
+
+    Returns (dist, prev) for the settled nodes only. Both dicts are filled
+    lazily as nodes are reached, so the cost of a query depends on how much
+    of the graph it touches rather than on the size of the map.
     """
-    dist = {n: float('inf') for n in graph.adjacency_list}
-    prev = {n: None for n in graph.adjacency_list}
-    dist[start_node] = 0.0
+    adjacency = graph.reverse_adjacency() if reverse else graph.adjacency_list
+    remaining = set(targets) if targets is not None else None
 
-    pq = [(0.0, start_node)]
+    best = {source: 0.0}   # tentative distances of reached nodes
+    prev = {source: None}
+    dist = {}              # settled nodes
+    pq = [(0.0, source)]
+    pops = relaxations = 0
     while pq:
         d, u = heapq.heappop(pq)
-        if u == end_node:
-            break
-        if d > dist[u]:
+        pops += 1
+        if u in dist:
             continue
-        for v, w in graph.adjacency_list.get(u, []):
+        if cutoff is not None and d > cutoff:
+            break
+        dist[u] = d
+        if remaining is not None:
+            remaining.discard(u)
+            if not remaining:
+                break
+        for v, w in adjacency.get(u, ()):
             nd = d + w
-            if nd < dist[v]:
-                dist[v] = nd
+            if nd < best.get(v, float('inf')):
+                best[v] = nd
                 prev[v] = u
                 heapq.heappush(pq, (nd, v))
+                relaxations += 1
+
+    if stats.enabled:
+        stats.count("dijkstra.searches")
+        stats.count("dijkstra.heap_pops", pops)
+        stats.count("dijkstra.relaxations", relaxations)
+    return dist, {n: prev[n] for n in dist}
+
 
-    if dist[end_node] == float('inf'):
+def find_etas(graph, rider_node, car_nodes, cutoff=None):
+    """
+    One-to-many travel costs from each car node to rider_node.
+
+    Runs a single search from the rider over the reverse graph instead of
+    one search per car. Returns {car_node: cost}; cars that cannot reach the
+    rider (or are beyond cutoff) get float('inf').
+    """
+    if not car_nodes:
+        return {}
+    dist, _ = dijkstra(graph, rider_node, targets=car_nodes, cutoff=cutoff, reverse=True)
+    return {n: dist.get(n, float('inf')) for n in car_nodes}
+
+
+def find_shortest_path(graph, start_node, end_node):
+    """
+    Returns (path_list, total_weight) using Dijkstra over graph.adjacency_list.
+    If unreachable, returns (None, float('inf')).
+    """
+    dist, prev = dijkstra(graph, start_node, targets=(end_node,))
+    if end_node not in dist:
         return None, float('inf')
 
     # reconstruct
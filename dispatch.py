@@ -0,0 +1,93 @@
+# dispatch.py
+# Bulk rider-to-car matching for the batched dispatch policy.
+#
+# Requests collected over a time window are matched together: one ETA matrix
+# (riders x candidate cars) is filled from the routing engine and the
+# assignment minimising total pickup time is solved with the Hungarian
+# algorithm.
+import numpy as np
+
+
+def build_eta_matrix(router, rider_nodes, car_nodes):
+    """
+    ETA matrix with one row per rider node and one column per car node.
+    Each row comes from a single one-to-many query (router.etas); cars that
+    cannot reach a rider get inf.
+    """
+    column = {node: j for j, node in enumerate(car_nodes)}
+    etas = np.full((len(rider_nodes), len(car_nodes)), np.inf)
+    unique_cars = set(car_nodes)
+    for i, rider_node in enumerate(rider_nodes):
+        row = router.etas(rider_node, unique_cars)
+        cols = [column[n] for n in row]
+        etas[i, cols] = list(row.values())
+    # Several cars can share a node; copy the value to every such column
+    for j, node in enumerate(car_nodes):
+        if column[node] != j:
+            etas[:, j] = etas[:, column[node]]
+    return etas
+
+
+def solve_assignment(cost):
+    """
+    Minimum-cost assignment for a (possibly rectangular) cost matrix.
+
+    Returns a list of (row, col) pairs; every row is matched if there are at
+    least as many columns, otherwise every column is. Pairs whose cost is inf
+    (unreachable) are left out.
+    """
+    cost = np.asarray(cost, dtype=float)
+    if cost.size == 0:
+        return []
+    transposed = cost.shape[0] > cost.shape[1]
+    work = cost.T if transposed else cost
+
+    # Infinite entries become a penalty larger than any feasible total
+    finite = np.isfinite(work)
+    big = (np.abs(work[finite]).max() + 1.0) * (work.shape[0] + 1) if finite.any() else 1.0
+    pairs = _hungarian(np.where(finite, work, big))
+
+    if transposed:
+        pairs = [(c, r) for r, c in pairs]
+    return sorted((r, c) for r, c in pairs if np.isfinite(cost[r, c]))
+
+
+def _hungarian(a):
+    # Shortest-augmenting-path Hungarian algorithm for n <= m, O(n^2 m),
+    # with the inner column scan vectorised. Potentials u (rows) and v
+    # (columns); p[j] is the row matched to column j (1-based, 0 = free).
+    n, m = a.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            cur = a[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        # Augment along the alternating path back to the virtual column 0
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    return [(int(p[j]) - 1, j - 1) for j in range(1, m + 1) if p[j]]
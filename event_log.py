@@ -0,0 +1,195 @@
+# event_log.py
+# Sinks for the simulation's per-event log (pickups and dropoffs).
+#
+#   NullSink        quiet: nothing is formatted or written
+#   PrintSink       the classic "TIME 12.50: Car 3 picked up Rider 7" lines
+#   RingBufferSink  keeps the last N records in memory
+#   JsonlSink       one JSON object per line
+#   BinarySink      fixed 25-byte records, readable with read_binary_log
+#
+# The file sinks collect records in memory and write them in large blocks,
+# optionally from a background thread, so logging never does a write per
+# event. Sinks with enabled = False are skipped by the simulation before
+# any record is built.
+import collections
+import json
+import queue
+import sys
+import threading
+
+import numpy as np
+
+# Event kinds
+PICKUP, DROPOFF = range(2)
+KIND_NAMES = ("pickup", "dropoff")
+
+# Binary log layout: 8-byte magic, then packed little-endian records
+BINARY_MAGIC = b"RSLOG01\0"
+RECORD_DTYPE = np.dtype([("time", "<f8"), ("kind", "u1"), ("car_id", "<i8"), ("rider_id", "<i8")])
+
+
+class NullSink:
+    enabled = False
+
+    def log(self, time, kind, car_id, rider_id):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class PrintSink(NullSink):
+    # Human-readable lines on a text stream (stdout by default)
+    enabled = True
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def log(self, time, kind, car_id, rider_id):
+        stream = self.stream or sys.stdout
+        if kind == PICKUP:
+            stream.write(f"TIME {time:.2f}: Car {car_id} picked up Rider {rider_id}\n")
+        else:
+            stream.write(f"TIME {time:.2f}: Rider {rider_id} dropped off by Car {car_id}\n")
+
+    def flush(self):
+        (self.stream or sys.stdout).flush()
+
+
+class RingBufferSink(NullSink):
+    """The most recent `capacity` records, as (time, kind, car_id, rider_id)."""
+    enabled = True
+
+    def __init__(self, capacity=100000):
+        self.records = collections.deque(maxlen=capacity)
+
+    def log(self, time, kind, car_id, rider_id):
+        self.records.append((time, kind, car_id, rider_id))
+
+
+class _BatchedFileSink(NullSink):
+    # Buffers records and writes them block_records at a time. With
+    # background=True, encoding and writing happen on a worker thread.
+    enabled = True
+
+    def __init__(self, path, block_records=65536, background=False):
+        self.path = path
+        self.block_records = block_records
+        self.buffer = []
+        self.file = open(path, "wb")
+        self._write_header()
+        self.queue = None
+        self.error = None  # raised from the writer thread on the next flush/close
+        if background:
+            self.queue = queue.Queue(maxsize=4)  # bounds memory if the disk falls behind
+            self.thread = threading.Thread(target=self._writer, daemon=True)
+            self.thread.start()
+
+    def _write_header(self):
+        pass
+
+    def _encode(self, batch):
+        raise NotImplementedError
+
+    def _writer(self):
+        while True:
+            batch = self.queue.get()
+            try:
+                if batch is None:
+                    return
+                if self.error is None:
+                    self.file.write(self._encode(batch))
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def log(self, time, kind, car_id, rider_id):
+        self.buffer.append((time, kind, car_id, rider_id))
+        if len(self.buffer) >= self.block_records:
+            self._write_block()
+
+    def _write_block(self):
+        batch, self.buffer = self.buffer, []
+        if not batch:
+            return
+        if self.queue is not None:
+            self.queue.put(batch)
+        else:
+            self.file.write(self._encode(batch))
+
+    def flush(self):
+        self._write_block()
+        if self.queue is not None:
+            self.queue.join()  # wait until the writer thread has caught up
+            self._raise_error()
+        self.file.flush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self._write_block()
+        if self.queue is not None:
+            self.queue.put(None)
+            self.thread.join()
+        self.file.close()
+        self._raise_error()
+
+
+class JsonlSink(_BatchedFileSink):
+    def _encode(self, batch):
+        return "".join(json.dumps({"time": t, "kind": KIND_NAMES[k], "car_id": c, "rider_id": r}) + "\n"
+                       for t, k, c, r in batch).encode()
+
+
+class BinarySink(_BatchedFileSink):
+    # Fixed-size records; car and rider ids must be integers
+    def _write_header(self):
+        self.file.write(BINARY_MAGIC)
+
+    def _encode(self, batch):
+        try:
+            return np.array(batch, dtype=RECORD_DTYPE).tobytes()
+        except (TypeError, ValueError, OverflowError) as e:
+            raise ValueError(f"binary event log needs integer car and rider ids ({e}); "
+                             f"use a .jsonl log instead") from e
+
+
+def read_binary_log(path):
+    """Load a BinarySink file as a NumPy structured array (time, kind, car_id, rider_id)."""
+    with open(path, "rb") as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"{path} is not a binary event log")
+        return np.fromfile(f, dtype=RECORD_DTYPE)
+
+
+def read_jsonl_log(path):
+    """Load a JsonlSink file as a list of dicts."""
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def make_sink(spec, background=False):
+    """
+    Sink from a command-line value: 'print', 'quiet', 'ring', or a file
+    path ending in .jsonl or .bin.
+    """
+    if spec == "print":
+        return PrintSink()
+    if spec == "quiet":
+        return NullSink()
+    if spec == "ring":
+        return RingBufferSink()
+    if spec.endswith(".jsonl"):
+        return JsonlSink(spec, background=background)
+    if spec.endswith(".bin"):
+        return BinarySink(spec, background=background)
+    raise ValueError(f"Unknown event log '{spec}' (print, quiet, ring, *.jsonl or *.bin)")
@@ -0,0 +1,312 @@
+# events.py
+# Event queue for the discrete-event simulation loop.
+#
+# Events are small __slots__ records ordered by (time, seq); seq is a
+# monotonic counter, so events at the same time run in the order they were
+# scheduled and payloads are never compared. Each event kind is bound to a
+# handler with register(), and the handler is looked up once at schedule
+# time. Cancelling an event only clears its active flag (O(1)); cancelled
+# events are dropped when they reach the front of the queue.
+#
+# Two backends share the same interface: a binary heap (heapq) and a
+# calendar queue (Brown 1988), whose O(1) average push/pop pays off when
+# hundreds of thousands of events are pending.
+#
+# Queues pickle without their handlers (bound methods of whatever owns
+# them); after loading, register the handlers again and call rebind().
+import bisect
+import heapq
+import itertools
+
+
+class Event:
+    __slots__ = ("time", "seq", "kind", "handler", "args", "active")
+
+    def __init__(self, time, seq, kind, handler, args):
+        self.time = time
+        self.seq = seq
+        self.kind = kind
+        self.handler = handler
+        self.args = args
+        self.active = True  # False once cancelled or processed
+
+    def __getstate__(self):
+        return self.time, self.seq, self.kind, self.args, self.active
+
+    def __setstate__(self, state):
+        self.time, self.seq, self.kind, self.args, self.active = state
+        self.handler = None  # set again by EventQueue.rebind()
+
+    def __repr__(self):
+        state = "" if self.active else ", inactive"
+        return f"Event({self.kind!r}, t={self.time:.3f}, seq={self.seq}{state})"
+
+
+# Backends hold (time, seq, event) entries. pop_live() and peek_live()
+# discard inactive (cancelled) entries they meet at the front.
+
+class HeapBackend:
+    # Binary heap (heapq)
+    def __init__(self):
+        self.heap = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __iter__(self):
+        return iter(self.heap)
+
+    def push(self, entry):
+        heapq.heappush(self.heap, entry)
+
+    def peek_live(self):
+        heap = self.heap
+        while heap and not heap[0][2].active:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def pop_live(self, until):
+        heap = self.heap
+        while heap:
+            entry = heapq.heappop(heap)
+            if entry[2].active:
+                if entry[0] > until:
+                    heapq.heappush(heap, entry)  # rare: only at the end of a run window
+                    return None
+                return entry
+        return None
+
+
+class CalendarBackend:
+    """
+    Calendar queue: a ring of buckets ("days") of equal width, each a short
+    sorted list. An entry goes to bucket int(time / width) % nbuckets; pops
+    walk the ring from the current day, taking the head of a bucket only if
+    it falls within the current "year". The ring doubles or halves as the
+    queue grows or shrinks, and the day width is re-estimated from the
+    spacing of the earliest entries. Times must not be earlier than the
+    last popped time.
+    """
+
+    def __init__(self, nbuckets=2, width=1.0):
+        self.size = 0
+        self.last_time = 0.0
+        self._found = None  # (bucket, day) of the earliest entry, from peek()
+        self._setup(nbuckets, width)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return (entry for bucket in self.buckets for entry in bucket)
+
+    def _setup(self, nbuckets, width):
+        self.nbuckets = nbuckets
+        self.width = width
+        self.buckets = [[] for _ in range(nbuckets)]
+        self.day = int(self.last_time / width)  # day number of the current bucket
+        self.current = self.day % nbuckets
+        self.grow_at = 2 * nbuckets
+        self.shrink_at = nbuckets // 2 - 2
+
+    def push(self, entry):
+        if entry[0] < self.last_time:
+            raise ValueError(f"cannot schedule at {entry[0]}, before the current time {self.last_time}")
+        bisect.insort(self.buckets[int(entry[0] / self.width) % self.nbuckets], entry)
+        self.size += 1
+        self._found = None
+        if self.size > self.grow_at:
+            self._resize(2 * self.nbuckets)
+
+    def peek(self):
+        if not self.size:
+            return None
+        if self._found is None:
+            self._found = self._find()
+        return self.buckets[self._found[0]][0]
+
+    def peek_live(self):
+        entry = self.peek()
+        while entry is not None and not entry[2].active:
+            self._discard()
+            entry = self.peek()
+        return entry
+
+    def pop_live(self, until):
+        entry = self.peek_live()
+        if entry is None or entry[0] > until:
+            return None
+        return self.pop()
+
+    def pop(self):
+        i, day = self._found if self._found is not None else self._find()
+        self._found = None
+        entry = self.buckets[i].pop(0)
+        self.size -= 1
+        self.current, self.day, self.last_time = i, day, entry[0]
+        if self.size < self.shrink_at:
+            self._resize(self.nbuckets // 2)
+        return entry
+
+    def _discard(self):
+        # Drop the earliest entry without moving the clock: a cancelled event
+        # was never processed, so later pushes before its time stay legal
+        i, _ = self._found
+        self._found = None
+        self.buckets[i].pop(0)
+        self.size -= 1
+        if self.size < self.shrink_at:
+            self._resize(self.nbuckets // 2)
+
+    def _find(self):
+        # Index and day number of the bucket holding the earliest entry. A
+        # head belongs to the day being visited if push() filed it under
+        # that day: the same int(time / width), so float rounding at day
+        # boundaries cannot make the two disagree.
+        i, day = self.current, self.day
+        width = self.width
+        for _ in range(self.nbuckets):
+            bucket = self.buckets[i]
+            if bucket and int(bucket[0][0] / width) <= day:
+                return i, day
+            i += 1
+            day += 1
+            if i == self.nbuckets:
+                i = 0
+        # Nothing within a year: the earliest head is found directly
+        entry = min(bucket[0] for bucket in self.buckets if bucket)
+        day = int(entry[0] / width)
+        return day % self.nbuckets, day
+
+    def _resize(self, nbuckets):
+        entries = [entry for bucket in self.buckets for entry in bucket]
+        entries.sort()
+        self._setup(max(nbuckets, 2), self._estimate_width(entries))
+        for entry in entries:
+            bisect.insort(self.buckets[int(entry[0] / self.width) % self.nbuckets], entry)
+
+    def _estimate_width(self, entries):
+        # Three times the average gap between the earliest entries, ignoring
+        # outlier gaps (Brown's heuristic)
+        times = [entry[0] for entry in entries[:25]]
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        if not gaps:
+            return self.width
+        mean = sum(gaps) / len(gaps)
+        close = [g for g in gaps if g <= 2 * mean]
+        width = 3 * sum(close) / len(close) if close else 0.0
+        return width if width > 0 else self.width
+
+
+BACKENDS = {"heap": HeapBackend, "calendar": CalendarBackend}
+
+
+class EventQueue:
+    """
+    Pending events plus the handlers that process them.
+
+        queue.register("pickup_arrival", sim.handle_pickup_arrival)
+        event = queue.schedule(12.5, "pickup_arrival", car, rider)
+        queue.cancel(event)
+
+    len(queue) counts pending events that have not been cancelled.
+    """
+
+    def __init__(self, backend="heap"):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown event queue backend '{backend}'")
+        self.backend_name = backend
+        self.backend = BACKENDS[backend]()
+        self._push = self.backend.push  # bound once; these run for every event
+        self._pop_live = self.backend.pop_live
+        self.handlers = {}
+        self.sequence = itertools.count()
+        self.scheduled = 0
+        self.processed = 0
+        self.cancelled = 0
+
+    def __len__(self):
+        return self.scheduled - self.processed - self.cancelled
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ("handlers", "_push", "_pop_live"):
+            del state[name]
+        # itertools.count does not pickle; keep the next number instead
+        state["sequence"] = next(self.sequence)
+        self.sequence = itertools.count(state["sequence"])
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.sequence = itertools.count(state["sequence"])
+        self.handlers = {}
+        self._push = self.backend.push
+        self._pop_live = self.backend.pop_live
+
+    def rebind(self):
+        """
+        Point the pending events of an unpickled queue back at the handlers
+        registered since. Events of a kind nobody registered again (e.g.
+        frames for a renderer that was not re-attached) are cancelled;
+        returns how many.
+        """
+        dropped = 0
+        for _, _, event in self.backend:
+            if not event.active:
+                continue
+            handler = self.handlers.get(event.kind)
+            if handler is None:
+                self.cancel(event)
+                dropped += 1
+            else:
+                event.handler = handler
+        return dropped
+
+    def schedule(self, time, kind, *args):
+        try:
+            handler = self.handlers[kind]
+        except KeyError:
+            raise KeyError(f"No handler registered for event kind '{kind}'") from None
+        seq = next(self.sequence)
+        event = Event(time, seq, kind, handler, args)
+        self._push((time, seq, event))
+        self.scheduled += 1
+        return event
+
+    def cancel(self, event):
+        # Lazy: the entry stays queued and is skipped when popped
+        if event is not None and event.active:
+            event.active = False
+            self.cancelled += 1
+
+    def peek_time(self):
+        entry = self.backend.peek_live()
+        return entry[0] if entry is not None else None
+
+    def pop(self, until=float('inf')):
+        """Remove and return the next live event with time <= until, or None."""
+        entry = self._pop_live(until)
+        if entry is None:
+            return None
+        event = entry[2]
+        event.active = False  # a later cancel() is a no-op
+        self.processed += 1
+        return event
+
+    def run(self, until=float('inf')):
+        """Dispatch every event up to time until; returns the number handled."""
+        count = 0
+        event = self.pop(until)
+        while event is not None:
+            event.handler(*event.args)
+            count += 1
+            event = self.pop(until)
+        return count
+
+    def stats(self):
+        return {"backend": self.backend_name, "pending": len(self),
+                "processed": self.processed, "cancelled": self.cancelled}
@@ -0,0 +1,245 @@
+# generators.py
+# Synthetic inputs for benchmarks and experiments: road maps in the
+# load_map_data CSV format, fleets, rider demand traces and traffic.
+#
+# Everything is seeded and vectorised with NumPy, so a 1M-node map is
+# written in well under a minute and the same seed always gives the same files.
+#
+#     python generators.py grid 100000 grid_100k.csv
+#     python generators.py geometric 100000 geo_100k.csv.gz --seed 3
+#     python generators.py demand 5000 demand.jsonl --map-file grid_100k.csv --hotspots 4
+#     python generators.py traffic 50 traffic.jsonl --map-file grid_100k.csv --interval 20
+import argparse
+import gzip
+import json
+import math
+
+import numpy as np
+
+from car import Car
+
+
+def grid_map(side, seed=0):
+    """
+    side x side grid of streets one unit apart. Weights are edge length
+    times a random congestion factor in [1, 2), like real travel times.
+    Returns (xs, ys, u, v, w) arrays; u/v are node indices.
+    """
+    rng = np.random.default_rng(seed)
+    idx = np.arange(side * side).reshape(side, side)
+    xs, ys = np.meshgrid(np.arange(side, dtype=float), np.arange(side, dtype=float), indexing="ij")
+    u = np.concatenate([idx[:-1, :].ravel(), idx[:, :-1].ravel()])
+    v = np.concatenate([idx[1:, :].ravel(), idx[:, 1:].ravel()])
+    w = rng.uniform(1.0, 2.0, len(u))
+    return xs.ravel(), ys.ravel(), u, v, w
+
+
+def geometric_map(n, degree=6.0, seed=0, chunk_size=1 << 16):
+    """
+    Random geometric road map: n points uniform in a square of area n, each
+    joined to every point within the radius that gives `degree` neighbours
+    on average. Only the largest connected component is kept, so every
+    node can reach every other. Weights are length times a factor in
+    [1, 1.5). Returns (xs, ys, u, v, w) like grid_map.
+    """
+    rng = np.random.default_rng(seed)
+    size = math.sqrt(n)
+    radius = math.sqrt(degree / math.pi)
+    xs = rng.uniform(0, size, n)
+    ys = rng.uniform(0, size, n)
+
+    # Bucket points into cells of side radius (CSR layout, as in GridIndex)
+    ncell = max(1, int(size / radius))
+    cx = np.minimum((xs / radius).astype(np.int64), ncell - 1)
+    cy = np.minimum((ys / radius).astype(np.int64), ncell - 1)
+    cell = cx * ncell + cy
+    order = np.argsort(cell, kind="stable")
+    cell_start = np.searchsorted(cell[order], np.arange(ncell * ncell + 1))
+    max_count = int(np.diff(cell_start).max())
+    slots = np.arange(max_count)
+
+    us, vs = [], []
+    # Each unordered pair of neighbouring cells is visited once
+    for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+        for lo in range(0, n, chunk_size):
+            i = np.arange(lo, min(n, lo + chunk_size))
+            gx, gy = cx[i] + dx, cy[i] + dy
+            valid = (gx >= 0) & (gx < ncell) & (gy >= 0) & (gy < ncell)
+            other = np.where(valid, gx * ncell + gy, 0)
+            start = cell_start[other]
+            end = np.where(valid, cell_start[other + 1], start)
+            slot = start[:, None] + slots[None, :]
+            ok = slot < end[:, None]
+            j = order[np.minimum(slot, n - 1)]
+            if dx == 0 and dy == 0:
+                ok &= j > i[:, None]  # same cell: each pair once, no self loops
+            d2 = (xs[j] - xs[i][:, None]) ** 2 + (ys[j] - ys[i][:, None]) ** 2
+            ok &= d2 <= radius * radius
+            rows, cols = np.nonzero(ok)
+            us.append(i[rows])
+            vs.append(j[rows, cols])
+    u = np.concatenate(us)
+    v = np.concatenate(vs)
+
+    keep = _largest_component(n, u, v)
+    remap = np.full(n, -1, dtype=np.int64)
+    remap[keep] = np.arange(keep.sum())
+    edge_keep = keep[u]  # both ends share a component
+    u, v = remap[u[edge_keep]], remap[v[edge_keep]]
+    xs, ys = xs[keep], ys[keep]
+    length = np.hypot(xs[u] - xs[v], ys[u] - ys[v])
+    w = np.maximum(length, 1e-9) * rng.uniform(1.0, 1.5, len(u))
+    return xs, ys, u, v, w
+
+
+def _largest_component(n, u, v):
+    # Connected components by hooking and pointer jumping on a parent array;
+    # returns a boolean mask of the nodes in the largest one
+    parent = np.arange(n)
+    while True:
+        pu, pv = parent[u], parent[v]
+        differ = pu != pv
+        if not differ.any():
+            break
+        pu, pv = pu[differ], pv[differ]
+        np.minimum.at(parent, np.maximum(pu, pv), np.minimum(pu, pv))
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+    labels, counts = np.unique(parent, return_counts=True)
+    return parent == labels[np.argmax(counts)]
+
+
+def write_map(filename, xs, ys, u, v, w, chunk_size=1 << 16):
+    """
+    Write a generated map in the load_map_data CSV format, one line per
+    undirected edge; node i is named n<i>. A .gz suffix compresses it.
+    Returns (nodes, edges).
+    """
+    opener = gzip.open if filename.endswith(".gz") else open
+    # Each node's "id,x,y" is formatted once, not once per incident edge
+    nodes = [f"n{i},{x},{y}" for i, (x, y) in enumerate(zip(xs.tolist(), ys.tolist()))]
+    with opener(filename, "wt") as f:
+        for lo in range(0, len(u), chunk_size):
+            hi = lo + chunk_size
+            f.write("".join(f"{nodes[a]},{nodes[b]},{weight}\n"
+                            for a, b, weight in zip(u[lo:hi].tolist(), v[lo:hi].tolist(), w[lo:hi].tolist())))
+    return len(nodes), len(u)
+
+
+def generate_map(kind, nodes, filename, seed=0):
+    """Write a 'grid' or 'geometric' map with about `nodes` nodes; returns (nodes, edges)."""
+    if kind == "grid":
+        arrays = grid_map(max(2, round(math.sqrt(nodes))), seed)
+    elif kind == "geometric":
+        arrays = geometric_map(nodes, seed=seed)
+    else:
+        raise ValueError(f"Unknown map kind '{kind}' (grid or geometric)")
+    return write_map(filename, *arrays)
+
+
+def generate_fleet(graph, size, seed=None, placement="nodes"):
+    """
+    `size` Cars numbered from 1.
+
+    placement: 'nodes' puts cars on distinct random map nodes; 'uniform'
+    draws positions uniformly within the map bounds.
+    """
+    rng = np.random.default_rng([seed, 1] if seed is not None else None)
+    if placement == "nodes":
+        nodes = list(graph.node_coordinates.keys())
+        picks = rng.choice(len(nodes), size=min(size, len(nodes)), replace=False)
+        return [Car(i + 1, tuple(graph.node_coordinates[nodes[p]])) for i, p in enumerate(picks)]
+    if placement == "uniform":
+        min_x, min_y, max_x, max_y = graph.get_bounds()
+        xy = rng.uniform((min_x, min_y), (max_x, max_y), size=(size, 2))
+        return [Car(i + 1, (x, y)) for i, (x, y) in enumerate(xy.tolist())]
+    raise ValueError(f"Unknown fleet placement '{placement}' (nodes or uniform)")
+
+
+def generate_demand(filename, bounds, requests, mean_arrival_time=1.0, seed=0,
+                    hotspots=0, hotspot_share=0.7, hotspot_spread=0.05):
+    """
+    Write a JSONL request trace (the format read by arrivals.TraceArrivals).
+
+    Arrivals are Poisson with the given mean gap, starting at t = 0. With
+    hotspots > 0, hotspot_share of the trips start near one of that many
+    random centres (Gaussian, hotspot_spread times the map size); the rest
+    and every destination are uniform over bounds. Returns the end time.
+    """
+    rng = np.random.default_rng(seed)
+    min_x, min_y, max_x, max_y = bounds
+    low, high = np.array([min_x, min_y]), np.array([max_x, max_y])
+    gaps = rng.exponential(mean_arrival_time, requests)
+    gaps[0] = 0.0
+    times = np.cumsum(gaps)
+    starts = rng.uniform(low, high, size=(requests, 2))
+    if hotspots > 0:
+        centres = rng.uniform(low, high, size=(hotspots, 2))
+        hot = rng.random(requests) < hotspot_share
+        which = rng.integers(0, hotspots, hot.sum())
+        spread = hotspot_spread * (high - low)
+        starts[hot] = np.clip(centres[which] + rng.normal(0, 1, (hot.sum(), 2)) * spread, low, high)
+    dests = rng.uniform(low, high, size=(requests, 2))
+    with open(filename, "w") as f:
+        for i, (t, s, d) in enumerate(zip(times.tolist(), starts.tolist(), dests.tolist())):
+            f.write(json.dumps({"time": t, "start": s, "dest": d, "id": i + 1}) + "\n")
+    return float(times[-1]) if requests else 0.0
+
+
+def generate_traffic(filename, graph, updates, interval=10.0, edges_per_update=20, seed=0,
+                     slowdown=(1.5, 4.0), closure_share=0.05):
+    """
+    Write a traffic file (the format read by traffic.read_traffic).
+
+    Every interval time units, edges_per_update random roads slow down by
+    a factor drawn from slowdown, or close (closure_share of them), and the
+    roads changed by the previous update return to their map weights.
+    """
+    rng = np.random.default_rng([seed, 2])
+    name = graph.node_name if hasattr(graph, "node_name") else (lambda node: node)
+    edges = [(u, v, w) for u in graph.adjacency_list for v, w in graph.adjacency_list[u]]
+    previous = []
+    with open(filename, "w") as f:
+        for k in range(updates):
+            picks = rng.choice(len(edges), size=min(edges_per_update, len(edges)), replace=False)
+            factors = rng.uniform(*slowdown, size=len(picks))
+            closed = rng.random(len(picks)) < closure_share
+            batch = [[name(u), name(v), w] for u, v, w in previous]
+            current = []
+            for p, factor, close in zip(picks.tolist(), factors.tolist(), closed.tolist()):
+                u, v, w = edges[p]
+                batch.append([name(u), name(v), None if close else w * factor])
+                current.append((u, v, w))
+            f.write(json.dumps({"time": (k + 1) * interval, "edges": batch}) + "\n")
+            previous = current
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic maps and demand traces")
+    parser.add_argument("kind", choices=["grid", "geometric", "demand", "traffic"])
+    parser.add_argument("count", type=int, help="Nodes for a map, requests for demand, updates for traffic")
+    parser.add_argument("output", help="Output file (.csv or .csv.gz map, .jsonl trace)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--map-file", type=str, default="map.csv", help="Map demand and traffic are for")
+    parser.add_argument("--mean-arrival-time", type=float, default=1.0)
+    parser.add_argument("--hotspots", type=int, default=0)
+    parser.add_argument("--interval", type=float, default=10.0, help="Time between traffic updates")
+    parser.add_argument("--edges-per-update", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.kind == "demand":
+        from compact_graph import load_graph
+        end = generate_demand(args.output, load_graph(args.map_file).get_bounds(), args.count,
+                              args.mean_arrival_time, args.seed, hotspots=args.hotspots)
+        print(f"Wrote {args.count} requests up to t={end:.1f} to {args.output}")
+    elif args.kind == "traffic":
+        from compact_graph import load_graph
+        generate_traffic(args.output, load_graph(args.map_file), args.count, args.interval,
+                         args.edges_per_update, args.seed)
+        print(f"Wrote {args.count} traffic updates to {args.output}")
+    else:
+        nodes, edges = generate_map(args.kind, args.count, args.output, seed=args.seed)
+        print(f"Wrote {nodes} nodes and {edges} edges to {args.output}")
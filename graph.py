@@ -1,6 +1,8 @@
 # graph.py
 import collections
-import math
+
+from map_loader import load_edges
+from spatial_index import GridIndex
 
 class Graph:
     def __init__(self):
@@ -8,46 +10,116 @@ class Graph:
         self.adjacency_list = collections.defaultdict(list)
         # Stores (x, y) coordinates for each node
         self.node_coordinates = {}
+        # Reverse adjacency (incoming edges), built lazily for one-to-many searches
+        self._reverse_adjacency = None
+        # Grid index over node_coordinates for nearest-node snapping
+        self._spatial_index = None
+        self.load_report = None  # map_loader.LoadReport of the last load
+        # Bumped on every change to edges or weights so caches can tell
+        # their stored distances are stale
+        self.version = 0
     
-    def load_map_data(self, filename):
-        # Load the map from a CSV file
+    def load_map_data(self, filename, directed=False, strict=False):
+        # Load the map from a CSV file (optionally .gz)
         # Each line has: start_id, start_x, start_y, end_id, end_x, end_y, weight
-        with open(filename, 'r') as f:
-            for line in f:
-                if line.startswith('#') or not line.strip():
-                    continue  # Skip comments or empty lines
-                
-                parts = line.strip().split(',')
-                if len(parts) != 7:
-                    continue  # Skip malformed lines
-                
-                start_id, start_x, start_y, end_id, end_x, end_y, weight = parts
-                
-                # Save node coordinates
-                self.node_coordinates[start_id] = (float(start_x), float(start_y))
-                self.node_coordinates[end_id] = (float(end_x), float(end_y))
-                
-                # Save edges in adjacency list (both directions for undirected graph)
-                self.adjacency_list[start_id].append((end_id, float(weight)))
-                self.adjacency_list[end_id].append((start_id, float(weight)))
-    
-    def find_nearest_vertex(self, point):
-        # Given an (x, y) point, find the closest graph node
+        # Parsing, deduplication and validation live in map_loader.load_edges;
+        # the returned LoadReport (also kept as self.load_report) lists
+        # malformed rows and conflicting node coordinates.
+        coords, edges, report = load_edges(filename, directed=directed, strict=strict)
+        self._reverse_adjacency = None
+        self.version += 1
+
+        # Save node coordinates
+        self.node_coordinates.update(coords)
+
+        # Save edges in adjacency list (both directions unless the map is directed)
+        for (start_id, end_id), weight in edges.items():
+            self.adjacency_list[start_id].append((end_id, weight))
+            if not directed:
+                self.adjacency_list[end_id].append((start_id, weight))
+
+        if self.node_coordinates:
+            self.build_spatial_index()
+        self.load_report = report
+        return report
+
+    def set_edge_weight(self, start_id, end_id, weight, directed=False):
+        # Change the weight of an existing edge (both directions unless directed)
+        self.update_edge_weights([(start_id, end_id, weight)], directed=directed)
+
+    def weight_changes(self, changes, directed=False):
+        # Resolve (start, end, weight) updates to the directed edges they
+        # touch, as (u, v, old_weight, new_weight); edges whose weight would
+        # not change are left out. Nothing is modified.
+        resolved = {}
+        for start_id, end_id, weight in changes:
+            found = False
+            for u, v in ((start_id, end_id),) if directed else ((start_id, end_id), (end_id, start_id)):
+                for n, w in self.adjacency_list.get(u, ()):
+                    if n == v:
+                        found = True
+                        old = resolved[(u, v)][0] if (u, v) in resolved else w
+                        resolved[(u, v)] = (old, float(weight))
+            if not found:
+                raise KeyError(f"No edge {start_id} -> {end_id}")
+        return [(u, v, old, new) for (u, v), (old, new) in resolved.items() if old != new]
+
+    def update_edge_weights(self, changes, directed=False):
+        # Apply a batch of (start, end, weight) updates at once (weight
+        # float('inf') closes a road) and return the directed edges that
+        # changed, as from weight_changes(). The reverse adjacency is patched
+        # in place and version is bumped once per batch.
+        changed = self.weight_changes(changes, directed=directed)
+        reverse = self._reverse_adjacency
+        for u, v, _, weight in changed:
+            neighbors = self.adjacency_list[u]
+            for i, (n, _) in enumerate(neighbors):
+                if n == v:
+                    neighbors[i] = (v, weight)
+            if reverse is not None:
+                predecessors = reverse[v]
+                for i, (n, _) in enumerate(predecessors):
+                    if n == u:
+                        predecessors[i] = (u, weight)
+        if changed:
+            self.version += 1
+        return changed
+
+    def reverse_adjacency(self):
+        # reverse[node] = list of (predecessor_node, edge_weight)
+        # Identical to adjacency_list for undirected maps, but searches that
+        # need "cost to reach X" go through this so they stay correct for
+        # directed graphs too.
+        if self._reverse_adjacency is None:
+            reverse = collections.defaultdict(list)
+            for u, neighbors in self.adjacency_list.items():
+                for v, w in neighbors:
+                    reverse[v].append((u, w))
+            self._reverse_adjacency = reverse
+        return self._reverse_adjacency
+
+    def build_spatial_index(self):
+        # (Re)build the static grid index; called after the map is loaded.
+        # Code that edits node_coordinates directly should call this again.
+        self._spatial_index = GridIndex(self.node_coordinates.keys(), self.node_coordinates.values())
+        return self._spatial_index
+
+    def _get_spatial_index(self):
         if not self.node_coordinates:
             raise ValueError("No coordinates loaded")
-        
-        best_node = None
-        best_distance = float('inf')
-        
-        # Iterate over all nodes and compute Euclidean distance
-        for node_id, (node_x, node_y) in self.node_coordinates.items():
-            distance = math.sqrt((point[0] - node_x)**2 + (point[1] - node_y)**2)
-            if distance < best_distance:
-                best_distance = distance
-                best_node = node_id
-        
-        return best_node
-    
+        index = self._spatial_index
+        if index is None or len(index.node_ids) != len(self.node_coordinates):
+            index = self.build_spatial_index()
+        return index
+
+    def find_nearest_vertex(self, point):
+        # Given an (x, y) point, find the closest graph node
+        return self._get_spatial_index().nearest(point)
+
+    def snap_points(self, points):
+        # Snap many (x, y) points to their nearest nodes in one vectorised pass
+        return self._get_spatial_index().snap_points(points)
+
     def get_bounds(self):
         # Return min_x, min_y, max_x, max_y of all nodes (used for Quadtree boundary)
         if not self.node_coordinates:
@@ -0,0 +1,155 @@
+# instrumentation.py
+# Counters and timers for the simulator's hot paths, plus profiling hooks.
+#
+# The hot paths (dijkstra, Quadtree.find_k_nearest, GridIndex.nearest_index,
+# the event loop) count into local variables and report once per call, and
+# only when stats.enabled is set, so the cost while switched off is one
+# attribute check per call.
+#
+#     from instrumentation import stats
+#     stats.enable()
+#     ... run ...
+#     print(stats.summary_table())
+import cProfile
+import collections
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+
+
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self.counters = collections.defaultdict(int)
+        self.timers = {}  # name -> [calls, total seconds, max seconds]
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.counters.clear()
+        self.timers.clear()
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def add_time(self, name, seconds):
+        timer = self.timers.get(name)
+        if timer is None:
+            self.timers[name] = [1, seconds, seconds]
+        else:
+            timer[0] += 1
+            timer[1] += seconds
+            if seconds > timer[2]:
+                timer[2] = seconds
+
+    def to_dict(self):
+        return {
+            "counters": dict(sorted(self.counters.items())),
+            "timers": {name: {"calls": calls, "total_s": total, "mean_us": total / calls * 1e6,
+                              "max_us": longest * 1e6}
+                       for name, (calls, total, longest) in sorted(self.timers.items())},
+        }
+
+    def export_json(self, filename, extra=None):
+        # extra: further sections to store alongside (e.g. routing engine stats)
+        data = self.to_dict()
+        if extra:
+            data.update(extra)
+        with open(filename, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    def summary_table(self):
+        lines = [f"{'counter':<32} {'value':>14}"]
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name:<32} {value:>14,}")
+        if self.timers:
+            lines.append("")
+            lines.append(f"{'timer':<32} {'calls':>10} {'total ms':>10} {'mean us':>10} {'max us':>10}")
+            for name, (calls, total, longest) in sorted(self.timers.items()):
+                lines.append(f"{name:<32} {calls:>10,} {total * 1e3:>10.1f} "
+                             f"{total / calls * 1e6:>10.2f} {longest * 1e6:>10.1f}")
+        return "\n".join(lines)
+
+
+# Process-wide instance used by the instrumented modules
+stats = Instrumentation()
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a background thread records the innermost frames
+    of the profiled thread every `interval` seconds. Far cheaper than
+    cProfile on long runs, at the price of sampling noise.
+    """
+
+    def __init__(self, interval=0.005, depth=1):
+        self.interval = interval
+        self.depth = depth  # innermost frames kept per sample
+        self.samples = collections.Counter()
+        self.total = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None and len(stack) < self.depth:
+                code = frame.f_code
+                stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.samples[" <- ".join(stack)] += 1
+                self.total += 1
+
+    def report(self, limit=25):
+        lines = [f"{'samples':>8} {'share':>7}  location"]
+        for location, n in self.samples.most_common(limit):
+            lines.append(f"{n:>8} {n / self.total:>7.1%}  {location}")
+        return "\n".join(lines)
+
+
+def profile_call(fn, mode, out=None, limit=25):
+    """
+    Run fn() under a profiler and return (result, report text).
+
+    mode: 'cprofile' (deterministic; out receives the raw pstats dump) or
+          'sample' (SamplingProfiler).
+    """
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        result = profiler.runcall(fn)
+        if out:
+            profiler.dump_stats(out)
+        buffer = io.StringIO()
+        pstats.Stats(profiler, stream=buffer).sort_stats("cumulative").print_stats(limit)
+        return result, buffer.getvalue()
+    if mode == "sample":
+        profiler = SamplingProfiler()
+        profiler.start()
+        start = time.perf_counter()
+        try:
+            result = fn()
+        finally:
+            profiler.stop()
+        return result, (f"{profiler.total} samples over {time.perf_counter() - start:.2f}s\n"
+                        + profiler.report(limit))
+    raise ValueError(f"Unknown profiler '{mode}'")
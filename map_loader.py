@@ -0,0 +1,151 @@
+# map_loader.py
+# Streaming, validating reader for map edge files.
+#
+# Each line has: start_id, start_x, start_y, end_id, end_x, end_y, weight
+# Lines starting with '#' and blank lines are ignored. Files ending in .gz are
+# decompressed on the fly. Check a map (and the loader's speed) with:
+#     python map_loader.py map.csv
+import gzip
+import math
+import time
+
+
+class LoadReport:
+    """What the loader saw in a map file, plus its throughput."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.rows = 0                 # data rows read (excluding comments/blank lines)
+        self.edges = 0                # distinct edges kept after deduplication
+        self.malformed = []           # (line_number, line) of unparseable rows or bad weights
+        self.duplicates = 0           # parallel edges merged into an existing edge
+        self.conflicts = []           # (node_id, kept_xy, rejected_xy, line_number)
+        self.seconds = 0.0
+
+    @property
+    def edges_per_sec(self):
+        return self.rows / self.seconds if self.seconds > 0 else float('inf')
+
+    def summary(self):
+        return (f"{self.filename}: {self.rows} rows, {self.edges} edges, "
+                f"{self.duplicates} duplicates merged, {len(self.malformed)} malformed, "
+                f"{len(self.conflicts)} coordinate conflicts, "
+                f"{self.seconds:.3f}s ({self.edges_per_sec:,.0f} edges/sec)")
+
+
+def open_map_file(filename):
+    # Text handle for a plain or gzip-compressed map file
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rt')
+    return open(filename, 'r')
+
+
+def iter_chunks(filename, chunk_bytes=1 << 20):
+    # Yield lists of raw lines, roughly chunk_bytes of input at a time
+    with open_map_file(filename) as f:
+        while True:
+            lines = f.readlines(chunk_bytes)
+            if not lines:
+                return
+            yield lines
+
+
+def load_edges(filename, directed=False, strict=False, chunk_bytes=1 << 20):
+    """
+    Read a whole map file chunk by chunk.
+
+    Parallel edges are merged keeping the minimum weight. For undirected maps
+    A->B and B->A are the same edge, so listing both directions is not a
+    duplicate road. A node's first coordinates are kept; later rows that
+    disagree are reported in LoadReport.conflicts. Rows with a negative,
+    infinite or NaN weight are malformed.
+
+    strict: raise ValueError on the first malformed row or coordinate conflict
+            instead of only reporting it.
+
+    Returns (node_coordinates, edges, report) where edges maps
+    (start_id, end_id) -> weight in first-seen order.
+    """
+    report = LoadReport(filename)
+    coords = {}
+    edges = {}
+    start = time.perf_counter()
+    line_no = 0
+
+    for lines in iter_chunks(filename, chunk_bytes):
+        for line in lines:
+            line_no += 1
+            parts = line.strip().split(',')
+            if len(parts) != 7:
+                if line.startswith('#') or not line.strip():
+                    continue  # Skip comments or empty lines
+                _malformed(report, line_no, line, strict)
+                continue
+            start_id, start_x, start_y, end_id, end_x, end_y, weight = parts
+            if start_id.startswith('#'):
+                continue
+            try:
+                start_xy = (float(start_x), float(start_y))
+                end_xy = (float(end_x), float(end_y))
+                weight = float(weight)
+            except ValueError:
+                _malformed(report, line_no, line, strict)
+                continue
+            # Every routing engine needs finite, non-negative weights
+            if not (weight >= 0 and math.isfinite(weight)):
+                _malformed(report, line_no, line, strict)
+                continue
+            report.rows += 1
+
+            known = coords.setdefault(start_id, start_xy)
+            if known != start_xy:
+                _conflict(report, start_id, known, start_xy, line_no, strict)
+            known = coords.setdefault(end_id, end_xy)
+            if known != end_xy:
+                _conflict(report, end_id, known, end_xy, line_no, strict)
+
+            key = (start_id, end_id)
+            old = edges.get(key)
+            if old is None and not directed:
+                old = edges.get((end_id, start_id))
+                if old is not None:
+                    key = (end_id, start_id)
+            if old is None:
+                edges[key] = weight
+            else:
+                report.duplicates += 1
+                if weight < old:
+                    edges[key] = weight
+
+    report.edges = len(edges)
+    report.seconds = time.perf_counter() - start
+    return coords, edges, report
+
+
+def _conflict(report, node, known, xy, line_no, strict):
+    if strict:
+        raise ValueError(f"{report.filename}:{line_no}: node {node} at {xy}, "
+                         f"previously at {known}")
+    report.conflicts.append((node, known, xy, line_no))
+
+
+def _malformed(report, line_no, line, strict):
+    if strict:
+        raise ValueError(f"{report.filename}:{line_no}: malformed row {line.strip()!r}")
+    report.malformed.append((line_no, line.rstrip('\n')))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Validate a map file and measure load speed")
+    parser.add_argument("map_file", help="Map CSV file (optionally .gz)")
+    parser.add_argument("--directed", action="store_true", help="Treat rows as one-way edges")
+    args = parser.parse_args()
+
+    _, _, report = load_edges(args.map_file, directed=args.directed)
+    print(report.summary())
+    for line_no, line in report.malformed[:10]:
+        print(f"  malformed line {line_no}: {line}")
+    for node, kept, rejected, line_no in report.conflicts[:10]:
+        print(f"  line {line_no}: node {node} at {rejected}, kept {kept}")
@@ -0,0 +1,312 @@
+# metrics.py
+# Online metrics for the simulation. Accumulators are updated as events are
+# handled, so a summary is available at any point of a run without
+# rescanning trips, and collectors from separate runs or shards can be
+# merged.
+import math
+
+
+class RunningStats:
+    # Count, mean, variance (Welford), min and max of a stream
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def merge(self, other):
+        # Chan et al. parallel combination
+        if not other.count:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.mean += delta * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+
+class TDigest:
+    """
+    Merging t-digest (Dunning & Ertl) for streaming quantiles.
+
+    Values are buffered and periodically merged into at most about
+    `compression` centroids; centroids near the tails are kept small, so
+    extreme percentiles stay accurate. Two digests merge by pooling their
+    centroids, which makes percentiles of parallel runs combinable.
+    """
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.means = []
+        self.weights = []
+        self.buffer = []
+        self.buffer_size = 5 * compression
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x, weight=1):
+        self.buffer.append((x, weight))
+        self.count += weight
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+        if len(self.buffer) >= self.buffer_size:
+            self._compress()
+
+    def merge(self, other):
+        self.buffer.extend(zip(other.means, other.weights))
+        self.buffer.extend(other.buffer)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def _k(self, q):
+        # k1 scale function: centroid size shrinks towards q = 0 and q = 1
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def _compress(self):
+        if not self.buffer:
+            return
+        points = sorted(list(zip(self.means, self.weights)) + self.buffer)
+        self.buffer = []
+        total = self.count
+        means, weights = [], []
+        mean, weight = points[0]
+        before = 0.0  # weight of the centroids already emitted
+        k_start = self._k(0.0)
+        for x, w in points[1:]:
+            if self._k((before + weight + w) / total) - k_start <= 1.0:
+                weight += w
+                mean += (x - mean) * w / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                before += weight
+                k_start = self._k(before / total)
+                mean, weight = x, w
+        means.append(mean)
+        weights.append(weight)
+        self.means, self.weights = means, weights
+
+    def quantile(self, q):
+        """Estimated q-quantile (0 <= q <= 1); nan if nothing was added."""
+        self._compress()
+        if not self.count:
+            return math.nan
+        if len(self.means) == 1:
+            return self.means[0]
+        target = q * self.count
+        # Interpolate between centroid centres; min and max anchor the ends
+        prev_pos, prev_value = 0.0, self.min
+        cumulative = 0.0
+        for mean, weight in zip(self.means, self.weights):
+            pos = cumulative + weight / 2
+            if target < pos:
+                span = pos - prev_pos
+                frac = (target - prev_pos) / span if span > 0 else 0.0
+                return prev_value + frac * (mean - prev_value)
+            prev_pos, prev_value = pos, mean
+            cumulative += weight
+        span = self.count - prev_pos
+        frac = (target - prev_pos) / span if span > 0 else 0.0
+        return prev_value + frac * (self.max - prev_value)
+
+    def percentiles(self, ps=(50, 90, 99)):
+        return {f"p{p}": self.quantile(p / 100) for p in ps}
+
+
+class TimeSeries:
+    """
+    Per-interval counters: requests, assignments, completed trips, summed
+    wait of the trips completed in the interval, car busy time (split
+    across the intervals a busy period overlaps), riders that had to queue
+    for a car, and riders that gave up waiting.
+    """
+
+    FIELDS = ("requests", "assigned", "completed", "wait_sum", "busy_time", "queued", "abandoned")
+
+    def __init__(self, interval=10.0):
+        self.interval = interval
+        # interval index -> [requests, assigned, completed, wait_sum, busy_time,
+        # queued, abandoned], one value per FIELDS entry
+        self.buckets = {}
+
+    def _bucket(self, time):
+        index = int(time // self.interval)
+        bucket = self.buckets.get(index)
+        if bucket is None:
+            bucket = self.buckets[index] = [0, 0, 0, 0.0, 0.0, 0, 0]
+        return bucket
+
+    def add(self, time, field, amount=1):
+        self._bucket(time)[self.FIELDS.index(field)] += amount
+
+    def add_busy(self, start, end):
+        while start < end:
+            boundary = (int(start // self.interval) + 1) * self.interval
+            stop = min(end, boundary)
+            self._bucket(start)[4] += stop - start
+            start = stop
+
+    def merge(self, other):
+        for index, values in other.buckets.items():
+            bucket = self.buckets.setdefault(index, [0, 0, 0, 0.0, 0.0, 0, 0])
+            for i, value in enumerate(values):
+                bucket[i] += value
+
+    def rows(self, fleet_size=None):
+        """One dict per interval in time order; utilization needs fleet_size."""
+        out = []
+        for index in sorted(self.buckets):
+            requests, assigned, completed, wait_sum, busy, queued, abandoned = self.buckets[index]
+            row = {"start": index * self.interval, "requests": requests, "assigned": assigned,
+                   "completed": completed, "avg_wait_time": wait_sum / completed if completed else 0.0,
+                   "busy_time": busy, "queued": queued, "abandoned": abandoned}
+            if fleet_size:
+                row["utilization"] = busy / (fleet_size * self.interval)
+            out.append(row)
+        return out
+
+
+class MetricsCollector:
+    """
+    Metrics updated by the simulation's event handlers.
+
+    A car is busy from the moment it is assigned until dropoff, so busy time
+    covers the pickup leg as well as the ride. Every update is O(1)
+    (busy periods spanning several series intervals excepted).
+    """
+
+    def __init__(self, interval=10.0, compression=100):
+        self.requests = 0
+        self.assigned = 0
+        self.cancelled = 0
+        self.wait = RunningStats()
+        self.trip = RunningStats()
+        self.wait_digest = TDigest(compression)
+        self.trip_digest = TDigest(compression)
+        self.busy = {}        # car_id -> busy time of finished trips
+        self.busy_since = {}  # car_id -> assignment time of the trip under way
+        self.series = TimeSeries(interval)
+        # Waiting-rider queue: riders that found no free car on request
+        self.queued = 0
+        self.abandoned = 0
+        self.queue_length = 0
+        self.max_queue_length = 0
+        self.queue_area = 0.0   # integral of queue length over time
+        self.queue_since = 0.0  # time of the last queue length change
+
+    def on_request(self, time):
+        self.requests += 1
+        self.series.add(time, "requests")
+
+    def on_assign(self, car_id, time, count=True):
+        # count=False: the car starts a trip for a rider already counted
+        if count:
+            self.assigned += 1
+            self.series.add(time, "assigned")
+        self.busy_since[car_id] = time
+
+    def _end_busy(self, car_id, time):
+        start = self.busy_since.pop(car_id, time)
+        self.busy[car_id] = self.busy.get(car_id, 0.0) + (time - start)
+        self.series.add_busy(start, time)
+
+    def on_cancel(self, car_id, time):
+        self.cancelled += 1
+        self._end_busy(car_id, time)
+
+    def on_trip_complete(self, car_id, wait_time, trip_duration, time):
+        self._end_busy(car_id, time)
+        self.wait.add(wait_time)
+        self.trip.add(trip_duration)
+        self.wait_digest.add(wait_time)
+        self.trip_digest.add(trip_duration)
+        self.series.add(time, "completed")
+        self.series.add(time, "wait_sum", wait_time)
+
+    def _queue_change(self, time, delta):
+        self.queue_area += self.queue_length * (time - self.queue_since)
+        self.queue_since = time
+        self.queue_length += delta
+        self.max_queue_length = max(self.max_queue_length, self.queue_length)
+
+    def on_queue(self, time):
+        self.queued += 1
+        self._queue_change(time, 1)
+        self.series.add(time, "queued")
+
+    def on_dequeue(self, time):
+        # A waiting rider got a car
+        self._queue_change(time, -1)
+
+    def on_abandon(self, time):
+        self.abandoned += 1
+        self._queue_change(time, -1)
+        self.series.add(time, "abandoned")
+
+    def queue_summary(self, now):
+        """Queue statistics up to now (time-averaged length over [0, now])."""
+        area = self.queue_area + self.queue_length * max(now - self.queue_since, 0.0)
+        return {"riders_queued": self.queued, "riders_abandoned": self.abandoned,
+                "riders_waiting": self.queue_length,
+                "abandonment_rate": self.abandoned / self.requests if self.requests else 0.0,
+                "avg_queue_length": area / now if now > 0 else 0.0,
+                "max_queue_length": self.max_queue_length}
+
+    def busy_times(self, now):
+        """Busy time per car up to now, counting trips still under way."""
+        busy = dict(self.busy)
+        for car_id, start in self.busy_since.items():
+            busy[car_id] = busy.get(car_id, 0.0) + max(now - start, 0.0)
+        return busy
+
+    def merge(self, other):
+        """Fold in the metrics of another run or shard."""
+        self.requests += other.requests
+        self.assigned += other.assigned
+        self.cancelled += other.cancelled
+        self.wait.merge(other.wait)
+        self.trip.merge(other.trip)
+        self.wait_digest.merge(other.wait_digest)
+        self.trip_digest.merge(other.trip_digest)
+        for car_id, busy in other.busy.items():
+            self.busy[car_id] = self.busy.get(car_id, 0.0) + busy
+        self.busy_since.update(other.busy_since)
+        self.series.merge(other.series)
+        # Separate queues (e.g. shards) add up; the combined peak is at most the sum
+        self.queued += other.queued
+        self.abandoned += other.abandoned
+        end = max(self.queue_since, other.queue_since)
+        self.queue_area += (self.queue_length * (end - self.queue_since)
+                            + other.queue_area + other.queue_length * (end - other.queue_since))
+        self.queue_since = end
+        self.queue_length += other.queue_length
+        self.max_queue_length += other.max_queue_length
+        return self
+
+    def snapshot(self, percentiles=(50, 90, 99)):
+        # Scalars only; per-car utilization comes from busy_times()
+        return {"requests": self.requests, "assigned": self.assigned, "completed": self.wait.count,
+                "avg_wait_time": self.wait.mean, "avg_trip_duration": self.trip.mean,
+                "queued": self.queued, "abandoned": self.abandoned, "queue_length": self.queue_length,
+                "wait_time_percentiles": self.wait_digest.percentiles(percentiles),
+                "trip_duration_percentiles": self.trip_digest.percentiles(percentiles)}
@@ -0,0 +1,261 @@
+# path_cache.py
+# Memoisation of shortest-path results. Riders and cars cluster on the same
+# hub nodes, so the same (car_node, rider_node) and (pickup_node, dest_node)
+# pairs are asked for again and again during a run.
+import collections
+
+from dijkstra import dijkstra
+
+
+class PathCache:
+    """
+    Bounded LRU cache keyed by (start_node, end_node).
+
+    Each entry holds the cost and, once known, the path. ETA lookups only
+    need the cost, so an entry filled by a one-to-many search can still
+    answer them before any path has been computed for the pair.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()  # (start, end) -> [cost, path or None]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0  # entries dropped by edge weight changes
+
+    def get_cost(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def get_path(self, key):
+        entry = self.entries.get(key)
+        if entry is None or (entry[1] is None and entry[0] != float('inf')):
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[0]
+
+    def put(self, key, cost, path=None):
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry[0] = cost
+            if path is not None:
+                entry[1] = path
+            self.entries.move_to_end(key)
+            return
+        self.entries[key] = [cost, path]
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def discard(self, keys):
+        for key in keys:
+            self.entries.pop(key, None)
+        self.invalidations += len(keys)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "invalidations": self.invalidations, "entries": len(self.entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+class AllPairsTable:
+    """
+    Precomputed distances (and shortest-path trees) between every pair of
+    nodes. Memory is O(n^2), so it is only meant for small maps such as the
+    bundled map.csv.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.dist = {}
+        self.prev = {}
+        for node in graph.adjacency_list:
+            self.dist[node], self.prev[node] = dijkstra(graph, node)
+
+    def stale_rows(self, changed):
+        """
+        Sources whose shortest-path tree an edge change can alter: a heavier
+        edge matters only to trees that use it, a lighter one only where it
+        shortens the way to its head. Call before recompute_rows().
+        """
+        inf = float('inf')
+        rows = set()
+        for source, dist in self.dist.items():
+            prev = self.prev[source]
+            for u, v, old, new in changed:
+                if (new > old and prev.get(v) == u) or (new < old and dist.get(u, inf) + new < dist.get(v, inf)):
+                    rows.add(source)
+                    break
+        return rows
+
+    def recompute_rows(self, rows):
+        for node in rows:
+            self.dist[node], self.prev[node] = dijkstra(self.graph, node)
+
+    def cost(self, start_node, end_node):
+        return self.dist.get(start_node, {}).get(end_node, float('inf'))
+
+    def path(self, start_node, end_node):
+        prev = self.prev.get(start_node, {})
+        if end_node not in prev:
+            return None, float('inf')
+        path = []
+        cur = end_node
+        while cur is not None:
+            path.append(cur)
+            cur = prev[cur]
+        path.reverse()
+        return path, self.dist[start_node][end_node]
+
+
+class CachedEngine:
+    """
+    Wraps a routing engine (see routing.py) with an LRU PathCache and, for
+    maps with at most all_pairs_max_nodes nodes, an AllPairsTable.
+
+    Both are tied to graph.version: a change made behind its back drops
+    the cached results and the table is rebuilt on next use. Weight changes
+    made through update_weights() only drop what they affect.
+    """
+
+    # Above this many changed edges in one batch, the per-edge searches
+    # that find affected entries cost more than refilling the cache
+    MAX_REPAIR_EDGES = 64
+
+    def __init__(self, engine, max_entries=10000, all_pairs_max_nodes=0):
+        self.engine = engine
+        self.graph = engine.graph
+        self.name = engine.name
+        self.cache = PathCache(max_entries) if max_entries > 0 else None
+        self.all_pairs_max_nodes = all_pairs_max_nodes
+        self.all_pairs = None
+        self._version = None
+        self._check_version()
+
+    def _check_version(self):
+        if self._version == self.graph.version:
+            return
+        self._version = self.graph.version
+        if self.cache is not None:
+            self.cache.clear()
+        self.all_pairs = None
+        if 0 < len(self.graph.adjacency_list) <= self.all_pairs_max_nodes:
+            self.all_pairs = AllPairsTable(self.graph)
+
+    @property
+    def stats(self):
+        return self.engine.stats
+
+    def update_weights(self, changes, directed=False):
+        """
+        Same as the engine's update_weights, but keeps every cached result
+        the change cannot affect. An entry (s, t) with cost c is dropped when
+        a heavier edge u -> v lies on its stored path, or on any shortest
+        path (d(s, u) + w_old + d(v, t) == c, measured before the change),
+        or when a lighter edge gives a shorter way (d(s, u) + w_new + d(v, t)
+        < c, measured after it). All-pairs rows are repaired the same way.
+        """
+        self._check_version()
+        changed = self.graph.weight_changes(changes, directed=directed)
+        if not changed:
+            return changed
+        stale_rows = self.all_pairs.stale_rows(changed) if self.all_pairs is not None else ()
+        repair = self.cache is not None and len(changed) <= self.MAX_REPAIR_EDGES
+        stale = self._stale_entries([c for c in changed if c[3] > c[2]], False) if repair else set()
+
+        self.engine.update_weights([(u, v, new) for u, v, _, new in changed], directed=True)
+        self._version = self.graph.version
+
+        if self.cache is not None:
+            if repair:
+                stale |= self._stale_entries([c for c in changed if c[3] < c[2]], True)
+                self.cache.discard(stale)
+            else:
+                self.cache.invalidations += len(self.cache.entries)
+                self.cache.clear()
+        if stale_rows:
+            self.all_pairs.recompute_rows(stale_rows)
+        return changed
+
+    def _stale_entries(self, edges, lighter):
+        # Cache keys an edge change invalidates (see update_weights)
+        entries = self.cache.entries
+        if not edges or not entries:
+            return set()
+        inf = float('inf')
+        stale = set()
+        if not lighter:
+            heavier = {(u, v) for u, v, _, _ in edges}
+            for key, (_, path) in entries.items():
+                if path and any(pair in heavier for pair in zip(path, path[1:])):
+                    stale.add(key)
+        # Searches stop at the largest cost they could still undercut
+        # (unbounded if a lighter edge might reconnect an unreachable pair)
+        costs = [cost for cost, _ in entries.values()]
+        finite = [cost for cost in costs if cost < inf]
+        if not finite and not lighter:
+            return stale
+        cutoff = None if not finite or (lighter and len(finite) < len(costs)) else max(finite)
+        sources = {s for s, _ in entries}
+        targets = {t for _, t in entries}
+        for u, v, old, new in edges:
+            to_u, _ = dijkstra(self.graph, u, targets=sources, cutoff=cutoff, reverse=True)
+            from_v, _ = dijkstra(self.graph, v, targets=targets, cutoff=cutoff)
+            for key, (cost, _) in entries.items():
+                if lighter:
+                    if to_u.get(key[0], inf) + new + from_v.get(key[1], inf) < cost:
+                        stale.add(key)
+                elif cost < inf and to_u.get(key[0], inf) + old + from_v.get(key[1], inf) <= cost * (1 + 1e-12):
+                    stale.add(key)
+        return stale
+
+    def cache_stats(self):
+        stats = self.cache.stats() if self.cache is not None else {}
+        stats["all_pairs"] = self.all_pairs is not None
+        return stats
+
+    def shortest_path(self, start_node, end_node):
+        self._check_version()
+        if self.all_pairs is not None:
+            return self.all_pairs.path(start_node, end_node)
+        if self.cache is None:
+            return self.engine.shortest_path(start_node, end_node)
+        key = (start_node, end_node)
+        hit = self.cache.get_path(key)
+        if hit is not None:
+            return hit
+        path, cost = self.engine.shortest_path(start_node, end_node)
+        self.cache.put(key, cost, path)
+        return path, cost
+
+    def etas(self, target_node, source_nodes):
+        self._check_version()
+        if self.all_pairs is not None:
+            return {n: self.all_pairs.cost(n, target_node) for n in source_nodes}
+        if self.cache is None:
+            return self.engine.etas(target_node, source_nodes)
+        result = {}
+        missing = set()
+        for n in source_nodes:
+            cost = self.cache.get_cost((n, target_node))
+            if cost is None:
+                missing.add(n)
+            else:
+                result[n] = cost
+        if missing:
+            for n, cost in self.engine.etas(target_node, missing).items():
+                self.cache.put((n, target_node), cost)
+                result[n] = cost
+        return result
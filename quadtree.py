@@ -1,5 +1,9 @@
 # quadtree.py
+import heapq
 import math
+from array import array
+
+from instrumentation import stats
 
 class Rectangle:
     def __init__(self, x, y, width, height):
@@ -16,51 +20,113 @@ class Rectangle:
                     self.y >= other.y + other.height or
                     other.y >= self.y + self.height)
 
+    def min_distance(self, point):
+        # Smallest distance from point to any location inside the rectangle
+        # (0 if the point is inside). Used as the lower bound for k-NN pruning.
+        dx = max(self.x - point[0], 0.0, point[0] - (self.x + self.width))
+        dy = max(self.y - point[1], 0.0, point[1] - (self.y + self.height))
+        return math.hypot(dx, dy)
+
 class Quadtree:
-    def __init__(self, boundary, capacity=4):
+    """
+    Point quadtree of cars (or bare points).
+
+    Entries are kept in the leaves as parallel lists of points, cars and
+    keys. The root indexes every key (the car's car_id; bare points get a
+    private key) to the leaf holding it, so remove_car and move cost
+    O(depth) with no search. Any number of cars may share a location;
+    leaves at max_depth simply grow past capacity. Every node counts the
+    entries below it, and a subtree left with at most `capacity` entries
+    after a removal is collapsed back into one leaf.
+    """
+
+    def __init__(self, boundary, capacity=4, max_depth=24, _parent=None):
         self.boundary = boundary
         self.capacity = capacity
+        self.max_depth = max_depth
         self.points = []           # list of (x,y)
-        self.car_map = {}          # (x,y) -> car
+        self.items = []            # car stored at each point (or None)
+        self.keys = []             # index key of each point
+        self.count = 0             # entries in this subtree
         self.divided = False
         self.nw = self.ne = self.sw = self.se = None
+        self.parent = _parent
+        self.depth = 0 if _parent is None else _parent.depth + 1
+        self.root = self if _parent is None else _parent.root
+        if _parent is None:
+            self.index = {}        # key -> leaf holding it (root only)
+            self._next_key = 0
 
-    def insert(self, point, car=None):
-        if not self.boundary.contains(point):
-            return False
+    def __len__(self):
+        return self.count
 
-        if len(self.points) < self.capacity and not self.divided:
-            self.points.append(point)
-            if car is not None:
-                self.car_map[point] = car
-            return True
+    def __contains__(self, car_id):
+        return car_id in self.root.index
 
-        if not self.divided:
-            self.subdivide()
+    # ---------------------------------------------------------------- layout
+    def _child(self, point):
+        # The quadrant containing point (same split as subdivide)
+        b = self.boundary
+        west = point[0] < b.x + b.width / 2
+        if point[1] < b.y + b.height / 2:
+            return self.nw if west else self.ne
+        return self.sw if west else self.se
 
-        return (self.nw.insert(point, car) or self.ne.insert(point, car) or
-                self.sw.insert(point, car) or self.se.insert(point, car))
+    def _leaf(self, point):
+        node = self
+        while node.divided:
+            node = node._child(point)
+        return node
 
     def subdivide(self):
         x, y = self.boundary.x, self.boundary.y
         w2, h2 = self.boundary.width / 2, self.boundary.height / 2
-        self.nw = Quadtree(Rectangle(x,       y,       w2, h2), self.capacity)
-        self.ne = Quadtree(Rectangle(x + w2,  y,       w2, h2), self.capacity)
-        self.sw = Quadtree(Rectangle(x,       y + h2,  w2, h2), self.capacity)
-        self.se = Quadtree(Rectangle(x + w2,  y + h2,  w2, h2), self.capacity)
+        self.nw = Quadtree(Rectangle(x,       y,       w2, h2), self.capacity, self.max_depth, self)
+        self.ne = Quadtree(Rectangle(x + w2,  y,       w2, h2), self.capacity, self.max_depth, self)
+        self.sw = Quadtree(Rectangle(x,       y + h2,  w2, h2), self.capacity, self.max_depth, self)
+        self.se = Quadtree(Rectangle(x + w2,  y + h2,  w2, h2), self.capacity, self.max_depth, self)
         self.divided = True
+        # Hand this leaf's entries down to the new quadrants
+        points, items, keys = self.points, self.items, self.keys
+        self.points, self.items, self.keys = [], [], []
+        for entry in zip(points, items, keys):
+            self._child(entry[0])._append(*entry)
 
-    def remove(self, point):
-        # remove point and mapping from this node if present
-        if point in self.points:
-            self.points.remove(point)
-            self.car_map.pop(point, None)
-            return True
-        # recurse
+    def _append(self, point, car, key):
+        # Add an entry to this leaf (counts above are the caller's business)
+        self.points.append(point)
+        self.items.append(car)
+        self.keys.append(key)
+        self.count += 1
+        self.root.index[key] = self
+        if len(self.points) > self.capacity and self.depth < self.max_depth:
+            self.subdivide()
+
+    def _collapse(self):
+        # Merge underfull subtrees into single leaves, from here upwards
+        node = self
+        while node is not None and node.divided and node.count <= node.capacity:
+            entries = []
+            node._collect_entries(entries)
+            node.divided = False
+            node.nw = node.ne = node.sw = node.se = None
+            node._set_entries(entries)
+            node = node.parent
+
+    def _set_entries(self, entries):
+        # Make this node a leaf holding (point, car, key) entries
+        self.points = [point for point, _, _ in entries]
+        self.items = [car for _, car, _ in entries]
+        self.keys = [key for _, _, key in entries]
+        index = self.root.index
+        for key in self.keys:
+            index[key] = self
+
+    def _collect_entries(self, out):
+        out.extend(zip(self.points, self.items, self.keys))
         if self.divided:
-            return (self.nw.remove(point) or self.ne.remove(point) or
-                    self.sw.remove(point) or self.se.remove(point))
-        return False
+            for child in (self.nw, self.ne, self.sw, self.se):
+                child._collect_entries(out)
 
     def _collect_points(self, out):
         out.extend(self.points)
@@ -70,21 +136,297 @@ class Quadtree:
             self.sw._collect_points(out)
             self.se._collect_points(out)
 
-    def find_k_nearest(self, query_point, k=5):
-        # simple but effective: collect, compute dists, n-smallest
-        all_pts = []
-        self._collect_points(all_pts)
-        all_pts.sort(key=lambda p: math.hypot(p[0]-query_point[0], p[1]-query_point[1]))
-        return all_pts[:k]
+    # ------------------------------------------------------------- updates
+    def _key(self, point, car):
+        car_id = getattr(car, "car_id", None)
+        if car_id is not None:
+            return car_id
+        root = self.root
+        root._next_key += 1
+        return ("point", root._next_key)
+
+    def insert(self, point, car=None):
+        if not self.boundary.contains(point):
+            return False
+        key = self._key(point, car)
+        if key in self.root.index:
+            raise ValueError(f"car {key!r} is already in the quadtree (use move)")
+        node = self
+        while node.divided:
+            node.count += 1
+            node = node._child(point)
+        node._append(point, car, key)
+        return True
+
+    def insert_many(self, points, cars=None):
+        """
+        Insert many points (and their cars) at once. Into an empty tree they
+        are bulk-loaded top-down, without the splits and re-distribution of
+        one-by-one insertion. Returns the number inserted.
+        """
+        cars = list(cars) if cars is not None else [None] * len(points)
+        if self.count or self.divided:
+            return sum(self.insert(p, c) for p, c in zip(points, cars))
+        entries = []
+        for point, car in zip(points, cars):
+            if self.boundary.contains(point):
+                key = self._key(point, car)
+                if key in self.root.index:
+                    raise ValueError(f"car {key!r} is already in the quadtree (use move)")
+                self.root.index[key] = None  # placeholder, set by _build
+                entries.append((point, car, key))
+        self._build(entries)
+        return len(entries)
+
+    @classmethod
+    def bulk_load(cls, boundary, points, cars=None, capacity=4, max_depth=24):
+        tree = cls(boundary, capacity, max_depth)
+        tree.insert_many(points, cars)
+        return tree
+
+    def _build(self, entries):
+        self.count = len(entries)
+        if len(entries) <= self.capacity or self.depth >= self.max_depth:
+            self._set_entries(entries)
+            return
+        b = self.boundary
+        mid_x, mid_y = b.x + b.width / 2, b.y + b.height / 2
+        quadrants = ([], [], [], [])  # nw, ne, sw, se
+        for entry in entries:
+            x, y = entry[0]
+            quadrants[(y >= mid_y) * 2 + (x >= mid_x)].append(entry)
+        self.subdivide()
+        for child, part in zip((self.nw, self.ne, self.sw, self.se), quadrants):
+            child._build(part)
+
+    def _detach(self, leaf, i):
+        # Drop entry i of leaf and fix the counts up to the root
+        key = leaf.keys.pop(i)
+        leaf.points.pop(i)
+        car = leaf.items.pop(i)
+        node = leaf
+        while node is not None:
+            node.count -= 1
+            node = node.parent
+        return key, car
+
+    def remove_car(self, car_id):
+        """Remove the entry with this key (a car's car_id) in O(depth)."""
+        leaf = self.root.index.pop(car_id, None)
+        if leaf is None:
+            return False
+        self._detach(leaf, leaf.keys.index(car_id))
+        if leaf.parent is not None:
+            leaf.parent._collapse()
+        return True
+
+    def remove(self, point):
+        # remove one entry at point (the quadrant path is known from the point)
+        leaf = self._leaf(point)
+        if point not in leaf.points:
+            return False
+        return self.remove_car(leaf.keys[leaf.points.index(point)])
+
+    def move(self, car_id, new_point):
+        """
+        Move an entry to new_point in O(depth): updated in place if it stays
+        in its leaf, otherwise re-inserted below the lowest ancestor that
+        contains new_point. An entry moved outside the tree's boundary is
+        removed and False is returned.
+        """
+        root = self.root
+        leaf = root.index.get(car_id)
+        if leaf is None:
+            raise KeyError(car_id)
+        i = leaf.keys.index(car_id)
+        if leaf.boundary.contains(new_point):
+            leaf.points[i] = new_point
+            return True
+        if not root.boundary.contains(new_point):
+            self.remove_car(car_id)
+            return False
+        leaf.keys.pop(i)
+        leaf.points.pop(i)
+        car = leaf.items.pop(i)
+        # Counts change only between the old leaf and the common ancestor
+        ancestor = leaf
+        while not ancestor.boundary.contains(new_point):
+            ancestor.count -= 1
+            ancestor = ancestor.parent
+        node = ancestor
+        while node.divided:
+            node = node._child(new_point)
+            if node.divided:
+                node.count += 1
+        node._append(new_point, car, car_id)
+        if leaf.parent is not None:
+            leaf.parent._collapse()
+        return True
+
+    # ------------------------------------------------------------- queries
+    def _nearest(self, query_point, k, predicate, max_radius):
+        # Best-first search shared by find_k_nearest and find_k_nearest_cars;
+        # returns (point, car) pairs
+        if k <= 0:
+            return []
+        qx, qy = query_point
+        results = []
+        counter = 0  # tie-breaker so the heap never compares nodes or points
+        heap = [(self.boundary.min_distance(query_point), counter, self, None)]
+        visited = 0  # quadtree nodes expanded
+        while heap:
+            dist, _, node, entry = heapq.heappop(heap)
+            if max_radius is not None and dist > max_radius:
+                break
+            if node is None:
+                # a point popped before every remaining quadrant and point
+                results.append(entry)
+                if len(results) == k:
+                    break
+                continue
+            visited += 1
+            for p, car in zip(node.points, node.items):
+                if predicate is not None and not predicate(p if car is None else car):
+                    continue
+                counter += 1
+                heapq.heappush(heap, (math.hypot(p[0] - qx, p[1] - qy), counter, None, (p, car)))
+            if node.divided:
+                for child in (node.nw, node.ne, node.sw, node.se):
+                    if child.count:
+                        counter += 1
+                        heapq.heappush(heap, (child.boundary.min_distance(query_point),
+                                              counter, child, None))
+        if stats.enabled:
+            stats.count("quadtree.knn_queries")
+            stats.count("quadtree.nodes_visited", visited)
+        return results
+
+    def find_k_nearest(self, query_point, k=5, predicate=None, max_radius=None):
+        """
+        Best-first branch-and-bound k-nearest-neighbour search.
+
+        Quadrants and points share one priority queue ordered by their minimum
+        distance to query_point, so the search stops as soon as k points have
+        been popped: nothing left in the queue can be closer.
+
+        predicate: optional callable taking the car stored at a point (or the
+                   point itself when no car was inserted); points for which it
+                   returns False are skipped, so k usable results come back
+                   whenever k exist.
+        max_radius: optional distance limit; farther points are never returned.
+
+        Returns a list of up to k points, closest first.
+        """
+        return [p for p, _ in self._nearest(query_point, k, predicate, max_radius)]
+
+    def find_k_nearest_cars(self, query_point, k=5, predicate=None, max_radius=None):
+        # As find_k_nearest, but returns the cars; cars sharing a location
+        # are all returned, unlike a lookup by point
+        return [car for _, car in self._nearest(query_point, k, predicate, max_radius)]
 
     def get_car_at_location(self, location):
-        # try exact key; for floats this is fine since we inserted exact tuples
-        if location in self.car_map:
-            return self.car_map[location]
-        # search children if needed
-        if self.divided:
-            return (self.nw.get_car_at_location(location) or
-                    self.ne.get_car_at_location(location) or
-                    self.sw.get_car_at_location(location) or
-                    self.se.get_car_at_location(location))
+        # first car stored at exactly this point; only its leaf is searched
+        leaf = self._leaf(location)
+        for p, car in zip(leaf.points, leaf.items):
+            if p == location:
+                return car
         return None
+
+    def depth_stats(self):
+        # (nodes, leaves, max depth): how fragmented the tree is
+        nodes = leaves = deepest = 0
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            nodes += 1
+            deepest = max(deepest, node.depth - self.depth)
+            if node.divided:
+                stack.extend((node.nw, node.ne, node.sw, node.se))
+            else:
+                leaves += 1
+        return nodes, leaves, deepest
+
+    def pack(self):
+        """Read-only PackedQuadtree snapshot of this tree."""
+        return PackedQuadtree(self)
+
+
+class PackedQuadtree:
+    """
+    Array-backed, read-only copy of a Quadtree for static point sets (e.g.
+    a parked fleet queried many times). Nodes are numbered breadth-first
+    with the four children of a node stored consecutively; node bounds,
+    child offsets and entry ranges live in typed arrays and the entries of
+    each leaf are contiguous. That is a handful of arrays instead of one
+    Python object and four lists per node.
+    """
+
+    def __init__(self, tree):
+        self.x0, self.y0, self.x1, self.y1 = array('d'), array('d'), array('d'), array('d')
+        self.first_child = array('i')          # index of the nw child, -1 for leaves
+        self.start, self.end = array('i'), array('i')  # entry range of a leaf
+        self.count = array('i')                # entries in each subtree
+        self.px, self.py = array('d'), array('d')
+        self.items = []
+        queue = [tree]
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            b = node.boundary
+            self.x0.append(b.x)
+            self.y0.append(b.y)
+            self.x1.append(b.x + b.width)
+            self.y1.append(b.y + b.height)
+            self.start.append(len(self.items))
+            self.count.append(node.count)
+            if node.divided:
+                self.first_child.append(len(queue))
+                queue.extend((node.nw, node.ne, node.sw, node.se))
+            else:
+                self.first_child.append(-1)
+                for (x, y), car in zip(node.points, node.items):
+                    self.px.append(x)
+                    self.py.append(y)
+                    self.items.append(car)
+            self.end.append(len(self.items))
+
+    def __len__(self):
+        return len(self.items)
+
+    def find_k_nearest_cars(self, query_point, k=5, predicate=None, max_radius=None):
+        """Same search and results as Quadtree.find_k_nearest_cars."""
+        if k <= 0 or not self.items:
+            return []
+        qx, qy = query_point
+        x0, y0, x1, y1 = self.x0, self.y0, self.x1, self.y1
+        first_child, start, end, count = self.first_child, self.start, self.end, self.count
+        px, py, items = self.px, self.py, self.items
+        results = []
+        counter = 0
+        heap = [(0.0, 0, 0, -1)]  # (distance, tie-breaker, node or -1, entry or -1)
+        while heap:
+            dist, _, node, entry = heapq.heappop(heap)
+            if max_radius is not None and dist > max_radius:
+                break
+            if node < 0:
+                results.append(items[entry])
+                if len(results) == k:
+                    break
+                continue
+            child = first_child[node]
+            if child < 0:
+                for e in range(start[node], end[node]):
+                    car = items[e]
+                    if predicate is not None and not predicate((px[e], py[e]) if car is None else car):
+                        continue
+                    counter += 1
+                    heapq.heappush(heap, (math.hypot(px[e] - qx, py[e] - qy), counter, -1, e))
+                continue
+            for c in range(child, child + 4):
+                if count[c]:
+                    dx = max(x0[c] - qx, 0.0, qx - x1[c])
+                    dy = max(y0[c] - qy, 0.0, qy - y1[c])
+                    counter += 1
+                    heapq.heappush(heap, (math.hypot(dx, dy), counter, c, -1))
+        return results
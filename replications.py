@@ -0,0 +1,174 @@
+# replications.py
+# Independent Monte Carlo replications of RideSharingSimulation run across a
+# process pool, merged into means, percentiles and confidence intervals.
+#
+# Example: 20 seeds for every combination of two fleet sizes and two arrival rates
+#     python replications.py --replications 20 --fleet-sizes 5 10 --mean-arrival-times 2 5
+import argparse
+import itertools
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from compact_graph import load_graph
+from event_log import NullSink
+from metrics import MetricsCollector
+from generators import generate_fleet
+from simulation import RideSharingSimulation
+
+# Metrics merged across replications (all scalar outputs of calculate_metrics,
+# plus the mean of the per-car utilization and the p90 wait of each run)
+SUMMARY_METRICS = ["total_riders_generated", "total_trips", "riders_assigned",
+                   "avg_wait_time", "wait_time_p90", "avg_trip_duration", "avg_driver_utilization",
+                   "abandonment_rate", "dispatch_cpu_per_request"]
+
+# Two-sided Student t critical values for small samples; larger samples use z
+_T_TABLE = {
+    0.90: [6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812,
+           1.796, 1.782, 1.771, 1.761, 1.753, 1.746, 1.740, 1.734, 1.729, 1.725,
+           1.721, 1.717, 1.714, 1.711, 1.708, 1.706, 1.703, 1.701, 1.699, 1.697],
+    0.95: [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+           2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+           2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042],
+    0.99: [63.657, 9.925, 5.841, 4.604, 4.032, 3.707, 3.499, 3.355, 3.250, 3.169,
+           3.106, 3.055, 3.012, 2.977, 2.947, 2.921, 2.898, 2.878, 2.861, 2.845,
+           2.831, 2.819, 2.807, 2.797, 2.787, 2.779, 2.771, 2.763, 2.756, 2.750],
+}
+_Z = {0.90: 1.645, 0.95: 1.960, 0.99: 2.576}
+
+# Per-worker state, set up once by _init_worker
+_worker_graph = None
+_worker_map_file = None
+_worker_quiet = True
+
+
+def _init_worker(map_file, quiet):
+    # Load the map once per worker process. For a binary .bin map the arrays
+    # are memory-mapped, so all workers share the same physical pages.
+    global _worker_graph, _worker_map_file, _worker_quiet
+    _worker_map_file = map_file
+    _worker_graph = load_graph(map_file)
+    _worker_quiet = quiet
+
+
+def run_replication(params):
+    """
+    One independent simulation run. params holds fleet_size, mean_arrival_time,
+    max_time, seed and any extra RideSharingSimulation keyword arguments.
+    Cars start at distinct random map nodes drawn from the same seed.
+    Returns the scalar metrics and the run's MetricsCollector.
+    """
+    params = dict(params)
+    fleet_size = params.pop("fleet_size")
+    seed = params["seed"]
+    if _worker_quiet:
+        params.setdefault("event_log", NullSink())  # no pickup/dropoff lines
+    sim = RideSharingSimulation(map_file=_worker_map_file, graph=_worker_graph, **params)
+
+    sim.add_cars(generate_fleet(sim.graph, fleet_size, seed))  # seeded apart from the arrivals
+    sim.run()
+
+    metrics = sim.calculate_metrics()
+    util = metrics["driver_utilization"]
+    metrics["avg_driver_utilization"] = sum(util.values()) / len(util) if util else 0.0
+    metrics["wait_time_p90"] = metrics["wait_time_percentiles"]["p90"]
+    return {name: metrics[name] for name in SUMMARY_METRICS}, sim.metrics
+
+
+def summarize(values, confidence=0.95, percentiles=(5, 50, 95)):
+    """Mean, standard deviation, percentiles and a t confidence interval."""
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    mean = float(values.mean()) if n else float('nan')
+    std = float(values.std(ddof=1)) if n > 1 else 0.0
+    if n > 1:
+        critical = _T_TABLE[confidence][n - 2] if n - 1 <= 30 else _Z[confidence]
+        half_width = critical * std / math.sqrt(n)
+    else:
+        half_width = float('inf')
+    summary = {"n": n, "mean": mean, "std": std,
+               "ci_low": mean - half_width, "ci_high": mean + half_width}
+    for p in percentiles:
+        summary[f"p{p}"] = float(np.percentile(values, p)) if n else float('nan')
+    return summary
+
+
+def replication_seeds(base_seed, replications):
+    # Independent, reproducible per-replication seeds
+    return [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(base_seed).spawn(replications)]
+
+
+def sweep(map_file="map.csv", fleet_sizes=(5,), mean_arrival_times=(5.0,), replications=10,
+          max_time=100, base_seed=0, workers=None, confidence=0.95, quiet=True, **sim_kwargs):
+    """
+    Run `replications` seeds for every (fleet_size, mean_arrival_time) pair.
+
+    Every parameter point uses the same seeds (common random numbers), so
+    differences between points are not masked by seed-to-seed noise.
+    Returns one dict per point with the summary of each metric, and wait
+    and trip percentiles over the trips of all its replications (merged
+    t-digests).
+    """
+    map_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), map_file)
+    seeds = replication_seeds(base_seed, replications)
+    points = list(itertools.product(fleet_sizes, mean_arrival_times))
+    jobs = [dict(fleet_size=f, mean_arrival_time=a, max_time=max_time, seed=s, **sim_kwargs)
+            for f, a in points for s in seeds]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(map_file, quiet)) as pool:
+        outputs = list(pool.map(run_replication, jobs))
+
+    results = []
+    for i, (fleet_size, mean_arrival_time) in enumerate(points):
+        runs = outputs[i * replications:(i + 1) * replications]
+        pooled = MetricsCollector()
+        for _, collector in runs:
+            pooled.merge(collector)
+        results.append({
+            "fleet_size": fleet_size,
+            "mean_arrival_time": mean_arrival_time,
+            "replications": replications,
+            "metrics": {name: summarize([r[name] for r, _ in runs], confidence) for name in SUMMARY_METRICS},
+            "pooled_wait_time_percentiles": pooled.wait_digest.percentiles(),
+            "pooled_trip_duration_percentiles": pooled.trip_digest.percentiles(),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel replications and parameter sweeps")
+    parser.add_argument("--map-file", type=str, default="map.csv", help="Map file (CSV or .bin)")
+    parser.add_argument("--replications", type=int, default=10, help="Seeds per parameter point")
+    parser.add_argument("--fleet-sizes", type=int, nargs="+", default=[5], help="Fleet sizes to sweep")
+    parser.add_argument("--mean-arrival-times", type=float, nargs="+", default=[5.0],
+                        help="Mean rider inter-arrival times to sweep")
+    parser.add_argument("--max-time", type=int, default=100, help="Simulated time per run")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed for all replications")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--confidence", type=float, choices=sorted(_T_TABLE), default=0.95,
+                        help="Confidence level of the intervals")
+    parser.add_argument("--json", type=str, default=None, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    results = sweep(map_file=args.map_file, fleet_sizes=args.fleet_sizes,
+                    mean_arrival_times=args.mean_arrival_times, replications=args.replications,
+                    max_time=args.max_time, base_seed=args.seed, workers=args.workers,
+                    confidence=args.confidence)
+
+    for point in results:
+        print(f"\nfleet={point['fleet_size']} mean_arrival_time={point['mean_arrival_time']} "
+              f"({point['replications']} replications)")
+        for name, s in point["metrics"].items():
+            print(f"  {name:<26} mean {s['mean']:10.4f}  {int(args.confidence * 100)}% CI "
+                  f"[{s['ci_low']:.4f}, {s['ci_high']:.4f}]  p50 {s['p50']:.4f}")
+        waits = point["pooled_wait_time_percentiles"]
+        print(f"  pooled wait time           p50 {waits['p50']:.4f}  p90 {waits['p90']:.4f}  "
+              f"p99 {waits['p99']:.4f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
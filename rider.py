@@ -1,12 +1,16 @@
 # rider.py
 class Rider:
+    # Fixed attribute set: no per-rider __dict__ (millions of riders per run)
+    __slots__ = ("id", "start_location", "destination", "status", "request_time", "pickup_time",
+                 "dropoff_time", "wait_time", "trip_duration", "start_node", "dest_node")
+
     def __init__(self, rider_id, start_location, destination):
         self.id = rider_id
         self.start_location = start_location
         self.destination = destination
 
         # instrumentation (for rubric: request, pickup, dropoff times)
-        self.status = "waiting"      # waiting, in_car, completed
+        self.status = "waiting"      # waiting, assigned, in_car, completed, abandoned
         self.request_time = None
         self.pickup_time = None
         self.dropoff_time = None
@@ -15,6 +19,10 @@ class Rider:
         self.wait_time = 0.0
         self.trip_duration = 0.0
 
+        # graph nodes snapped by the simulation at dispatch time
+        self.start_node = None
+        self.dest_node = None
+
     def request_ride(self, t):
         self.status = "waiting"
         self.request_time = t
@@ -0,0 +1,104 @@
+# rider_pool.py
+# Riders waiting for a car, indexed by pickup location so a car that
+# becomes free can find the closest waiting riders without scanning them all.
+import math
+
+
+class RiderPool:
+    """
+    Waiting riders bucketed into a uniform grid over the map bounds.
+
+    add and remove are O(1); nearest() searches rings of cells outwards
+    from the query point and stops once no unsearched cell can hold a
+    closer rider, so its cost depends on local density rather than on the
+    number of waiting riders. Riders with identical pickup points are
+    fine (each is its own entry).
+    """
+
+    # Below this many riders a plain scan beats walking empty cells
+    SCAN_LIMIT = 32
+
+    def __init__(self, bounds, cells_per_side=64):
+        self.min_x, self.min_y, max_x, max_y = bounds
+        self.n = cells_per_side
+        self.cell_w = max((max_x - self.min_x) / cells_per_side, 1e-12)
+        self.cell_h = max((max_y - self.min_y) / cells_per_side, 1e-12)
+        self.cells = {}   # (cx, cy) -> {rider: None}, insertion ordered
+        self.where = {}   # rider -> cell key
+
+    def __len__(self):
+        return len(self.where)
+
+    def __contains__(self, rider):
+        return rider in self.where
+
+    def __iter__(self):
+        return iter(self.where)
+
+    def _cell(self, point):
+        cx = min(max(int((point[0] - self.min_x) / self.cell_w), 0), self.n - 1)
+        cy = min(max(int((point[1] - self.min_y) / self.cell_h), 0), self.n - 1)
+        return cx, cy
+
+    def add(self, rider):
+        key = self._cell(rider.start_location)
+        self.cells.setdefault(key, {})[rider] = None
+        self.where[rider] = key
+
+    def remove(self, rider):
+        """Take a rider out of the pool; False if it was not waiting."""
+        key = self.where.pop(rider, None)
+        if key is None:
+            return False
+        cell = self.cells[key]
+        del cell[rider]
+        if not cell:
+            del self.cells[key]
+        return True
+
+    def nearest(self, point, k=5):
+        """Up to k waiting riders closest to point (straight line), nearest first."""
+        if not self.where:
+            return []
+        px, py = point
+        if len(self.where) <= self.SCAN_LIMIT:
+            riders = sorted(self.where, key=lambda r: (r.start_location[0] - px) ** 2
+                                                      + (r.start_location[1] - py) ** 2)
+            return riders[:k]
+
+        cx, cy = self._cell(point)
+        found = []  # (squared distance, order, rider)
+        order = 0
+        for ring in range(self.n):
+            for key in self._ring(cx, cy, ring):
+                for rider in self.cells.get(key, ()):
+                    x, y = rider.start_location
+                    found.append(((x - px) ** 2 + (y - py) ** 2, order, rider))
+                    order += 1
+            if len(found) >= k:
+                found.sort(key=lambda item: item[:2])
+                del found[k:]
+                # Anything outside the searched square is at least this far away
+                reach = ring * min(self.cell_w, self.cell_h)
+                if found[-1][0] <= reach * reach:
+                    break
+        found.sort(key=lambda item: item[:2])
+        return [rider for _, _, rider in found[:k]]
+
+    def _ring(self, cx, cy, ring):
+        # Cells at Chebyshev distance `ring` from (cx, cy), clipped to the grid
+        if ring == 0:
+            yield cx, cy
+            return
+        lo_x, hi_x = cx - ring, cx + ring
+        lo_y, hi_y = cy - ring, cy + ring
+        for x in range(max(lo_x, 0), min(hi_x, self.n - 1) + 1):
+            if lo_y >= 0:
+                yield x, lo_y
+            if hi_y < self.n:
+                yield x, hi_y
+        for y in range(max(lo_y + 1, 0), min(hi_y - 1, self.n - 1) + 1):
+            if lo_x >= 0:
+                yield lo_x, y
+            if hi_x < self.n:
+                yield hi_x, y
@@ -0,0 +1,294 @@
+# routing.py
+# Pluggable shortest-path engines. Every engine answers the same queries as
+# dijkstra.find_shortest_path -- (path, cost), or (None, inf) if unreachable --
+# and keeps counters so engines can be compared on the same map.
+#
+# Edge weights may change during a run (update_weights). Plain Dijkstra
+# reads the graph directly; engines with precomputed data repair it or,
+# where that is not possible, fall back to Dijkstra (see weights_changed).
+import heapq
+import math
+
+from ch import ContractionHierarchy
+from dijkstra import dijkstra
+
+
+class DijkstraEngine:
+    """Plain Dijkstra; the reference every other engine must agree with."""
+    name = "dijkstra"
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.stats = {"queries": 0, "nodes_settled": 0}
+
+    def shortest_path(self, start_node, end_node):
+        dist, prev = dijkstra(self.graph, start_node, targets=(end_node,))
+        self.stats["queries"] += 1
+        self.stats["nodes_settled"] += len(dist)
+        if end_node not in dist:
+            return None, float('inf')
+        return _unwind(prev, end_node), dist[end_node]
+
+    def etas(self, target_node, source_nodes):
+        # One reverse search from the target settles every source at once
+        if not source_nodes:
+            return {}
+        dist, _ = dijkstra(self.graph, target_node, targets=source_nodes, reverse=True)
+        self.stats["queries"] += 1
+        self.stats["nodes_settled"] += len(dist)
+        return {n: dist.get(n, float('inf')) for n in source_nodes}
+
+    def update_weights(self, changes, directed=False):
+        """
+        Apply (start, end, weight) edge updates to the graph in one batch and
+        bring the engine up to date. Returns the changed directed edges as
+        (u, v, old_weight, new_weight).
+        """
+        changed = self.graph.update_edge_weights(changes, directed=directed)
+        if changed:
+            self.weights_changed(changed)
+        return changed
+
+    def weights_changed(self, changed):
+        # Nothing precomputed to repair
+        pass
+
+
+class AStarEngine(DijkstraEngine):
+    """
+    A* with a Euclidean heuristic over graph.node_coordinates.
+
+    Edge weights are not necessarily equal to straight-line length, so the
+    heuristic is scaled by the smallest weight/length ratio over all edges.
+    That keeps it a lower bound on the remaining cost (admissible).
+    """
+    name = "astar"
+
+    def __init__(self, graph):
+        super().__init__(graph)
+        self.scale = self._heuristic_scale()
+
+    def _heuristic_scale(self):
+        coords = self.graph.node_coordinates
+        scale = float('inf')
+        for u, neighbors in self.graph.adjacency_list.items():
+            ux, uy = coords[u]
+            for v, w in neighbors:
+                length = math.hypot(coords[v][0] - ux, coords[v][1] - uy)
+                if length > 0:
+                    scale = min(scale, w / length)
+        return 0.0 if scale == float('inf') else scale
+
+    def weights_changed(self, changed):
+        # Heavier edges keep the heuristic a lower bound; a lighter edge can
+        # only lower the scale
+        coords = self.graph.node_coordinates
+        for u, v, _, w in changed:
+            length = math.hypot(coords[v][0] - coords[u][0], coords[v][1] - coords[u][1])
+            if length > 0:
+                self.scale = min(self.scale, w / length)
+
+    def _heuristic(self, end_node):
+        coords = self.graph.node_coordinates
+        tx, ty = coords[end_node]
+        scale = self.scale
+        return lambda n: scale * math.hypot(coords[n][0] - tx, coords[n][1] - ty)
+
+    def shortest_path(self, start_node, end_node):
+        return self._search(start_node, end_node, self._heuristic(end_node))
+
+    def etas(self, target_node, source_nodes):
+        # Goal-directed searches all head for the same target, so the
+        # heuristic is built once and shared
+        h = self._heuristic(target_node)
+        return {n: self._search(n, target_node, h)[1] for n in source_nodes}
+
+    def _search(self, start_node, end_node, h):
+        adjacency = self.graph.adjacency_list
+        best = {start_node: 0.0}
+        prev = {start_node: None}
+        closed = set()
+        pq = [(h(start_node), 0.0, start_node)]
+        while pq:
+            _, d, u = heapq.heappop(pq)
+            if u in closed:
+                continue
+            closed.add(u)
+            if u == end_node:
+                break
+            for v, w in adjacency.get(u, ()):
+                nd = d + w
+                if nd < best.get(v, float('inf')):
+                    best[v] = nd
+                    prev[v] = u
+                    heapq.heappush(pq, (nd + h(v), nd, v))
+
+        self.stats["queries"] += 1
+        self.stats["nodes_settled"] += len(closed)
+        if end_node not in closed:
+            return None, float('inf')
+        return _unwind(prev, end_node), best[end_node]
+
+
+class ALTEngine(AStarEngine):
+    """
+    A* with landmark lower bounds (ALT: A*, Landmarks, Triangle inequality).
+
+    Distance tables to and from a handful of landmarks are computed once per
+    map. For any node v and target t, d(L, t) - d(L, v) and d(v, L) - d(t, L)
+    are lower bounds on d(v, t); the heuristic takes the best of them.
+    """
+    name = "alt"
+
+    def __init__(self, graph, num_landmarks=8):
+        DijkstraEngine.__init__(self, graph)
+        self.landmarks = []
+        self.from_landmark = []  # d(L, v)
+        self.to_landmark = []    # d(v, L)
+        self._select_landmarks(num_landmarks)
+
+    def _select_landmarks(self, num_landmarks):
+        # Farthest-point selection: each new landmark is the node farthest
+        # from the landmarks chosen so far, which spreads them to the map edges
+        nodes = list(self.graph.adjacency_list)
+        if not nodes:
+            return
+        seed_dist, _ = dijkstra(self.graph, nodes[0])
+        candidate = max(seed_dist, key=seed_dist.get)
+        closest = {}
+        for _ in range(min(num_landmarks, len(nodes))):
+            from_l, _ = dijkstra(self.graph, candidate)
+            to_l, _ = dijkstra(self.graph, candidate, reverse=True)
+            self.landmarks.append(candidate)
+            self.from_landmark.append(from_l)
+            self.to_landmark.append(to_l)
+            for n, d in from_l.items():
+                if d < closest.get(n, float('inf')):
+                    closest[n] = d
+            candidate = max(closest, key=closest.get)
+            if closest[candidate] == 0:
+                break
+
+    def weights_changed(self, changed):
+        # Landmark distances measured before a weight increase still give
+        # lower bounds (no distance got shorter). After a decrease they may
+        # not, so the tables are recomputed for the same landmarks: two
+        # full searches per landmark.
+        if any(new < old for _, _, old, new in changed):
+            self.from_landmark = [dijkstra(self.graph, l)[0] for l in self.landmarks]
+            self.to_landmark = [dijkstra(self.graph, l, reverse=True)[0] for l in self.landmarks]
+
+    def _heuristic(self, end_node):
+        inf = float('inf')
+        tables = [(f, t, f.get(end_node, inf), t.get(end_node, inf))
+                  for f, t in zip(self.from_landmark, self.to_landmark)]
+
+        def h(n):
+            best = 0.0
+            for from_l, to_l, l_to_t, t_to_l in tables:
+                l_to_n = from_l.get(n, inf)
+                if l_to_t < inf and l_to_n < inf and l_to_t - l_to_n > best:
+                    best = l_to_t - l_to_n
+                n_to_l = to_l.get(n, inf)
+                if n_to_l < inf and t_to_l < inf and n_to_l - t_to_l > best:
+                    best = n_to_l - t_to_l
+            return best
+        return h
+
+
+class CHEngine(DijkstraEngine):
+    """
+    Bidirectional contraction-hierarchy queries (see ch.py).
+
+    With a map_file the hierarchy is loaded from <map_file>.ch, or built and
+    saved there on first use; without one it is built in memory.
+
+    Shortcut weights bake in the edge weights, so any weight change makes
+    the hierarchy stale: queries then fall back to plain Dijkstra, and after
+    rebuild_after such queries the updated graph is contracted again (in
+    memory only). A rebuild costs a few hundred Dijkstra queries, so maps
+    whose weights change more often than they are queried stay on the
+    fallback.
+    """
+    name = "ch"
+
+    def __init__(self, graph, map_file=None, rebuild_after=500):
+        super().__init__(graph)
+        if map_file is None:
+            self.ch = ContractionHierarchy.build(graph)
+        else:
+            self.ch = ContractionHierarchy.for_map(graph, map_file)
+        self.rebuild_after = rebuild_after
+        self.stale = False
+        self.stale_queries = 0
+        self.stats["rebuilds"] = 0
+
+    def weights_changed(self, changed):
+        self.stale = True
+        self.stale_queries = 0
+
+    def rebuild(self):
+        self.ch = ContractionHierarchy.build(self.graph)
+        self.stale = False
+        self.stats["rebuilds"] += 1
+
+    def _fallback(self):
+        # True while stale queries should still go to Dijkstra
+        if not self.stale:
+            return False
+        self.stale_queries += 1
+        if self.stale_queries > self.rebuild_after:
+            self.rebuild()
+            return False
+        return True
+
+    def shortest_path(self, start_node, end_node):
+        if self._fallback():
+            return super().shortest_path(start_node, end_node)
+        path, cost = self.ch.shortest_path(start_node, end_node)
+        self.stats["queries"] += 1
+        self.stats["nodes_settled"] += self.ch.last_settled
+        return path, cost
+
+    def etas(self, target_node, source_nodes):
+        if self._fallback():
+            return super().etas(target_node, source_nodes)
+        # The backward upward space of the target is shared by all sources
+        backward = self.ch.upward_search(target_node, backward=True)
+        result = {}
+        for n in source_nodes:
+            forward = self.ch.upward_search(n) if n in self.ch.rank else {}
+            self.stats["nodes_settled"] += len(forward)
+            result[n] = min((d + backward[m] for m, d in forward.items() if m in backward),
+                            default=float('inf'))
+        self.stats["queries"] += 1
+        self.stats["nodes_settled"] += len(backward)
+        return result
+
+
+def _unwind(prev, end_node):
+    path = []
+    cur = end_node
+    while cur is not None:
+        path.append(cur)
+        cur = prev[cur]
+    path.reverse()
+    return path
+
+
+ENGINES = {
+    DijkstraEngine.name: DijkstraEngine,
+    AStarEngine.name: AStarEngine,
+    ALTEngine.name: ALTEngine,
+    CHEngine.name: CHEngine,
+}
+
+
+def make_engine(name, graph, map_file=None):
+    # Build the routing engine registered under name for this graph.
+    # map_file lets engines with preprocessing (CH) cache it next to the map.
+    if name not in ENGINES:
+        raise ValueError(f"Unknown routing engine '{name}' (choose from {', '.join(ENGINES)})")
+    if name == CHEngine.name:
+        return CHEngine(graph, map_file=map_file)
+    return ENGINES[name](graph)
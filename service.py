@@ -0,0 +1,463 @@
+# service.py
+# Live dispatch service: the simulation's greedy matching behind an asyncio
+# server, plus a load-generator client.
+#
+# Clients speak newline-delimited JSON over TCP (or stdin/stdout):
+#
+#   {"type": "car", "id": 7, "position": [x, y]}                 add or move a free car
+#   {"type": "request", "id": 12, "start": [x, y], "dest": [x, y]}
+#       -> {"type": "assignment", "rider_id": 12, "car_id": 7, "eta": 3.2,
+#           "pickup_time": 41.0, "latency_ms": 0.41}   (car_id null if no car is free)
+#   {"type": "info"}   -> map bounds, clock and fleet size
+#   {"type": "stats"}  -> request-to-assignment latency percentiles and counters
+#
+# Simulated time follows the wall clock times --speed. Pickups and dropoffs
+# happen as simulation events, so a car is busy until its trip ends on that
+# clock. All simulation state is touched by one dedicated thread; the
+# event loop only parses and routes messages. With --executor process the
+# ETA searches run in a pool of processes that each load the map.
+#
+#     python service.py serve --port 8765 --speed 10
+#     python service.py load --port 8765 --rate 200 --duration 10 --cars 50
+#     python service.py demo --rate 200 --duration 5     (both in one process)
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from car import Car
+from compact_graph import load_graph
+from event_log import NullSink
+from metrics import RunningStats, TDigest
+from rider import Rider
+from routing import make_engine
+from simulation import RideSharingSimulation
+
+# --- ETA workers for --executor process (one routing engine per process) ---
+_worker_router = None
+
+
+def _init_worker(map_file, routing):
+    global _worker_router
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), map_file)
+    _worker_router = make_engine(routing, load_graph(path), map_file=path)
+
+
+def _worker_etas(rider_node, car_nodes):
+    return _worker_router.etas(rider_node, set(car_nodes))
+
+
+def _worker_ready(_):
+    return _worker_router is not None
+
+
+class ServiceClock:
+    # Simulated time = seconds since start x speed
+    def __init__(self, speed=1.0):
+        self.speed = speed
+        self.start = time.monotonic()
+
+    def now(self):
+        return (time.monotonic() - self.start) * self.speed
+
+
+class LatencyStats:
+    # Request-to-assignment latency in milliseconds (streaming percentiles)
+    def __init__(self):
+        self.digest = TDigest()
+        self.running = RunningStats()
+
+    def add(self, ms):
+        self.digest.add(ms)
+        self.running.add(ms)
+
+    def summary(self):
+        return {"count": self.running.count, "mean_ms": self.running.mean,
+                "max_ms": self.running.max if self.running.count else 0.0,
+                **{f"{p}_ms": v for p, v in self.digest.percentiles((50, 90, 99)).items()}}
+
+
+class DispatchService:
+    """
+    Greedy dispatch against a live fleet. Requests are matched the way
+    RideSharingSimulation.dispatch_greedy does it; the simulation runs
+    with no end time and its clock is advanced to ServiceClock.now()
+    before every operation and on a periodic tick.
+
+    executor: 'thread' runs whole dispatches on the simulation thread;
+    'process' computes the ETAs of the candidate cars in `workers` worker
+    processes, so several requests can be routed in parallel.
+    """
+
+    def __init__(self, map_file="map.csv", routing="dijkstra", speed=1.0, executor="thread",
+                 workers=None, tick=0.05, event_log=None, **sim_kwargs):
+        self.sim = RideSharingSimulation(max_time=math.inf, map_file=map_file, routing=routing,
+                                         event_log=event_log or NullSink(), **sim_kwargs)
+        self.clock = ServiceClock(speed)
+        self.tick = tick
+        self.cars = {}  # car id -> Car
+        self.latency = LatencyStats()
+        self.matched = 0
+        self.unmatched = 0
+        self.retries = 0
+        # Single thread owning the simulation: no locks needed around it
+        self.sim_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dispatch-sim")
+        self.pool = None
+        self.workers = workers or os.cpu_count() or 1
+        if executor == "process":
+            # Spawned, not forked: a forked worker would inherit open client
+            # sockets and keep connections alive after the client closes them
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            initargs=(map_file, routing),
+                                            mp_context=multiprocessing.get_context("spawn"))
+        elif executor != "thread":
+            raise ValueError(f"Unknown executor '{executor}' (thread or process)")
+        self._ticker = None
+        self._connections = set()  # serve_stream tasks of open TCP connections
+
+    async def _on_sim(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.sim_thread, fn, *args)
+
+    # ------------------------------------------------ simulation thread only
+    def _advance(self):
+        # Process pickups and dropoffs due by now and move the clock there
+        now = self.clock.now()
+        self.sim.run_until(now)
+        self.sim.current_time = max(self.sim.current_time, now)
+
+    def _update_car(self, car_id, position):
+        self._advance()
+        sim = self.sim
+        car = self.cars.get(car_id)
+        if car is None:
+            car = self.cars[car_id] = Car(car_id, position)
+            sim.add_car(car)
+        elif car.available:
+            # Free cars follow their reported position; busy ones follow their trip
+            car.position = position
+            car.node = None
+            sim.quadtree.move(car_id, position)
+
+    def _new_rider(self, rider_id, start, dest):
+        self._advance()
+        sim = self.sim
+        if rider_id is None:
+            rider_id = sim.next_rider_id
+            sim.next_rider_id += 1
+        rider = Rider(rider_id, start, dest)
+        rider.request_time = sim.current_time
+        sim.total_riders_generated += 1
+        sim.metrics.on_request(sim.current_time)
+        return rider
+
+    def _dispatch(self, rider_id, start, dest):
+        rider = self._new_rider(rider_id, start, dest)
+        return rider, self.sim.dispatch_greedy(rider)
+
+    def _candidates(self, rider):
+        # Nearest free cars and the nodes needed for their ETAs
+        sim = self.sim
+        rider_node = sim.graph.find_nearest_vertex(rider.start_location)
+        cars = []
+        for car in sim.quadtree.find_k_nearest_cars(rider.start_location, k=5,
+                                                    predicate=lambda car: car.available):
+            if car.available:
+                if car.node is None:
+                    car.node = sim.graph.find_nearest_vertex(car.position)
+                cars.append(car)
+        return rider_node, cars
+
+    def _commit(self, rider, rider_node, cars, etas):
+        # Best candidate that is still free; None if all were taken meanwhile
+        self._advance()
+        best = min((car for car in cars if car.available),
+                   key=lambda car: etas.get(car.node, math.inf), default=None)
+        if best is None or math.isinf(etas.get(best.node, math.inf)):
+            return None
+        self.sim.assign_car(best, best.node, rider, rider_node, etas[best.node])
+        return best
+
+    def _stats(self):
+        self._advance()
+        sim = self.sim
+        return {"type": "stats", "clock": sim.current_time, "cars": len(self.cars),
+                "free_cars": sum(car.available for car in self.cars.values()),
+                "requests": sim.total_riders_generated, "matched": self.matched,
+                "unmatched": self.unmatched, "retries": self.retries,
+                "completed_trips": sim.metrics.wait.count, "latency": self.latency.summary(),
+                "events": sim.events.stats()}
+
+    # ------------------------------------------------------------ async API
+    async def update_car(self, car_id, position):
+        await self._on_sim(self._update_car, car_id, position)
+
+    async def request_ride(self, rider_id, start, dest, received=None):
+        """Match one request; returns the assignment message."""
+        received = received or time.perf_counter()
+        if self.pool is None:
+            rider, car = await self._on_sim(self._dispatch, rider_id, start, dest)
+        else:
+            loop = asyncio.get_running_loop()
+            rider = await self._on_sim(self._new_rider, rider_id, start, dest)
+            car = None
+            for _ in range(3):  # candidates may be taken while their ETAs are computed
+                rider_node, cars = await self._on_sim(self._candidates, rider)
+                if not cars:
+                    break
+                etas = await loop.run_in_executor(self.pool, _worker_etas, rider_node,
+                                                  [car.node for car in cars])
+                car = await self._on_sim(self._commit, rider, rider_node, cars, etas)
+                if car is not None:
+                    break
+                self.retries += 1
+        latency_ms = (time.perf_counter() - received) * 1000
+        self.latency.add(latency_ms)
+        if car is None:
+            self.unmatched += 1
+            return {"type": "assignment", "rider_id": rider.id, "car_id": None,
+                    "latency_ms": latency_ms}
+        self.matched += 1
+        return {"type": "assignment", "rider_id": rider.id, "car_id": car.car_id,
+                "eta": rider.wait_time, "pickup_time": rider.request_time + rider.wait_time,
+                "latency_ms": latency_ms}
+
+    async def stats(self):
+        return await self._on_sim(self._stats)
+
+    async def handle_message(self, message, received=None):
+        kind = message.get("type")
+        if kind == "car":
+            await self.update_car(message["id"], tuple(map(float, message["position"])))
+            return None
+        if kind == "request":
+            return await self.request_ride(message.get("id"), tuple(map(float, message["start"])),
+                                           tuple(map(float, message["dest"])), received)
+        if kind == "stats":
+            return await self.stats()
+        if kind == "info":
+            return {"type": "info", "bounds": list(self.sim.bounds), "clock": self.clock.now(),
+                    "speed": self.clock.speed, "cars": len(self.cars)}
+        raise ValueError(f"unknown message type {kind!r}")
+
+    async def _tick(self):
+        # Keep trips completing on time even when no messages arrive
+        while True:
+            await asyncio.sleep(self.tick)
+            await self._on_sim(self._advance)
+
+    async def start(self):
+        # Worker processes load the map before the first request, not during it
+        if self.pool is not None:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(self.pool, _worker_ready, i)
+                                   for i in range(self.workers)))
+        if self._ticker is None:
+            self.clock.start = time.monotonic()  # simulated time starts with the service
+            self._ticker = asyncio.get_running_loop().create_task(self._tick())
+
+    async def close(self):
+        if self._connections:
+            # Let clients that already hung up finish their last replies
+            await asyncio.wait(self._connections, timeout=5.0)
+        if self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+        self.sim_thread.shutdown(wait=True)
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+
+    async def serve_stream(self, reader, writer):
+        """Handle one JSON-lines connection; requests are answered as they finish."""
+        pending = set()
+
+        async def answer(message, received):
+            try:
+                reply = await self.handle_message(message, received)
+            except (KeyError, TypeError, ValueError) as e:
+                reply = {"type": "error", "message": str(e)}
+            if reply is not None:
+                writer.write((json.dumps(reply) + "\n").encode())
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            received = time.perf_counter()
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError as e:
+                writer.write((json.dumps({"type": "error", "message": f"bad JSON: {e}"}) + "\n").encode())
+                continue
+            if message.get("type") in ("car", "stats"):
+                if message["type"] == "stats" and pending:
+                    await asyncio.wait(pending)  # stats include every earlier request
+                await answer(message, received)  # in order, before later requests
+            else:
+                task = asyncio.ensure_future(answer(message, received))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            await writer.drain()
+        if pending:
+            await asyncio.gather(*pending)
+        await writer.drain()
+
+    async def serve_tcp(self, host="127.0.0.1", port=8765):
+        await self.start()
+
+        async def connection(reader, writer):
+            task = asyncio.current_task()
+            self._connections.add(task)
+            try:
+                await self.serve_stream(reader, writer)
+            finally:
+                self._connections.discard(task)
+                writer.close()
+
+        return await asyncio.start_server(connection, host, port)
+
+    async def serve_stdio(self):
+        await self.start()
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+        writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+        await self.serve_stream(reader, writer)
+
+
+async def run_load(host="127.0.0.1", port=8765, rate=100.0, duration=10.0, cars=50, seed=0):
+    """
+    Open-loop load generator: places `cars` free cars, then sends Poisson
+    ride requests at `rate` per second for `duration` seconds without
+    waiting for replies. Returns client round-trip and server latency
+    summaries.
+    """
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+
+    async def call(message):
+        writer.write((json.dumps(message) + "\n").encode())
+        await writer.drain()
+        return json.loads(await reader.readline())
+
+    info = await call({"type": "info"})
+    min_x, min_y, max_x, max_y = info["bounds"]
+
+    def point():
+        return [rng.uniform(min_x, max_x), rng.uniform(min_y, max_y)]
+
+    for car_id in range(1, cars + 1):
+        writer.write((json.dumps({"type": "car", "id": car_id, "position": point()}) + "\n").encode())
+
+    sent = {}
+    round_trip = LatencyStats()
+    matched = 0
+
+    async def receive():
+        # Replies arrive in completion order; the stats reply ends the run
+        nonlocal matched
+        while True:
+            reply = json.loads(await reader.readline())
+            if reply["type"] == "assignment":
+                round_trip.add((time.perf_counter() - sent.pop(reply["rider_id"])) * 1000)
+                matched += reply["car_id"] is not None
+            elif reply["type"] == "stats":
+                return reply
+            else:
+                raise RuntimeError(f"service error: {reply}")
+
+    receiver = asyncio.ensure_future(receive())
+    start = time.perf_counter()
+    next_send = start
+    rider_id = 0
+    # Rider ids are offset so several load generators can share one service
+    base = rng.randrange(1 << 30) * 1000
+    while next_send - start < duration:
+        await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+        rider_id += 1
+        sent[base + rider_id] = time.perf_counter()
+        writer.write((json.dumps({"type": "request", "id": base + rider_id, "start": point(),
+                                  "dest": point()}) + "\n").encode())
+        await writer.drain()
+        next_send += rng.expovariate(rate)
+    elapsed = time.perf_counter() - start
+    # Let the last requests finish, then ask for the server's view
+    while sent and not receiver.done():
+        await asyncio.sleep(0.01)
+    writer.write((json.dumps({"type": "stats"}) + "\n").encode())
+    await writer.drain()
+    server_stats = await receiver
+    writer.close()
+    await writer.wait_closed()
+    return {"requests": rider_id, "offered_rate": rider_id / elapsed, "matched": matched,
+            "round_trip": round_trip.summary(), "server": server_stats}
+
+
+def print_load_report(report):
+    rt = report["round_trip"]
+    print(f"Sent {report['requests']} requests at {report['offered_rate']:.1f}/s, "
+          f"{report['matched']} matched")
+    print(f"Client round trip ms  p50 {rt['p50_ms']:.3f}  p90 {rt['p90_ms']:.3f}  "
+          f"p99 {rt['p99_ms']:.3f}  max {rt['max_ms']:.3f}")
+    server = report["server"]
+    if server:
+        lat = server["latency"]
+        print(f"Server assignment ms  p50 {lat['p50_ms']:.3f}  p90 {lat['p90_ms']:.3f}  "
+              f"p99 {lat['p99_ms']:.3f}  max {lat['max_ms']:.3f}")
+        print(f"Clock {server['clock']:.1f}, completed trips {server['completed_trips']}, "
+              f"free cars {server['free_cars']}/{server['cars']}, retries {server['retries']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Real-time dispatch service and load generator")
+    parser.add_argument("mode", choices=["serve", "load", "demo"])
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--stdio", action="store_true", help="serve: read requests from stdin instead of TCP")
+    parser.add_argument("--map-file", type=str, default="map.csv", help="Map file (CSV or .bin)")
+    parser.add_argument("--routing", type=str, default="dijkstra", help="Shortest-path engine")
+    parser.add_argument("--speed", type=float, default=1.0, help="Simulated time units per wall second")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread",
+                        help="Where ETA searches run")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for --executor process")
+    parser.add_argument("--rate", type=float, default=100.0, help="load/demo: requests per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="load/demo: seconds of load")
+    parser.add_argument("--cars", type=int, default=50, help="load/demo: cars placed before the load")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    async def main():
+        if args.mode == "load":
+            print_load_report(await run_load(args.host, args.port, args.rate, args.duration,
+                                             args.cars, args.seed))
+            return
+        service = DispatchService(args.map_file, args.routing, speed=args.speed,
+                                  executor=args.executor, workers=args.workers)
+        try:
+            if args.mode == "serve" and args.stdio:
+                await service.serve_stdio()
+                return
+            server = await service.serve_tcp(args.host, args.port)
+            if args.mode == "serve":
+                print(f"Dispatch service on {args.host}:{args.port} (speed x{args.speed})", file=sys.stderr)
+                async with server:
+                    await server.serve_forever()
+            else:
+                async with server:
+                    print_load_report(await run_load(args.host, args.port, args.rate, args.duration,
+                                                     args.cars, args.seed))
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,335 @@
+# sharding.py
+# Geographically sharded simulation. The map bounds are split into a grid of
+# regions and every region is simulated by its own RideSharingSimulation in a
+# separate process, with its own event heap, quadtree and rider stream.
+#
+# Shards run in lock step, one time window at a time. At every window
+# boundary the coordinator exchanges:
+#   - cars whose dropoff left them in another region (handed to that shard)
+#   - requests near a region border that found no car locally (handed to the
+#     neighbouring shard, which tries them at the start of the next window)
+#
+# Example: 4 shards, 40 cars, compared against a single-process run
+#     python sharding.py --shards 4 --fleet-size 40 --mean-arrival-time 0.5 --max-time 500 --compare
+import argparse
+import math
+import multiprocessing
+import os
+from time import perf_counter, process_time
+
+import numpy as np
+
+from arrivals import SyntheticArrivals, TraceArrivals
+from compact_graph import load_graph
+from event_log import NullSink
+from generators import generate_fleet
+from simulation import RideSharingSimulation
+from metrics import MetricsCollector
+
+
+class ShardLayout:
+    """
+    Map bounds split into rows x cols equal regions, numbered row by row.
+    The grid is as close to square as the shard count allows.
+    """
+
+    def __init__(self, bounds, shards):
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        self.bounds = bounds
+        self.shards = shards
+        self.rows = next(r for r in range(int(math.sqrt(shards)), 0, -1) if shards % r == 0)
+        self.cols = shards // self.rows
+        min_x, min_y, max_x, max_y = bounds
+        self.cell_w = (max_x - min_x) / self.cols
+        self.cell_h = (max_y - min_y) / self.rows
+
+    def region_bounds(self, shard):
+        row, col = divmod(shard, self.cols)
+        min_x, min_y = self.bounds[0], self.bounds[1]
+        return (min_x + col * self.cell_w, min_y + row * self.cell_h,
+                min_x + (col + 1) * self.cell_w, min_y + (row + 1) * self.cell_h)
+
+    def shard_of(self, point):
+        # Points on or outside the map edge belong to the nearest region
+        col = int((point[0] - self.bounds[0]) / self.cell_w) if self.cell_w else 0
+        row = int((point[1] - self.bounds[1]) / self.cell_h) if self.cell_h else 0
+        col = min(max(col, 0), self.cols - 1)
+        row = min(max(row, 0), self.rows - 1)
+        return row * self.cols + col
+
+    def border_neighbour(self, point, shard, margin):
+        """
+        The shard across the closest interior border of `shard`, if point is
+        within margin of that border; otherwise None.
+        """
+        row, col = divmod(shard, self.cols)
+        min_x, min_y, max_x, max_y = self.region_bounds(shard)
+        x, y = point
+        options = []
+        if col > 0:
+            options.append((x - min_x, shard - 1))
+        if col < self.cols - 1:
+            options.append((max_x - x, shard + 1))
+        if row > 0:
+            options.append((y - min_y, shard - self.cols))
+        if row < self.rows - 1:
+            options.append((max_y - y, shard + self.cols))
+        if not options:
+            return None
+        distance, neighbour = min(options)
+        return neighbour if distance <= margin else None
+
+
+class ShardSimulation(RideSharingSimulation):
+    """
+    The part of the simulation that owns one region: riders whose trip starts
+    there and cars parked there. Trips may end anywhere on the map.
+    """
+
+    def __init__(self, layout, shard, border_margin=1.0, seed=None, trace_file=None,
+                 mean_arrival_time=5, **kwargs):
+        super().__init__(mean_arrival_time=mean_arrival_time, seed=seed, **kwargs)
+        self.layout = layout
+        self.shard = shard
+        self.border_margin = border_margin
+        self.region = layout.region_bounds(shard)
+
+        # Rider ids interleave across shards so they stay globally unique
+        self.next_rider_id = shard + 1
+        self.outbox_cars = []    # cars that parked outside the region
+        self.outbox_riders = []  # (neighbour shard, rider) for border requests
+        self.cars_handed_off = 0
+        self.riders_forwarded = 0
+        self.riders_received = 0
+
+        # Restricting uniform Poisson arrivals to a region is again a Poisson
+        # process, with the rate scaled by the region's share of the map area
+        if trace_file is not None:
+            self.arrivals = (a for a in TraceArrivals(trace_file) if layout.shard_of(a[1]) == shard)
+        else:
+            self.arrivals = SyntheticArrivals(mean_arrival_time * layout.shards, self.region, seed=seed,
+                                              dest_bounds=self.bounds, first_at_zero=(shard == 0))
+
+    def generate_rider_request(self, arrival):
+        if arrival[3] is None:
+            arrival = (arrival[0], arrival[1], arrival[2], self.next_rider_id)
+            self.next_rider_id += self.layout.shards
+        return super().generate_rider_request(arrival)
+
+    def handle_unmatched(self, rider):
+        # No free car here; a car across a nearby border may still serve it
+        neighbour = self.layout.border_neighbour(rider.start_location, self.shard, self.border_margin)
+        if neighbour is not None:
+            self.outbox_riders.append((neighbour, rider))
+            self.riders_forwarded += 1
+        else:
+            super().handle_unmatched(rider)
+
+    def handle_ride_complete(self, car, rider):
+        super().handle_ride_complete(car, rider)
+        # A car that took a waiting rider of this region stays here
+        if car.available and self.layout.shard_of(car.position) != self.shard:
+            # Parked in another region: hand the car over at the next window
+            self.quadtree.remove_car(car.car_id)
+            self.fleet.detach(car)
+            self.outbox_cars.append(car)
+            self.cars_handed_off += 1
+
+    def receive(self, now, cars, riders):
+        # Take over handed-off cars and forwarded requests at a window boundary
+        self.current_time = now
+        if cars:
+            self.add_cars(cars)
+            for car in cars:
+                if self.waiting:
+                    self.dispatch_waiting(car)
+        for rider in riders:
+            self.riders_received += 1
+            start = process_time()
+            if self.dispatch_greedy(rider) is None:
+                RideSharingSimulation.handle_unmatched(self, rider)  # never forwarded twice
+            self.dispatch_cpu_time += process_time() - start
+
+    def take_outbox(self):
+        out = (self.outbox_cars, self.outbox_riders)
+        self.outbox_cars, self.outbox_riders = [], []
+        return out
+
+    def result(self):
+        return {
+            "cars": self.cars,
+            "metrics": self.metrics,
+            "total_riders_generated": self.total_riders_generated,
+            "riders_assigned": self.riders_assigned,
+            "dispatch_cpu_time": self.dispatch_cpu_time,
+            "cars_handed_off": self.cars_handed_off,
+            "riders_forwarded": self.riders_forwarded,
+            "riders_received": self.riders_received,
+        }
+
+
+def _shard_worker(conn, layout, shard, cars, quiet, sim_kwargs):
+    if quiet:
+        sim_kwargs.setdefault("event_log", NullSink())  # no pickup/dropoff lines
+    sim = ShardSimulation(layout, shard, **sim_kwargs)
+    sim.add_cars(cars)
+    sim.schedule_next_arrival()
+    while True:
+        message = conn.recv()
+        if message[0] == "advance":
+            _, now, until, cars, riders = message
+            sim.receive(now, cars, riders)
+            sim.run_until(until)
+            conn.send(sim.take_outbox())
+        else:  # "finish": cars still in transit between shards come along
+            sim.add_cars(message[1])
+            conn.send(sim.result())
+            break
+    conn.close()
+
+
+def run_sharded(cars, shards=4, max_time=100, mean_arrival_time=5, map_file='map.csv', window=1.0,
+                border_margin=1.0, seed=None, quiet=True, **sim_kwargs):
+    """
+    Simulate the fleet `cars` on `shards` processes and return merged metrics
+    with the same keys as RideSharingSimulation.calculate_metrics, plus the
+    handoff counters.
+
+    window is the synchronisation interval in simulated time; handed-off cars
+    and forwarded requests wait at most one window.
+    """
+    map_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), map_file)
+    layout = ShardLayout(load_graph(map_path).get_bounds(), shards)
+    if seed is None:
+        seeds = [None] * shards
+    else:
+        seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(shards)]
+
+    initial = [[] for _ in range(shards)]
+    for car in cars:
+        initial[layout.shard_of(car.position)].append(car)
+
+    conns, procs = [], []
+    for shard in range(shards):
+        parent, child = multiprocessing.Pipe()
+        kwargs = dict(sim_kwargs, max_time=max_time, mean_arrival_time=mean_arrival_time,
+                      map_file=map_path, border_margin=border_margin, seed=seeds[shard])
+        proc = multiprocessing.Process(target=_shard_worker,
+                                       args=(child, layout, shard, initial[shard], quiet, kwargs))
+        proc.start()
+        conns.append(parent)
+        procs.append(proc)
+
+    inbox_cars = [[] for _ in range(shards)]
+    inbox_riders = [[] for _ in range(shards)]
+    now = 0.0
+    try:
+        while now < max_time:
+            until = min(now + window, max_time)
+            for shard, conn in enumerate(conns):
+                conn.send(("advance", now, until, inbox_cars[shard], inbox_riders[shard]))
+            inbox_cars = [[] for _ in range(shards)]
+            inbox_riders = [[] for _ in range(shards)]
+            for conn in conns:
+                out_cars, out_riders = conn.recv()
+                for car in out_cars:
+                    inbox_cars[layout.shard_of(car.position)].append(car)
+                for neighbour, rider in out_riders:
+                    inbox_riders[neighbour].append(rider)
+            now = until
+
+        for shard, conn in enumerate(conns):
+            conn.send(("finish", inbox_cars[shard]))
+        results = [conn.recv() for conn in conns]
+    finally:
+        for proc in procs:
+            proc.join()
+
+    return merge_results(results, max_time)
+
+
+def merge_results(results, max_time):
+    # Same metrics as RideSharingSimulation.calculate_metrics, from the
+    # merged collectors of all shards
+    cars = sorted((car for r in results for car in r["cars"]), key=lambda car: car.car_id)
+    metrics = MetricsCollector(interval=results[0]["metrics"].series.interval)
+    for r in results:
+        metrics.merge(r["metrics"])
+    total_generated = sum(r["total_riders_generated"] for r in results)
+    cpu = sum(r["dispatch_cpu_time"] for r in results)
+
+    busy = metrics.busy_times(max_time)
+    return {
+        "total_trips": metrics.wait.count,
+        "total_riders_generated": total_generated,
+        "avg_wait_time": metrics.wait.mean,
+        "avg_trip_duration": metrics.trip.mean,
+        "wait_time_percentiles": metrics.wait_digest.percentiles(),
+        "trip_duration_percentiles": metrics.trip_digest.percentiles(),
+        "rides_per_car": {car.car_id: car.rides_completed for car in cars},
+        "driver_utilization": {car.car_id: busy.get(car.car_id, 0.0) / max_time for car in cars},
+        "time_series": metrics.series.rows(len(cars)),
+        **metrics.queue_summary(max_time),
+        "dispatch_policy": "greedy",
+        "riders_assigned": sum(r["riders_assigned"] for r in results),
+        "dispatch_cpu_time": cpu,
+        "dispatch_cpu_per_request": cpu / total_generated if total_generated else 0.0,
+        "shards": len(results),
+        "cars_handed_off": sum(r["cars_handed_off"] for r in results),
+        "riders_forwarded": sum(r["riders_forwarded"] for r in results),
+        "riders_received": sum(r["riders_received"] for r in results),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the simulation sharded across processes")
+    parser.add_argument("--shards", type=int, default=4, help="Number of regions / worker processes")
+    parser.add_argument("--fleet-size", type=int, default=20, help="Cars placed at random nodes")
+    parser.add_argument("--max-time", type=int, default=100, help="Maximum simulation time")
+    parser.add_argument("--mean-arrival-time", type=float, default=5, help="Mean arrival time for riders")
+    parser.add_argument("--map-file", type=str, default="map.csv", help="Map file (CSV or .bin)")
+    parser.add_argument("--routing", type=str, default="dijkstra", help="Shortest-path engine")
+    parser.add_argument("--window", type=float, default=1.0, help="Synchronisation window (simulated time)")
+    parser.add_argument("--border-margin", type=float, default=1.0,
+                        help="Unmatched requests this close to a border go to the neighbouring shard")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed")
+    parser.add_argument("--rider-patience", type=float, default=math.inf,
+                        help="How long an unmatched rider waits for a car (0 drops them)")
+    parser.add_argument("--compare", action="store_true", help="Also run a single-process simulation")
+    args = parser.parse_args()
+
+    graph = load_graph(os.path.join(os.path.dirname(os.path.abspath(__file__)), args.map_file))
+    fleet = generate_fleet(graph, args.fleet_size, args.seed)
+
+    start = perf_counter()
+    metrics = run_sharded(fleet, shards=args.shards, max_time=args.max_time,
+                          mean_arrival_time=args.mean_arrival_time, map_file=args.map_file,
+                          window=args.window, border_margin=args.border_margin, seed=args.seed,
+                          routing=args.routing, rider_patience=args.rider_patience)
+    runs = [(f"sharded x{args.shards}", metrics, perf_counter() - start)]
+
+    if args.compare:
+        start = perf_counter()
+        sim = RideSharingSimulation(max_time=args.max_time, mean_arrival_time=args.mean_arrival_time,
+                                    map_file=args.map_file, routing=args.routing, seed=args.seed,
+                                    graph=graph, event_log=NullSink(), rider_patience=args.rider_patience)
+        sim.add_cars(generate_fleet(graph, args.fleet_size, args.seed))
+        sim.run()
+        elapsed = perf_counter() - start
+        runs.append(("single process", sim.calculate_metrics(), elapsed))
+
+    for name, m, elapsed in runs:
+        util = m['driver_utilization']
+        print(f"\n--- {name.upper()} ---")
+        print(f"Total riders generated: {m['total_riders_generated']}")
+        print(f"Completed trips: {m['total_trips']}")
+        print(f"Average wait time: {m['avg_wait_time']:.2f}")
+        print(f"Average trip duration: {m['avg_trip_duration']:.2f}")
+        print(f"Average driver utilization: {sum(util.values()) / len(util) * 100:.2f}%")
+        print(f"Riders queued: {m['riders_queued']}, abandoned: {m['riders_abandoned']}, "
+              f"still waiting: {m['riders_waiting']}")
+        if "shards" in m:
+            print(f"Cars handed off: {m['cars_handed_off']}, border requests forwarded: "
+                  f"{m['riders_forwarded']}")
+        print(f"Wall time: {elapsed:.2f}s ({m['total_riders_generated'] / elapsed:.0f} requests/s)")
@@ -1,247 +1,698 @@
-import heapq
-import random
+import math
 import os
-import matplotlib.pyplot as plt  # Library to create plots for visualization
+from time import perf_counter, process_time
 from quadtree import Quadtree, Rectangle
-from dijkstra import find_shortest_path
+from routing import ENGINES, make_engine
+from path_cache import CachedEngine
 from rider import Rider
-from graph import Graph
-
-
-# Car class
-class Car:
-    def __init__(self, car_id, start_position):
-        self.car_id = car_id  # Unique identifier for the car
-        self.position = start_position  # Current (x, y) position
-        self.available = True  # True if the car can take a ride
-        self.rides_completed = 0  # Counter of completed trips
-
-    def __repr__(self):
-        # Helpful for printing car info during debugging
-        return f"Car({self.car_id}, pos={self.position}, available={self.available})"
+from rider_pool import RiderPool
+from compact_graph import load_graph
+from dijkstra import dijkstra
+from dispatch import build_eta_matrix, solve_assignment
+from arrivals import SyntheticArrivals, TraceArrivals
+from events import BACKENDS, EventQueue
+from car import Car, FleetState
+from checkpoint import read_checkpoint, write_checkpoint
+from traffic import schedule_traffic
+from trip_log import TripLog
+from metrics import MetricsCollector
+from event_log import DROPOFF, PICKUP, PrintSink, make_sink
+from instrumentation import profile_call, stats
+from visualization import MAX_EDGES, FrameStream, summary_figure
 
 
 # RideSharingSimulation class
 class RideSharingSimulation:
-    def __init__(self, max_time=100, mean_arrival_time=5, map_file='map.csv'):
+    def __init__(self, max_time=100, mean_arrival_time=5, map_file='map.csv', routing='dijkstra',
+                 path_cache_size=10000, all_pairs_max_nodes=0, dispatch='greedy', batch_window=2.0,
+                 seed=None, trace_file=None, graph=None, event_queue='heap', metrics_interval=10.0,
+                 event_log=None, rider_patience=math.inf):
         # Core simulation parameters
         self.max_time = max_time  # Total time to run the simulation
         self.mean_arrival_time = mean_arrival_time  # Average time between rider requests
         self.current_time = 0  # Tracks the simulation's current time
         self.next_rider_id = 1  # Unique ID counter for riders
 
-        # Load city map into Graph
-        self.graph = Graph()
-        map_file_path = os.path.join(os.path.dirname(__file__), map_file)
-        self.graph.load_map_data(map_file_path)  # Load CSV map data into graph
+        # Load city map: CSV edge list into Graph, or a binary .bin map
+        # (see compact_graph.py) memory-mapped into a CompactGraph.
+        # A graph that is already loaded can be passed in and shared.
+        self.map_file_path = os.path.join(os.path.dirname(__file__), map_file)
+        self.graph = graph if graph is not None else load_graph(self.map_file_path)
+
+        # Shortest-path engine used for ETAs and trip durations
+        # ('dijkstra', 'astar', 'alt' or 'ch'; see routing.py)
+        self.routing_options = (routing, path_cache_size, all_pairs_max_nodes)
+        self.router = self.build_router()
+
+        # Map bounds are fixed once loaded; computing them scans every node
+        self.bounds = self.graph.get_bounds()
 
         # Setup Quadtree for fast spatial queries
-        min_x, min_y, max_x, max_y = self.graph.get_bounds()
+        min_x, min_y, max_x, max_y = self.bounds
         boundary = Rectangle(min_x, min_y, max_x - min_x + 1, max_y - min_y + 1)
         # Quadtree helps quickly find nearest available cars for riders
         self.quadtree = Quadtree(boundary, capacity=4)
 
         # Initialize simulation state
-        self.cars = []  # List to store Car objects
-        self.events = []  # Min-heap priority queue for events
-        self.completed_rides = []  # Keep track of completed rides
-        self.trip_data = []  # Detailed trip data for metrics
+        self.fleet = FleetState()  # Car positions and status as NumPy arrays
+        self.cars = self.fleet.cars  # Car views, one per fleet row
+        # Pending events, ordered by time then scheduling order ('heap', or
+        # 'calendar' for very many pending events; see events.py)
+        self.events = EventQueue(event_queue)
+        self.register_handlers()
+        self.started = False  # True once run() has scheduled the first arrival
+        self.trip_log = TripLog()  # Completed trips, one NumPy column per field
+        # Online metrics (averages, percentiles, per-car busy time and a
+        # time series with one row per metrics_interval), updated per event
+        self.metrics = MetricsCollector(interval=metrics_interval)
+        # Where pickup/dropoff events are logged: printed by default, or any
+        # sink from event_log.py (NullSink for quiet runs, ring buffer, files)
+        self.event_log = event_log if event_log is not None else PrintSink()
         self.total_riders_generated = 0  # Count of riders generated
+        # Riders no free car could take wait here (indexed by pickup point)
+        # for up to rider_patience time units; a car that frees up takes the
+        # nearest of them. 0 drops unmatched riders on the spot.
+        self.rider_patience = rider_patience
+        self.waiting = RiderPool(self.bounds)
+        self.rider_timeouts = {}  # waiting rider -> its pending timeout event
+
+        # Dispatch policy: 'greedy' matches each request on arrival; 'batch'
+        # collects requests for batch_window time units and matches them
+        # together with a min-cost assignment (see dispatch.py)
+        if dispatch not in ("greedy", "batch"):
+            raise ValueError(f"Unknown dispatch policy '{dispatch}'")
+        self.dispatch_policy = dispatch
+        self.batch_window = batch_window
+        self.pending_riders = []  # Requests waiting for the current batch
+        self.batch_scheduled = False
+        self.riders_assigned = 0
+        self.dispatch_cpu_time = 0.0  # CPU seconds spent matching riders to cars
+
+        # Traffic: edge weights changed by "edge_weights" events (see
+        # schedule_edge_weights), kept per directed edge so a checkpoint can
+        # replay them onto the freshly loaded map
+        self.edge_overrides = {}
+        self.edge_updates = 0
+        self.trips_rerouted = 0
+        self.trips_reassigned = 0  # pickups cut off by a closure
+        self.blocked_trips = set()  # ids of cars whose ride a closure cut off
+
+        # Rider requests come from a JSONL trace (replay mode) or from seeded
+        # synthetic Poisson arrivals; both are iterators read one at a time
+        if trace_file is not None:
+            self.arrivals = TraceArrivals(trace_file)
+        else:
+            self.arrivals = SyntheticArrivals(mean_arrival_time, self.bounds, seed=seed)
+
+        # Periodic snapshots (see schedule_checkpoints)
+        self.checkpoint_path = None
+        self.checkpoint_interval = None
+        self.checkpoint_event = None
+
+    def build_router(self):
+        routing, path_cache_size, all_pairs_max_nodes = self.routing_options
+        # Engines with preprocessing cache it next to the map file
+        router = make_engine(routing, self.graph, map_file=self.map_file_path)
+        # Repeated node pairs are answered from an LRU cache; maps with at most
+        # all_pairs_max_nodes nodes get a full distance table instead
+        if path_cache_size > 0 or all_pairs_max_nodes > 0:
+            router = CachedEngine(router, max_entries=path_cache_size,
+                                  all_pairs_max_nodes=all_pairs_max_nodes)
+        return router
+
+    def register_handlers(self):
+        self.events.register("rider_request", self.handle_rider_request)
+        self.events.register("pickup_arrival", self.handle_pickup_arrival)
+        self.events.register("ride_complete", self.handle_ride_complete)
+        self.events.register("dispatch_batch", self.handle_dispatch_batch)
+        self.events.register("rider_timeout", self.handle_rider_timeout)
+        self.events.register("checkpoint", self.handle_checkpoint)
+        self.events.register("edge_weights", self.handle_edge_weights)
+
+    # Checkpoints (checkpoint.py) hold the simulation state only; the map,
+    # routing engine and event log are reattached by load_checkpoint()
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ("graph", "router", "event_log"):
+            del state[name]
+        return state
+
+    def save_checkpoint(self, filename):
+        """Snapshot the whole simulation state to filename; returns its size in bytes."""
+        return write_checkpoint(self, filename)
+
+    @classmethod
+    def load_checkpoint(cls, filename, graph=None, event_log=None):
+        """
+        A simulation restored from a checkpoint, ready to continue with
+        run(). Running it to the end gives the same results as the run that
+        saved it. Parameters such as max_time, rider_patience or
+        dispatch_policy can be changed first to fork a what-if branch.
+        The map is loaded from the saved path unless graph is given.
+        """
+        sim = read_checkpoint(filename)
+        if not isinstance(sim, cls):
+            raise TypeError(f"{filename} holds a {type(sim).__name__}, not a {cls.__name__}")
+        sim.graph = graph if graph is not None else load_graph(sim.map_file_path)
+        sim.router = sim.build_router()
+        if sim.edge_overrides:
+            sim.router.update_weights([(u, v, w) for (u, v), w in sim.edge_overrides.items()],
+                                      directed=True)
+        sim.event_log = event_log if event_log is not None else PrintSink()
+        sim.register_handlers()
+        sim.events.rebind()
+        return sim
+
+    def schedule_checkpoints(self, path, interval):
+        """
+        Save a checkpoint every interval time units from now on. path may
+        contain {time}, formatted with the simulation time of the snapshot
+        (e.g. 'ckpt/run_{time:08.1f}.ckpt'). interval None stops them.
+        """
+        self.events.cancel(self.checkpoint_event)
+        self.checkpoint_event = None
+        self.checkpoint_path, self.checkpoint_interval = path, interval
+        if interval:
+            self.schedule_next_checkpoint()
+
+    def schedule_next_checkpoint(self):
+        # None at max_time itself: the run loop stops after the first event
+        # at max_time, so a snapshot there would pre-empt real events
+        next_time = self.current_time + self.checkpoint_interval
+        self.checkpoint_event = (self.events.schedule(next_time, "checkpoint")
+                                 if next_time < self.max_time else None)
+
+    # Snapshot event: the next one is scheduled first so it is part of the
+    # saved state, and a resumed run keeps checkpointing
+    def handle_checkpoint(self):
+        self.schedule_next_checkpoint()
+        self.save_checkpoint(self.checkpoint_path.format(time=self.current_time))
+
+    # Completed trips as a list of dicts (built from the trip log on demand)
+    @property
+    def trip_data(self):
+        return self.trip_log.rows()
+
+    # (rider_id, car_id, completion_time) per completed trip
+    @property
+    def completed_rides(self):
+        log = self.trip_log
+        return list(zip(log.column("rider_id").tolist(), log.column("car_id").tolist(),
+                        log.column("completion_time").tolist()))
 
     # Add a car to simulation
     def add_car(self, car):
-        self.cars.append(car)
+        self.fleet.attach(car)
+        car.node = self.graph.find_nearest_vertex(car.position)  # Snap once while parked
         self.quadtree.insert(car.position, car)  # Add car to spatial index
 
-    # Generate a rider request randomly
-    def generate_rider_request(self):
-        min_x, min_y, max_x, max_y = self.graph.get_bounds()
-        # Random start and end positions within map bounds
-        start_x = random.uniform(min_x, max_x)
-        start_y = random.uniform(min_y, max_y)
-        end_x = random.uniform(min_x, max_x)
-        end_y = random.uniform(min_y, max_y)
-
-        rider = Rider(self.next_rider_id, (start_x, start_y), (end_x, end_y))
+    # Add a whole fleet, snapping every position to the graph in one pass
+    def add_cars(self, cars):
+        cars = list(cars)
+        nodes = self.graph.snap_points([car.position for car in cars]) if cars else []
+        for car, node in zip(cars, nodes):
+            self.fleet.attach(car)
+            car.node = node
+        # Bulk-loaded when the tree is still empty (the initial fleet)
+        self.quadtree.insert_many([car.position for car in cars], cars)
+
+    # Turn the next arrival from the request source into a Rider
+    def generate_rider_request(self, arrival):
+        _, start_location, destination, rider_id = arrival
+        if rider_id is None:
+            rider_id = self.next_rider_id
+            self.next_rider_id += 1
+        rider = Rider(rider_id, start_location, destination)
         self.total_riders_generated += 1
-        self.next_rider_id += 1
         return rider
 
+    # Pull the next request from the source and put it on the event heap.
+    # Only one future request is ever scheduled, so long traces stream.
+    def schedule_next_arrival(self):
+        arrival = next(self.arrivals, None)
+        if arrival is not None and arrival[0] < self.max_time:
+            self.events.schedule(arrival[0], "rider_request", arrival)
+
     # Main event loop
     def run(self):
-        # Start simulation with first rider request at time 0
-        heapq.heappush(self.events, (0, "rider_request", None))
-
+        # Start simulation with the first rider request (a run restored
+        # from a checkpoint just carries on)
+        if not self.started:
+            self.started = True
+            self.schedule_next_arrival()
+        self.run_until(self.max_time)
+        # The run covers [0, max_time] even when the last event came earlier,
+        # so busy time and queue length are measured to the same end as a
+        # sharded run (sharding.merge_results)
+        self.current_time = self.max_time
+        self.event_log.flush()
+
+    # Process events up to end_time (inclusive); the sharded simulation
+    # (sharding.py) advances one synchronisation window at a time
+    def run_until(self, end_time):
         # Process events until no events left or max_time is reached
-        while self.events and self.current_time < self.max_time:
-            time, event_type, data = heapq.heappop(self.events)  # Get next event
-            if time > self.max_time:
+        timed = stats.enabled  # per-handler latency only when instrumentation is on
+        while self.current_time < self.max_time:
+            event = self.events.pop(until=end_time)  # Get next event
+            if event is None or event.time > self.max_time:
                 break  # Ignore events beyond simulation end time
-            self.current_time = time
-
-            # Dispatch event to correct handler
-            if event_type == "rider_request":
-                self.handle_rider_request()
-            elif event_type == "pickup_arrival":
-                car, rider = data
-                self.handle_pickup_arrival(car, rider)
-            elif event_type == "ride_complete":
-                car, rider = data
-                self.handle_ride_complete(car, rider)
+            self.current_time = event.time
+            if timed:
+                start = perf_counter()
+                event.handler(*event.args)
+                stats.add_time("handler." + event.kind, perf_counter() - start)
+            else:
+                event.handler(*event.args)  # Handler registered for the event kind
 
     # Handle a new rider request
-    def handle_rider_request(self):
-        rider = self.generate_rider_request()
+    def handle_rider_request(self, arrival):
+        rider = self.generate_rider_request(arrival)
         rider.request_time = self.current_time
-
-        # Use Quadtree to find nearest available cars (efficient search)
-        k_nearest = self.quadtree.find_k_nearest(rider.start_location, k=5)
+        self.metrics.on_request(self.current_time)
+
+        if self.dispatch_policy == "batch":
+            # Hold the request until the current batch window closes
+            self.pending_riders.append(rider)
+            if not self.batch_scheduled:
+                self.batch_scheduled = True
+                batch_time = min(self.current_time + self.batch_window, self.max_time)
+                self.events.schedule(batch_time, "dispatch_batch")
+        else:
+            start = process_time()
+            if self.dispatch_greedy(rider) is None:
+                self.handle_unmatched(rider)
+            self.dispatch_cpu_time += process_time() - start
+
+        # Schedule the next rider from the request source
+        self.schedule_next_arrival()
+
+    # Match one rider to the closest available car right away
+    def dispatch_greedy(self, rider):
+        # Use Quadtree to find nearest available cars (best-first search,
+        # unavailable cars are filtered out during the search itself)
+        k_nearest = self.quadtree.find_k_nearest_cars(rider.start_location, k=5,
+                                                      predicate=lambda car: car.available)
 
         best_car = None
         best_time = float('inf')
 
-        # Evaluate travel time to rider using Dijkstra for each candidate car
-        for car_location in k_nearest:
-            car = self.quadtree.get_car_at_location(car_location)
-            if car and car.available:
-                car_node = self.graph.find_nearest_vertex(car.position)
-                rider_node = self.graph.find_nearest_vertex(rider.start_location)
-                _, travel_time = find_shortest_path(self.graph, car_node, rider_node)
-                if travel_time < best_time:
-                    best_time = travel_time
-                    best_car = car
+        # Evaluate travel time to rider for all candidate cars at once
+        # (Dijkstra does this with a single one-to-many search from the rider)
+        rider_node = self.graph.find_nearest_vertex(rider.start_location)
+        candidates = []
+        for car in k_nearest:
+            if car.available:
+                if car.node is None:
+                    car.node = self.graph.find_nearest_vertex(car.position)
+                candidates.append((car, car.node))
+        etas = self.router.etas(rider_node, {node for _, node in candidates})
+        best_car_node = None
+        for car, car_node in candidates:
+            travel_time = etas[car_node]
+            if travel_time < best_time:
+                best_time = travel_time
+                best_car, best_car_node = car, car_node
 
         if best_car:
-            # Assign car and remove temporarily from quadtree (unavailable)
-            self.quadtree.remove(best_car.position)
-            best_car.available = False
-
-            # Schedule pickup and dropoff
-            pickup_time = self.current_time + best_time
-            pickup_node = self.graph.find_nearest_vertex(rider.start_location)
-            dest_node = self.graph.find_nearest_vertex(rider.destination)
-            _, ride_duration = find_shortest_path(self.graph, pickup_node, dest_node)
-            dropoff_time = pickup_time + ride_duration
+            self.assign_car(best_car, best_car_node, rider, rider_node, best_time)
+        return best_car  # None if no available car could be found
+
+    # Match every request collected during the batch window at once
+    def handle_dispatch_batch(self):
+        riders, self.pending_riders = self.pending_riders, []
+        self.batch_scheduled = False
+        if not riders:
+            return
+        start = process_time()
+
+        rider_nodes = self.graph.snap_points([rider.start_location for rider in riders])
+        # Candidate cars: the union of each rider's nearest available cars
+        candidates = {}
+        for rider in riders:
+            for car in self.quadtree.find_k_nearest_cars(rider.start_location, k=5,
+                                                         predicate=lambda car: car.available):
+                candidates[car.car_id] = car
+        cars = list(candidates.values())
+        for car in cars:
+            if car.node is None:
+                car.node = self.graph.find_nearest_vertex(car.position)
+        car_nodes = [car.node for car in cars]
+
+        # riders x cars ETA matrix, then the assignment with least total pickup time
+        etas = build_eta_matrix(self.router, rider_nodes, car_nodes)
+        matched = set()
+        for i, j in solve_assignment(etas):
+            self.assign_car(cars[j], car_nodes[j], riders[i], rider_nodes[i], float(etas[i, j]))
+            matched.add(i)
+        for i, rider in enumerate(riders):
+            if i not in matched:
+                rider.start_node = rider_nodes[i]
+                self.handle_unmatched(rider)
+
+        self.dispatch_cpu_time += process_time() - start
+
+    # No free car for this rider: queue it until a car frees up or its
+    # patience runs out
+    def handle_unmatched(self, rider):
+        self.metrics.on_queue(self.current_time)
+        if self.rider_patience <= 0:
+            rider.status = "abandoned"
+            self.metrics.on_abandon(self.current_time)
+            return
+        if rider.start_node is None:
+            rider.start_node = self.graph.find_nearest_vertex(rider.start_location)
+        self.waiting.add(rider)
+        if self.rider_patience < math.inf:
+            give_up = max(rider.request_time + self.rider_patience, self.current_time)
+            self.rider_timeouts[rider] = self.events.schedule(give_up, "rider_timeout", rider)
+
+    # A waiting rider gives up
+    def handle_rider_timeout(self, rider):
+        self.rider_timeouts.pop(rider, None)
+        if self.waiting.remove(rider):
+            rider.status = "abandoned"
+            self.metrics.on_abandon(self.current_time)
+
+    # A car just became free: give it the waiting rider it can reach first
+    # among the few nearest ones
+    def dispatch_waiting(self, car):
+        start = process_time()
+        if car.node is None:
+            car.node = self.graph.find_nearest_vertex(car.position)
+        best_rider, best_time = None, float('inf')
+        for rider in self.waiting.nearest(car.position, k=5):
+            travel_time = self.router.shortest_path(car.node, rider.start_node)[1]
+            if travel_time < best_time:
+                best_rider, best_time = rider, travel_time
+        if best_rider is not None:
+            self.waiting.remove(best_rider)
+            timeout = self.rider_timeouts.pop(best_rider, None)
+            if timeout is not None:
+                self.events.cancel(timeout)
+            self.metrics.on_dequeue(self.current_time)
+            self.assign_car(car, car.node, best_rider, best_rider.start_node, best_time)
+        self.dispatch_cpu_time += process_time() - start
+        return best_rider
+
+    # Commit a match: take the car off the market and schedule pickup and dropoff
+    def assign_car(self, car, car_node, rider, rider_node, eta):
+        # Assign car and remove temporarily from quadtree (unavailable)
+        self.quadtree.remove_car(car.car_id)
+        car.available = False
+        # A rider matched again after a closure (reassign) is counted once
+        first = rider.status != "assigned"
+        rider.status = "assigned"
+        if first:
+            self.riders_assigned += 1
+        self.metrics.on_assign(car.car_id, self.current_time, count=first)
+
+        # Schedule pickup and dropoff
+        pickup_time = self.current_time + eta
+        dest_node = self.graph.find_nearest_vertex(rider.destination)
+        rider.start_node, rider.dest_node = rider_node, dest_node
+        ride_path, ride_duration = self.router.shortest_path(rider_node, dest_node)
+        pickup_path, _ = self.router.shortest_path(car_node, rider_node)
+        car.route = (pickup_path or []) + (ride_path or [])[1:]
+        car.route_start = self.current_time
+        if ride_duration == math.inf:
+            self.blocked_trips.add(car.car_id)  # destination closed off; see repair_trip
+        dropoff_time = pickup_time + ride_duration
+
+        # Track wait time (including any time spent waiting for a batch) and trip duration
+        rider.wait_time = pickup_time - rider.request_time
+        rider.trip_duration = ride_duration
+
+        # Add events to priority queue; kept on the car so the trip can be cancelled
+        car.trip_events = (self.events.schedule(pickup_time, "pickup_arrival", car, rider),
+                           self.events.schedule(dropoff_time, "ride_complete", car, rider))
+
+    # Drop a car's pending trip (e.g. to reroute it). The car becomes
+    # available where it currently is; returns the rider it was serving.
+    def cancel_trip(self, car):
+        if not car.trip_events:
+            return None
+        for event in car.trip_events:
+            self.events.cancel(event)
+        rider = car.trip_events[1].args[1]
+        car.trip_events = ()
+        car.route = []
+        self.blocked_trips.discard(car.car_id)
+        car.available = True
+        self.quadtree.insert(car.position, car)
+        self.metrics.on_cancel(car.car_id, self.current_time)
+        return rider
 
-            # Track wait time and trip duration
-            rider.wait_time = pickup_time - self.current_time
+    def schedule_edge_weights(self, time, changes, directed=False):
+        """
+        Change edge weights at the given time, e.g. congestion or a road
+        closure: changes are (start, end, weight) with weight float('inf')
+        for a closed road, applied as one batch. Returns the event.
+        """
+        return self.events.schedule(time, "edge_weights", list(changes), directed)
+
+    # A batch of edge weight changes: the router drops only the cached
+    # routes it affects (path_cache.py), and only trips whose remaining
+    # route crosses a changed edge, or could now take a faster one, are
+    # re-planned and have their pickup/dropoff events moved
+    def handle_edge_weights(self, changes, directed):
+        # Where each car on a trip is headed, timed with the weights it has
+        # driven on so far (so before the change is applied). Routes are
+        # cut to start there: edges already behind a car may change later.
+        trips = []
+        for car in self.cars:
+            if car.trip_events and car.route:
+                i, car.route_start = self.route_position(car)
+                del car.route[:i]
+                trips.append(car)
+
+        changed = self.router.update_weights(changes, directed=directed)
+        self.edge_updates += 1
+        for u, v, _, weight in changed:
+            self.edge_overrides[(u, v)] = weight
+        if not changed or not trips:
+            return
+
+        edges = {(u, v) for u, v, _, _ in changed}
+        repairs = []  # (car, legs to re-plan)
+        legs = []     # (start, end, remaining cost, trip index, leg) of untouched legs
+        for car in trips:
+            pickup, dropoff = car.trip_events
+            rider = dropoff.args[1]
+            route, t = car.route, car.route_start
+            # The pickup leg ends at the rider's node; the rest is the ride
+            p = self._index(route, rider.start_node) if pickup.active else 0
+            crossed = set()
+            if any(pair in edges for pair in zip(route[:p], route[1:p + 1])):
+                crossed.add("pickup")
+            if car.car_id in self.blocked_trips or any(pair in edges for pair in zip(route[p:], route[p + 1:])):
+                crossed.add("ride")  # blocked rides are retried on every batch
+            repairs.append((car, crossed))
+            if pickup.active:
+                if "pickup" not in crossed:
+                    legs.append((route[0], route[p], pickup.time - t, len(repairs) - 1, "pickup"))
+                if "ride" not in crossed:
+                    legs.append((route[p], route[-1], rider.trip_duration, len(repairs) - 1, "ride"))
+            elif "ride" not in crossed:
+                legs.append((route[0], route[-1], dropoff.time - t, len(repairs) - 1, "ride"))
+
+        # A lighter edge u -> v helps a leg a -> b only if
+        # d(a, u) + w + d(v, b) beats what is left of it
+        lighter = [(u, v, new) for u, v, old, new in changed if new < old]
+        if lighter and legs:
+            inf = float('inf')
+            sources = {a for a, _, _, _, _ in legs}
+            targets = {b for _, b, _, _, _ in legs}
+            cutoff = max(cost for _, _, cost, _, _ in legs)
+            for u, v, weight in lighter:
+                to_u, _ = dijkstra(self.graph, u, targets=sources, cutoff=cutoff, reverse=True)
+                from_v, _ = dijkstra(self.graph, v, targets=targets, cutoff=cutoff)
+                for a, b, cost, k, leg in legs:
+                    if to_u.get(a, inf) + weight + from_v.get(b, inf) < cost:
+                        repairs[k][1].add(leg)
+
+        for car, crossed in repairs:
+            if crossed:
+                self.repair_trip(car, crossed)
+
+    @staticmethod
+    def _index(route, node):
+        try:
+            return route.index(node)
+        except ValueError:
+            return 0
+
+    def _edge_weight(self, u, v):
+        return min((w for n, w in self.graph.adjacency_list.get(u, ()) if n == v), default=math.inf)
+
+    def route_position(self, car):
+        """
+        (i, t): the next node the car reaches on its route, route[i], and
+        when (not before now). A car between two nodes finishes the edge it
+        is on.
+        """
+        route, t = car.route, car.route_start
+        for i in range(len(route)):
+            if i:
+                weight = self._edge_weight(route[i - 1], route[i])
+                if weight == math.inf:
+                    # A blocked ride: the car waits before the closed road
+                    return i - 1, max(t, self.current_time)
+                t += weight
+            if t >= self.current_time:
+                return i, t
+        return len(route) - 1, self.current_time
+
+    def repair_trip(self, car, legs):
+        """
+        Re-plan the given legs ('pickup', 'ride') of a car's trip from
+        route[0], reached at route_start, and move its pickup and dropoff
+        events. If the rider can no longer be reached the trip is dropped,
+        the car freed at route[0] and the rider dispatched again. A ride
+        that can no longer be completed keeps its old plan and is retried
+        on every later batch (blocked_trips).
+        """
+        pickup, dropoff = car.trip_events
+        rider = dropoff.args[1]
+        route, node = car.route, car.route[0]
+        t = car.route_start
+        if pickup.active:
+            p = self._index(route, rider.start_node)
+            pickup_path, pickup_time = route[:p + 1], pickup.time
+            if "pickup" in legs:
+                pickup_path, cost = self.router.shortest_path(node, rider.start_node)
+                if cost == math.inf:
+                    self.reassign(car, node)
+                    return
+                pickup_time = t + cost
+            ride_path, ride_duration = route[p:], rider.trip_duration
+            if "ride" in legs:
+                path, cost = self.router.shortest_path(rider.start_node, rider.dest_node)
+                if cost < math.inf:
+                    ride_path, ride_duration = path, cost
+                    self.blocked_trips.discard(car.car_id)
+                else:
+                    self.blocked_trips.add(car.car_id)
+            if pickup_time != pickup.time:
+                self.events.cancel(pickup)
+                pickup = self.events.schedule(pickup_time, "pickup_arrival", car, rider)
+            rider.wait_time = pickup_time - rider.request_time
             rider.trip_duration = ride_duration
-
-            # Add events to priority queue
-            heapq.heappush(self.events, (pickup_time, "pickup_arrival", (best_car, rider)))
-            heapq.heappush(self.events, (dropoff_time, "ride_complete", (best_car, rider)))
-
-        # Schedule next rider dynamically (Poisson process)
-        if self.current_time < self.max_time:
-            next_request_time = self.current_time + random.expovariate(1.0 / self.mean_arrival_time)
-            if next_request_time < self.max_time:
-                heapq.heappush(self.events, (next_request_time, "rider_request", None))
+            car.route = pickup_path + ride_path[1:]
+            dropoff_time = pickup_time + ride_duration
+        else:
+            path, cost = self.router.shortest_path(node, rider.dest_node)
+            if cost == math.inf:
+                self.blocked_trips.add(car.car_id)
+                return
+            self.blocked_trips.discard(car.car_id)
+            car.route = list(path)  # trimmed in place later; the router may cache path
+            dropoff_time = t + cost
+            rider.trip_duration = dropoff_time - (rider.request_time + rider.wait_time)
+        self.events.cancel(dropoff)
+        car.trip_events = (pickup, self.events.schedule(dropoff_time, "ride_complete", car, rider))
+        self.trips_rerouted += 1
+
+    # A closure cut the car off from its rider: free the car where it is
+    # headed, dispatch the rider again and offer the car to waiting riders
+    def reassign(self, car, node):
+        car.position = self.graph.node_coordinates[node]
+        car.node = node
+        rider = self.cancel_trip(car)
+        self.trips_reassigned += 1
+        if self.dispatch_greedy(rider) is None:
+            self.handle_unmatched(rider)
+        if car.available and self.waiting:
+            self.dispatch_waiting(car)
 
     # Handle pickup arrival
     def handle_pickup_arrival(self, car, rider):
         car.position = rider.start_location  # Update car location
-        print(f"TIME {self.current_time:.2f}: Car {car.car_id} picked up Rider {rider.id}")
+        car.node = rider.start_node
+        if self.event_log.enabled:
+            self.event_log.log(self.current_time, PICKUP, car.car_id, rider.id)
 
     # Handle ride completion
     def handle_ride_complete(self, car, rider):
         car.position = rider.destination
+        car.node = rider.dest_node  # Already snapped at dispatch time
         car.available = True
+        car.route = []
+        car.trip_events = ()
+        self.blocked_trips.discard(car.car_id)
         car.rides_completed += 1
 
         # Save trip data for later analysis
-        self.trip_data.append({
-            'rider_id': rider.id,
-            'car_id': car.car_id,
-            'wait_time': rider.wait_time,
-            'trip_duration': rider.trip_duration,
-            'completion_time': self.current_time
-        })
-        self.completed_rides.append((rider.id, car.car_id, self.current_time))
+        self.trip_log.append(rider.id, car.car_id, rider.wait_time, rider.trip_duration,
+                             self.current_time)
+        self.metrics.on_trip_complete(car.car_id, rider.wait_time, rider.trip_duration,
+                                      self.current_time)
         self.quadtree.insert(car.position, car)  # Car becomes available again
 
-        # Print event for clarity
-        print(f"TIME {self.current_time:.2f}: Rider {rider.id} dropped off by Car {car.car_id}")
+        # Log event for clarity
+        if self.event_log.enabled:
+            self.event_log.log(self.current_time, DROPOFF, car.car_id, rider.id)
+
+        # Pick up a waiting rider straight away, if any
+        if self.waiting:
+            self.dispatch_waiting(car)
 
     # Calculate simulation metrics
     def calculate_metrics(self):
-        if not self.trip_data:
-            # If no rides completed, return zero metrics
-            return {
-                "total_trips": 0,
-                "total_riders_generated": self.total_riders_generated,
-                "avg_wait_time": 0,
-                "avg_trip_duration": 0,
-                "rides_per_car": {car.car_id: car.rides_completed for car in self.cars},
-                "driver_utilization": {car.car_id: 0 for car in self.cars}
-            }
-
-        total_rides = len(self.trip_data)
-        avg_wait = sum(trip['wait_time'] for trip in self.trip_data) / total_rides
-        avg_duration = sum(trip['trip_duration'] for trip in self.trip_data) / total_rides
-        rides_per_car = {car.car_id: car.rides_completed for car in self.cars}
-
-        # Driver utilization = fraction of time car was busy
-        driver_utilization = {}
-        for car in self.cars:
-            busy_time = sum(trip['trip_duration'] for trip in self.trip_data if trip['car_id'] == car.car_id)
-            driver_utilization[car.car_id] = busy_time / self.max_time
+        # Everything comes from the online accumulators in self.metrics
+        # (metrics.py), so this is O(cars) however many trips were made
+        m = self.metrics
+
+        # Dispatch cost, so greedy and batch policies can be compared
+        dispatch_metrics = {
+            "dispatch_policy": self.dispatch_policy,
+            "riders_assigned": self.riders_assigned,
+            "dispatch_cpu_time": self.dispatch_cpu_time,
+            "dispatch_cpu_per_request": (self.dispatch_cpu_time / self.total_riders_generated
+                                         if self.total_riders_generated else 0.0),
+        }
+        traffic_metrics = {
+            "edge_updates": self.edge_updates,
+            "trips_rerouted": self.trips_rerouted,
+            "trips_reassigned": self.trips_reassigned,
+        }
+
+        # Driver utilization = fraction of time car was busy, from assignment
+        # (so including the pickup leg) to dropoff; trips still under way
+        # count up to the current time
+        busy_time = m.busy_times(min(self.current_time, self.max_time))
+        driver_utilization = {car.car_id: busy_time.get(car.car_id, 0.0) / self.max_time
+                              for car in self.cars}
 
         return {
-            "total_trips": total_rides,
+            "total_trips": m.wait.count,
             "total_riders_generated": self.total_riders_generated,
-            "avg_wait_time": avg_wait,
-            "avg_trip_duration": avg_duration,
-            "rides_per_car": rides_per_car,
-            "driver_utilization": driver_utilization
+            "avg_wait_time": m.wait.mean,
+            "avg_trip_duration": m.trip.mean,
+            "wait_time_percentiles": m.wait_digest.percentiles(),
+            "trip_duration_percentiles": m.trip_digest.percentiles(),
+            "rides_per_car": {car.car_id: car.rides_completed for car in self.cars},
+            "driver_utilization": driver_utilization,
+            "time_series": m.series.rows(len(self.fleet)),
+            **m.queue_summary(min(self.current_time, self.max_time)),
+            **dispatch_metrics,
+            **traffic_metrics
         }
 
     # Create a visualization of the simulation
-    def create_visualization(self, filename='simulation_summary.png'):
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
-
-        # Left plot: city map with final car positions
-        for node_id, neighbors in self.graph.adjacency_list.items():
-            x1, y1 = self.graph.node_coordinates[node_id]
-            for neighbor_id, _ in neighbors:
-                x2, y2 = self.graph.node_coordinates[neighbor_id]
-                ax1.plot([x1, x2], [y1, y2], 'lightgray', linewidth=0.5)
-
-        car_x = [car.position[0] for car in self.cars]
-        car_y = [car.position[1] for car in self.cars]
-        ax1.scatter(car_x, car_y, c='red', s=100, marker='s', label='Cars')
-        ax1.set_title('Final Car Locations')
-        ax1.set_xlabel('X Coordinate')
-        ax1.set_ylabel('Y Coordinate')
-        ax1.legend()
-        ax1.grid(True)
-
-        # Right plot: simulation metrics summary
+    def create_visualization(self, filename='simulation_summary.png', dpi=150, max_edges=MAX_EDGES,
+                             show=False):
+        # Drawn off-screen on the Agg canvas (see visualization.py), so it
+        # works on headless servers; show=True also opens a window
         metrics = self.calculate_metrics()
-        ax2.clear()
-        metrics_text = f"""SIMULATION RESULTS
-
-Total Riders: {metrics['total_riders_generated']}
-Completed Trips: {metrics['total_trips']}
-Avg Wait Time: {metrics['avg_wait_time']:.2f}
-Avg Trip Duration: {metrics['avg_trip_duration']:.2f}
-
-RIDES PER CAR:"""
-        for car_id, rides in metrics['rides_per_car'].items():
-            metrics_text += f"\nCar {car_id}: {rides} rides"
-        metrics_text += "\n\nDRIVER UTILIZATION:"
-        for car_id, util in metrics['driver_utilization'].items():
-            metrics_text += f"\nCar {car_id}: {util:.2%}"
-
-        ax2.text(0.1, 0.9, metrics_text, fontsize=10, verticalalignment='top',
-                 fontfamily='monospace', transform=ax2.transAxes)
-        ax2.set_xlim(0, 1)
-        ax2.set_ylim(0, 1)
-        ax2.axis('off')
-
-        plt.tight_layout()
-        plt.savefig(filename, dpi=300)
-        plt.show()
+        fig = summary_figure(self.graph, self.fleet.positions(), metrics, max_edges=max_edges)
+        fig.savefig(filename, dpi=dpi)
         print(f"Visualization saved as {filename}")
+        if show:
+            import matplotlib.pyplot as plt
+            manager = plt.figure().canvas.manager  # adopt the figure into a pyplot window
+            manager.canvas.figure = fig
+            fig.set_canvas(manager.canvas)
+            plt.show()
 
         return metrics
 
@@ -254,23 +705,114 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the Ride-Sharing Simulation")
     parser.add_argument("--max-time", type=int, default=100, help="Maximum simulation time")
     parser.add_argument("--mean-arrival-time", type=float, default=5, help="Mean arrival time for riders")
-    parser.add_argument("--map-file", type=str, default="map.csv", help="Path to the map CSV file")
+    parser.add_argument("--map-file", type=str, default="map.csv", help="Path to the map file (CSV, or .bin from compact_graph.py)")
+    parser.add_argument("--routing", choices=sorted(ENGINES), default="dijkstra",
+                        help="Shortest-path engine used for dispatch and trips")
+    parser.add_argument("--path-cache-size", type=int, default=10000,
+                        help="Max cached node-pair routes (0 disables the cache)")
+    parser.add_argument("--all-pairs-max-nodes", type=int, default=0,
+                        help="Precompute all-pairs distances for maps up to this many nodes, "
+                             "bypassing the routing engine (default 0: off)")
+    parser.add_argument("--dispatch", choices=["greedy", "batch"], default="greedy",
+                        help="Match each request immediately, or in batches per time window")
+    parser.add_argument("--batch-window", type=float, default=2.0,
+                        help="Length of a batch window for --dispatch batch")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Random seed for synthetic rider arrivals (reproducible runs)")
+    parser.add_argument("--trace", type=str, default=None,
+                        help="Replay rider requests from a JSONL trace instead of generating them")
+    parser.add_argument("--event-queue", choices=sorted(BACKENDS), default="heap",
+                        help="Pending-event queue (calendar suits very large event counts)")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="Length of one row of the metrics time series")
+    parser.add_argument("--event-log", type=str, default="print",
+                        help="Pickup/dropoff log: print, quiet, ring, or a .jsonl / .bin file")
+    parser.add_argument("--event-log-thread", action="store_true",
+                        help="Write a file event log from a background thread")
+    parser.add_argument("--profile", choices=["counters", "cprofile", "sample"], default=None,
+                        help="Hot-path counters and handler timers, cProfile, or a sampling profiler")
+    parser.add_argument("--profile-out", type=str, default=None,
+                        help="Write the profile here (JSON for counters, pstats dump for cprofile)")
+    parser.add_argument("--rider-patience", type=float, default=math.inf,
+                        help="How long an unmatched rider waits for a car before giving up (0 drops them)")
+    parser.add_argument("--plot", type=str, default="simulation_summary.png",
+                        help="Summary figure file ('none' to skip it)")
+    parser.add_argument("--plot-dpi", type=int, default=150, help="Resolution of the summary figure")
+    parser.add_argument("--show", action="store_true", help="Also open the summary figure in a window")
+    parser.add_argument("--frames", type=str, default=None,
+                        help="Stream fleet frames during the run: a directory of PNGs, or a .gif / .mp4 file")
+    parser.add_argument("--frame-interval", type=float, default=1.0,
+                        help="Simulated time between streamed frames")
+    parser.add_argument("--traffic", type=str, default=None,
+                        help="Timed edge weight changes (congestion, closures) from a JSONL file")
+    parser.add_argument("--checkpoint-every", type=float, default=None,
+                        help="Save a checkpoint every this many time units")
+    parser.add_argument("--checkpoint-path", type=str, default="checkpoint_{time:g}.ckpt",
+                        help="Checkpoint file name; {time} is replaced by the simulation time")
+    parser.add_argument("--resume", type=str, default=None,
+                        help="Continue from a checkpoint (simulation options are taken from it)")
+    parser.add_argument("--until", type=float, default=None,
+                        help="With --resume: run to this time instead of the saved max time")
     args = parser.parse_args()
 
-    # Initialize simulation with arguments
-    sim = RideSharingSimulation(max_time=args.max_time,
-    mean_arrival_time=args.mean_arrival_time,
-    map_file=args.map_file)
-
-    # Add cars at specific positions on the map
-    sim.add_car(Car(1, (0, 0)))   # Top-left
-    sim.add_car(Car(2, (8, 0)))   # Top-right
-    sim.add_car(Car(3, (0, 6)))   # Bottom-left
-    sim.add_car(Car(4, (4, 4)))   # Center
-    sim.add_car(Car(5, (8, 6)))   # Bottom-right
-
-    # Run the simulation
-    sim.run()
+    if args.resume:
+        # Continue (or, with --until, extend) a checkpointed run
+        sim = RideSharingSimulation.load_checkpoint(
+            args.resume, event_log=make_sink(args.event_log, background=args.event_log_thread))
+        if args.until is not None:
+            sim.max_time = args.until
+        print(f"Resumed from {args.resume} at time {sim.current_time:g}")
+    else:
+        # Initialize simulation with arguments
+        sim = RideSharingSimulation(max_time=args.max_time,
+        mean_arrival_time=args.mean_arrival_time,
+        map_file=args.map_file,
+        routing=args.routing,
+        path_cache_size=args.path_cache_size,
+        all_pairs_max_nodes=args.all_pairs_max_nodes,
+        dispatch=args.dispatch,
+        batch_window=args.batch_window,
+        seed=args.seed,
+        trace_file=args.trace,
+        event_queue=args.event_queue,
+        metrics_interval=args.metrics_interval,
+        event_log=make_sink(args.event_log, background=args.event_log_thread),
+        rider_patience=args.rider_patience)
+
+        # Add cars at specific positions on the map
+        sim.add_cars([
+            Car(1, (0, 0)),   # Top-left
+            Car(2, (8, 0)),   # Top-right
+            Car(3, (0, 6)),   # Bottom-left
+            Car(4, (4, 4)),   # Center
+            Car(5, (8, 6)),   # Bottom-right
+        ])
+
+        if args.traffic:
+            schedule_traffic(sim, args.traffic)
+
+    if args.checkpoint_every:
+        sim.schedule_checkpoints(args.checkpoint_path, args.checkpoint_every)
+
+    frames = None
+    if args.frames:
+        frames = FrameStream(args.frames, sim.graph, interval=args.frame_interval)
+        try:
+            frames.attach(sim)
+        except ValueError as e:
+            parser.error(str(e))
+
+    # Run the simulation (optionally instrumented or under a profiler)
+    if args.profile == "counters":
+        stats.enable()
+    if args.profile in ("cprofile", "sample"):
+        _, profile_report = profile_call(sim.run, args.profile, out=args.profile_out)
+    else:
+        sim.run()
+    sim.event_log.close()
+    if frames is not None:
+        frames.close()
+        print(f"Wrote {frames.frames} frames to {args.frames}")
 
     # Print summary metrics
     metrics = sim.calculate_metrics()
@@ -278,7 +820,18 @@ if __name__ == "__main__":
     print(f"Total riders generated: {metrics['total_riders_generated']}")
     print(f"Completed trips: {metrics['total_trips']}")
     print(f"Average wait time: {metrics['avg_wait_time']:.2f}")
-    print(f"Average trip duration: {metrics['avg_trip_duration']:.2f}\n")
+    print(f"Average trip duration: {metrics['avg_trip_duration']:.2f}")
+    waits = metrics['wait_time_percentiles']
+    print(f"Wait time p50/p90/p99: {waits['p50']:.2f} / {waits['p90']:.2f} / {waits['p99']:.2f}")
+    print(f"Dispatch ({metrics['dispatch_policy']}): {metrics['riders_assigned']} riders assigned, "
+          f"{metrics['dispatch_cpu_per_request']*1000:.3f} ms CPU per request")
+    print(f"Waiting riders: {metrics['riders_queued']} queued, {metrics['riders_abandoned']} abandoned "
+          f"({metrics['abandonment_rate']:.1%}), {metrics['riders_waiting']} still waiting; "
+          f"queue length avg {metrics['avg_queue_length']:.2f}, max {metrics['max_queue_length']}")
+    if metrics['edge_updates']:
+        print(f"Traffic: {metrics['edge_updates']} edge updates, {metrics['trips_rerouted']} trips rerouted, "
+              f"{metrics['trips_reassigned']} reassigned after closures")
+    print()
 
     print("Driver utilization per car:")
     for car_id, util in metrics['driver_utilization'].items():
@@ -286,5 +839,21 @@ if __name__ == "__main__":
 
     print(f"\nAverage driver utilization: {sum(metrics['driver_utilization'].values())/len(metrics['driver_utilization'])*100:.2f}%")
 
+    if isinstance(sim.router, CachedEngine):
+        print(f"Route cache: {sim.router.cache_stats()}")
+
+    if args.profile == "counters":
+        print("\n--- INSTRUMENTATION ---")
+        print(stats.summary_table())
+        print(f"Routing ({sim.router.name}): {sim.router.stats}")
+        if args.profile_out:
+            stats.export_json(args.profile_out, extra={"routing": {"engine": sim.router.name,
+                                                                   **sim.router.stats},
+                                                       "events": sim.events.stats()})
+    elif args.profile:
+        print(f"\n--- PROFILE ({args.profile}) ---")
+        print(profile_report)
+
     # Optional: create visualization
-    sim.create_visualization("simulation_summary.png")
+    if args.plot != "none":
+        sim.create_visualization(args.plot, dpi=args.plot_dpi, show=args.show)
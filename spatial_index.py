@@ -0,0 +1,146 @@
+# spatial_index.py
+# Static uniform-grid index over graph node coordinates, used to snap (x, y)
+# points to their nearest node without scanning the whole map.
+import math
+
+from instrumentation import stats
+
+
+class GridIndex:
+    def __init__(self, node_ids, coords, nodes_per_cell=2.0):
+        """
+        node_ids: list of node ids; coords: matching list of (x, y).
+        Cells are sized so that on average nodes_per_cell nodes share a cell.
+        """
+        self.node_ids = list(node_ids)
+        coords = list(coords)
+        self.xs = [c[0] for c in coords]
+        self.ys = [c[1] for c in coords]
+        n = len(self.node_ids)
+        if n == 0:
+            raise ValueError("No coordinates loaded")
+
+        self.min_x, self.min_y = min(self.xs), min(self.ys)
+        width = max(self.xs) - self.min_x
+        height = max(self.ys) - self.min_y
+        area = max(width * height, 1e-12)
+        self.cell_size = max(math.sqrt(area * nodes_per_cell / n), max(width, height) / n, 1e-9)
+        self.nx = int(width / self.cell_size) + 1
+        self.ny = int(height / self.cell_size) + 1
+
+        # cells[(cx, cy)] = node indices in insertion order
+        self.cells = {}
+        for i in range(n):
+            self.cells.setdefault(self._cell(self.xs[i], self.ys[i]), []).append(i)
+        self._arrays = None  # NumPy CSR layout for snap_points, built on first use
+
+    def _cell(self, x, y):
+        # Cell of a point, clamped to the grid so outside points still map to
+        # the nearest border cell
+        cx = min(max(int((x - self.min_x) / self.cell_size), 0), self.nx - 1)
+        cy = min(max(int((y - self.min_y) / self.cell_size), 0), self.ny - 1)
+        return cx, cy
+
+    def nearest_index(self, point):
+        """
+        Index of the node closest to point. Ties go to the node that was
+        inserted first, matching a linear scan over the coordinates.
+        """
+        px, py = point
+        cx, cy = self._cell(px, py)
+        xs, ys, cells = self.xs, self.ys, self.cells
+        best, best_d2 = -1, float('inf')
+        max_ring = max(self.nx, self.ny)
+        scanned = 0
+        r = 0
+        while r <= max_ring:
+            # Visit the square ring of cells at Chebyshev distance r
+            for gx in range(cx - r, cx + r + 1):
+                if gx < 0 or gx >= self.nx:
+                    continue
+                step = 1 if r == 0 or gx in (cx - r, cx + r) else 2 * r
+                for gy in range(cy - r, cy + r + 1, step):
+                    cell = cells.get((gx, gy), ())
+                    scanned += len(cell)
+                    for i in cell:
+                        d2 = (xs[i] - px) ** 2 + (ys[i] - py) ** 2
+                        if d2 < best_d2 or (d2 == best_d2 and i < best):
+                            best, best_d2 = i, d2
+            # Cells beyond ring r are at least r * cell_size away
+            reach = r * self.cell_size
+            if best >= 0 and best_d2 < reach * reach:
+                break
+            r += 1
+        if stats.enabled:
+            stats.count("spatial.nearest_queries")
+            stats.count("spatial.nodes_scanned", scanned)
+        return best
+
+    def nearest(self, point):
+        return self.node_ids[self.nearest_index(point)]
+
+    def snap_points(self, points, chunk_size=4096, max_candidates=1 << 21):
+        """
+        Nearest node id for every point, vectorised with NumPy.
+
+        Each point is compared against the nodes in its 3x3 block of cells at
+        once; the few points whose nearest node might lie outside that block
+        fall back to nearest_index(). Candidate matrices are 9 * (largest
+        cell population) wide, so chunks shrink to keep them within
+        max_candidates entries on maps with a dense cell.
+        """
+        import numpy as np
+
+        if self._arrays is None:
+            self._build_arrays(np)
+        order, cell_start, xs, ys, max_count = self._arrays
+        pts = np.asarray(points, dtype=float).reshape(-1, 2)
+        result = np.empty(len(pts), dtype=np.int64)
+        offsets = np.arange(max_count)
+        big = np.iinfo(np.int64).max
+        chunk_size = max(1, min(chunk_size, max_candidates // (9 * max_count)))
+
+        for lo in range(0, len(pts), chunk_size):
+            px = pts[lo:lo + chunk_size, 0]
+            py = pts[lo:lo + chunk_size, 1]
+            cx = np.clip(((px - self.min_x) / self.cell_size).astype(np.int64), 0, self.nx - 1)
+            cy = np.clip(((py - self.min_y) / self.cell_size).astype(np.int64), 0, self.ny - 1)
+
+            cand = []
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    gx, gy = cx + dx, cy + dy
+                    valid = (gx >= 0) & (gx < self.nx) & (gy >= 0) & (gy < self.ny)
+                    cell = np.where(valid, gy * self.nx + gx, 0)
+                    start = cell_start[cell]
+                    end = np.where(valid, cell_start[cell + 1], start)
+                    slot = start[:, None] + offsets[None, :]
+                    cand.append(np.where(slot < end[:, None], order[np.minimum(slot, len(order) - 1)], -1))
+            cand = np.concatenate(cand, axis=1)
+
+            safe = np.maximum(cand, 0)
+            d2 = (xs[safe] - px[:, None]) ** 2 + (ys[safe] - py[:, None]) ** 2
+            d2 = np.where(cand >= 0, d2, np.inf)
+            best_d2 = d2.min(axis=1)
+            # lowest node index among equally close candidates
+            best = np.where((d2 == best_d2[:, None]) & (cand >= 0), cand, big).min(axis=1)
+
+            # The 3x3 block only proves optimality within one cell_size
+            unsure = ~(best_d2 < self.cell_size ** 2)
+            for j in np.nonzero(unsure)[0]:
+                best[j] = self.nearest_index((px[j], py[j]))
+            result[lo:lo + len(px)] = best
+
+        return [self.node_ids[i] for i in result]
+
+    def _build_arrays(self, np):
+        # Node indices sorted by cell id, with CSR offsets into that order
+        xs = np.asarray(self.xs, dtype=float)
+        ys = np.asarray(self.ys, dtype=float)
+        cx = np.clip(((xs - self.min_x) / self.cell_size).astype(np.int64), 0, self.nx - 1)
+        cy = np.clip(((ys - self.min_y) / self.cell_size).astype(np.int64), 0, self.ny - 1)
+        cell_ids = cy * self.nx + cx
+        order = np.argsort(cell_ids, kind='stable')
+        counts = np.bincount(cell_ids, minlength=self.nx * self.ny)
+        cell_start = np.concatenate(([0], np.cumsum(counts)))
+        self._arrays = (order, cell_start, xs, ys, int(counts.max()))
@@ -0,0 +1,30 @@
+# The simulator is a flat set of top-level modules; make them importable
+# however pytest is started.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def city(tmp_path_factory):
+    """A small generated city: grid map, traffic and closure feeds, demand trace."""
+    from compact_graph import load_graph
+    from generators import generate_demand, generate_map, generate_traffic
+
+    root = tmp_path_factory.mktemp("city")
+    map_file = str(root / "grid.csv")
+    generate_map("grid", 225, map_file, seed=2)
+    graph = load_graph(map_file)
+    traffic_file = str(root / "traffic.jsonl")
+    generate_traffic(traffic_file, graph, 30, 5.0, 20, seed=1, closure_share=0.2)
+    closures_file = str(root / "closures.jsonl")
+    generate_traffic(closures_file, graph, 30, 5.0, 150, seed=1, closure_share=1.0)
+    demand_file = str(root / "demand.jsonl")
+    generate_demand(demand_file, graph.get_bounds(), 800, 0.15, seed=1)
+    return SimpleNamespace(map_file=map_file, traffic_file=traffic_file,
+                           closures_file=closures_file, demand_file=demand_file)
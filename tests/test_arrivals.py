@@ -0,0 +1,85 @@
+import itertools
+import json
+import pickle
+
+import pytest
+
+from arrivals import SyntheticArrivals, TraceArrivals
+from event_log import NullSink
+from generators import generate_fleet
+from simulation import RideSharingSimulation
+
+BOUNDS = (0.0, 0.0, 10.0, 20.0)
+
+
+def _take(source, n):
+    return list(itertools.islice(source, n))
+
+
+def test_synthetic_arrivals_are_reproducible():
+    first = _take(SyntheticArrivals(0.5, BOUNDS, seed=3, batch_size=64), 300)
+    assert first == _take(SyntheticArrivals(0.5, BOUNDS, seed=3, batch_size=64), 300)
+    assert first != _take(SyntheticArrivals(0.5, BOUNDS, seed=4, batch_size=64), 300)
+    times = [when for when, _, _, _ in first]
+    assert times[0] == 0.0 and times == sorted(times)
+    for _, (sx, sy), (ex, ey), rider_id in first:
+        assert 0 <= sx <= 10 and 0 <= sy <= 20 and 0 <= ex <= 10 and 0 <= ey <= 20
+        assert rider_id is None
+
+
+@pytest.mark.parametrize("consumed", [0, 1, 63, 64, 100])
+def test_pickled_synthetic_arrivals_resume_the_stream(consumed):
+    source = SyntheticArrivals(0.5, BOUNDS, seed=3, batch_size=64)
+    head = _take(source, consumed)
+    resumed = pickle.loads(pickle.dumps(source))
+    expected = _take(SyntheticArrivals(0.5, BOUNDS, seed=3, batch_size=64), consumed + 150)
+    assert head + _take(resumed, 150) == expected
+
+
+def _write_trace(path, lines):
+    path.write_text("".join(line + "\n" for line in lines))
+    return str(path)
+
+
+def test_trace_replay_and_resume(tmp_path):
+    trace = _write_trace(tmp_path / "trace.jsonl", [
+        json.dumps({"time": 0.5, "start": [1, 2], "dest": [3, 4], "id": "a"}),
+        "",
+        json.dumps({"time": 0.5, "start": [5, 6], "dest": [7, 8]}),
+        json.dumps({"time": 2, "start": [0, 0], "dest": [1, 1], "id": 9}),
+    ])
+    source = TraceArrivals(trace)
+    assert next(source) == (0.5, (1.0, 2.0), (3.0, 4.0), "a")
+    resumed = pickle.loads(pickle.dumps(source))
+    rest = [(0.5, (5.0, 6.0), (7.0, 8.0), None), (2.0, (0.0, 0.0), (1.0, 1.0), 9)]
+    assert list(source) == rest
+    assert list(resumed) == rest
+    assert next(source, None) is None
+    assert pickle.loads(pickle.dumps(source)).file is None
+
+
+@pytest.mark.parametrize("bad, message", [
+    ('{"time": 1, "start": [0, 0]}', r"trace.jsonl:2: bad trace record"),
+    ('{"time": 1, "start": [0], "dest": [0, 0]}', r"trace.jsonl:2: bad trace record"),
+    ('not json', r"trace.jsonl:2: bad trace record"),
+    ('{"time": 0.5, "start": [0, 0], "dest": [0, 0]}', r"trace.jsonl:2: time 0.5 is earlier than 1.0"),
+])
+def test_trace_errors_name_the_line(tmp_path, bad, message):
+    trace = _write_trace(tmp_path / "trace.jsonl", ['{"time": 1, "start": [0, 0], "dest": [1, 1]}', bad])
+    source = TraceArrivals(trace)
+    next(source)
+    with pytest.raises(ValueError, match=message):
+        next(source)
+
+
+def test_simulation_replays_trace_ids(city):
+    sim = RideSharingSimulation(max_time=40, map_file=city.map_file, trace_file=city.demand_file,
+                                event_log=NullSink())
+    sim.add_cars(generate_fleet(sim.graph, 20, 1))
+    sim.run()
+    with open(city.demand_file) as f:
+        requests = [json.loads(line) for line in f]
+    replayed = [r["id"] for r in requests if r["time"] < 40]
+    assert sim.total_riders_generated == len(replayed)
+    served = sim.trip_log.column("rider_id").tolist()
+    assert served and set(served) <= set(replayed)
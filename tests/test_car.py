@@ -0,0 +1,71 @@
+import pickle
+
+import numpy as np
+
+from car import Car, FleetState
+from rider import Rider
+
+
+def test_views_read_and_write_the_fleet_arrays():
+    fleet = FleetState(capacity=2)
+    cars = [Car(i, (float(i), 2.0 * i)) for i in range(5)]  # forces two doublings
+    for car in cars:
+        fleet.attach(car)
+    assert len(fleet) == 5
+    cars[3].position = (7.5, 8.5)
+    cars[3].available = False
+    cars[3].rides_completed += 2
+    assert (fleet.x[3], fleet.y[3], fleet.available[3], fleet.rides_completed[3]) == (7.5, 8.5, False, 2)
+    assert fleet.positions().tolist() == [[0, 0], [1, 2], [2, 4], [7.5, 8.5], [4, 8]]
+    assert [car.car_id for car in fleet.cars] == [0, 1, 2, 3, 4]
+
+
+def test_detach_keeps_values_and_moves_last_row():
+    fleet = FleetState()
+    cars = [Car(i, (float(i), 0.0)) for i in range(3)]
+    for car in cars:
+        fleet.attach(car)
+    cars[0].available = False
+    fleet.detach(cars[0])
+    assert (cars[0].car_id, cars[0].position, cars[0].available) == (0, (0.0, 0.0), False)
+    assert fleet.cars == [cars[2], cars[1]]
+    assert cars[2].position == (2.0, 0.0) and fleet.x[0] == 2.0
+    cars[0].position = (9.0, 9.0)  # detached: no longer touches the arrays
+    assert fleet.x[:len(fleet)].tolist() == [2.0, 1.0]
+
+
+def test_non_integer_ids():
+    fleet = FleetState()
+    cars = [Car(1, (0, 0)), Car("A", (1, 1)), Car(2.5, (2, 2))]
+    for car in cars:
+        fleet.attach(car)
+    assert [car.car_id for car in cars] == [1, "A", 2.5]
+    assert fleet.car_id.dtype == object
+    assert isinstance(cars[0].car_id, int)
+
+
+def test_detached_pickle_round_trip():
+    fleet = FleetState()
+    car = Car(7, (1.0, 2.0))
+    fleet.attach(car)
+    car.rides_completed = 4
+    copy = pickle.loads(pickle.dumps(car))
+    assert (copy.car_id, copy.position, copy.rides_completed) == (7, (1.0, 2.0), 4)
+    assert copy._fleet is None
+
+
+def test_manual_trip_api():
+    fleet = FleetState()
+    car = Car(1, (0.0, 0.0))
+    fleet.attach(car)
+    rider = Rider(5, (2.0, 0.0), (2.0, 3.0))
+    assert car.status == "available" and car.is_available()
+    car.assign_rider(rider)
+    assert car.status == "en_route_to_pickup" and not fleet.available[0]
+    assert car.assigned_rider is rider and car.route_time == 1.0
+    car.complete_pickup()
+    assert car.status == "en_route_to_destination" and car.position == (2.0, 0.0)
+    car.complete_dropoff()
+    assert car.status == "available" and car.position == (2.0, 3.0) and car.assigned_rider is None
+    assert np.array_equal(fleet.positions(), [[2.0, 3.0]])
+    assert str(car) == "Car 1 at (2.0, 3.0) - Status: available"
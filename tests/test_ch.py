@@ -0,0 +1,67 @@
+import random
+
+from ch import ContractionHierarchy
+from dijkstra import find_shortest_path
+from graph import Graph
+
+
+def _write_grid(path, weights):
+    # 4 x 4 grid; weights[i] is the weight of the i-th edge
+    rows = []
+    for x in range(4):
+        for y in range(4):
+            if x < 3:
+                rows.append((f"n{x}_{y}", x, y, f"n{x + 1}_{y}", x + 1, y))
+            if y < 3:
+                rows.append((f"n{x}_{y}", x, y, f"n{x}_{y + 1}", x, y + 1))
+    with open(path, "w") as f:
+        for row, w in zip(rows, weights):
+            f.write(",".join(map(str, row)) + f",{w}\n")
+    return len(rows)
+
+
+def _load(path):
+    graph = Graph()
+    graph.load_map_data(str(path))
+    return graph
+
+
+def test_for_map_rebuilds_when_weights_are_permuted(tmp_path):
+    map_file = tmp_path / "grid.csv"
+    weights = [1.0 + i for i in range(24)]
+    _write_grid(map_file, weights)
+    ContractionHierarchy.for_map(_load(map_file), str(map_file))
+
+    # Same node count, edge count and total weight, different roads
+    random.Random(0).shuffle(weights)
+    _write_grid(map_file, weights)
+    graph = _load(map_file)
+    ch = ContractionHierarchy.for_map(graph, str(map_file))
+    nodes = sorted(graph.adjacency_list)
+    for a in nodes:
+        for b in nodes:
+            assert abs(ch.shortest_path(a, b)[1] - find_shortest_path(graph, a, b)[1]) < 1e-9
+
+
+def test_for_map_reuses_matching_hierarchy(tmp_path):
+    map_file = tmp_path / "grid.csv"
+    _write_grid(map_file, [1.0 + i % 5 for i in range(24)])
+    first = ContractionHierarchy.for_map(_load(map_file), str(map_file))
+    again = ContractionHierarchy.for_map(_load(map_file), str(map_file))
+    assert again.fingerprint == first.fingerprint
+    assert again.rank == first.rank
+
+
+def test_for_map_rebuilds_unreadable_hierarchy(tmp_path):
+    map_file = tmp_path / "grid.csv"
+    _write_grid(map_file, [1.0 + i % 3 for i in range(24)])
+    ContractionHierarchy.for_map(_load(map_file), str(map_file))
+    ch_file = tmp_path / "grid.csv.ch"
+    # A worker that died mid-write under the old in-place save left this behind
+    ch_file.write_text(ch_file.read_text()[:100])
+
+    graph = _load(map_file)
+    ch = ContractionHierarchy.for_map(graph, str(map_file))
+    assert ch.shortest_path("n0_0", "n3_3")[1] == find_shortest_path(graph, "n0_0", "n3_3")[1]
+    assert ContractionHierarchy.load(str(ch_file)).rank == ch.rank
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["grid.csv", "grid.csv.ch"]
@@ -0,0 +1,67 @@
+import math
+
+import pytest
+
+from checkpoint import checkpoint_time, read_checkpoint
+from event_log import NullSink
+from generators import generate_fleet
+from simulation import RideSharingSimulation
+from traffic import schedule_traffic
+
+
+def _make(city, event_queue, dispatch, trace, patience):
+    sim = RideSharingSimulation(max_time=100, mean_arrival_time=0.3, map_file=city.map_file, seed=7,
+                                trace_file=city.demand_file if trace else None, event_queue=event_queue,
+                                dispatch=dispatch, event_log=NullSink(), rider_patience=patience)
+    sim.add_cars(generate_fleet(sim.graph, 20, 7))
+    schedule_traffic(sim, city.traffic_file)
+    return sim
+
+
+def _results(sim):
+    metrics = sim.calculate_metrics()
+    for name in ("dispatch_cpu_time", "dispatch_cpu_per_request"):
+        metrics.pop(name)
+    return metrics, sim.trip_log.rows()
+
+
+@pytest.mark.parametrize("event_queue, dispatch, trace, patience", [
+    ("heap", "greedy", False, math.inf),
+    ("calendar", "batch", True, 3.0),
+    ("calendar", "greedy", True, math.inf),
+    ("heap", "batch", False, 3.0),
+])
+def test_resumed_run_matches_uninterrupted_run(city, tmp_path, event_queue, dispatch, trace, patience):
+    straight = _make(city, event_queue, dispatch, trace, patience)
+    straight.run()
+    expected = _results(straight)
+    assert expected[0]["total_trips"] > 0
+
+    saving = _make(city, event_queue, dispatch, trace, patience)
+    saving.schedule_checkpoints(str(tmp_path / "run_{time:g}.ckpt"), 30)
+    saving.run()
+    assert _results(saving) == expected  # taking snapshots changes nothing
+
+    for time in (30, 90):
+        filename = str(tmp_path / f"run_{time}.ckpt")
+        assert checkpoint_time(filename) == time
+        resumed = RideSharingSimulation.load_checkpoint(filename, event_log=NullSink())
+        resumed.run()
+        assert _results(resumed) == expected
+
+
+def test_rejects_foreign_and_truncated_files(city, tmp_path):
+    sim = _make(city, "heap", "greedy", False, math.inf)
+    filename = str(tmp_path / "sim.ckpt")
+    sim.save_checkpoint(filename)
+    data = open(filename, "rb").read()
+
+    other = tmp_path / "other.ckpt"
+    other.write_bytes(b"not a checkpoint" + data)
+    with pytest.raises(ValueError, match="not a simulation checkpoint"):
+        read_checkpoint(str(other))
+
+    truncated = tmp_path / "truncated.ckpt"
+    truncated.write_bytes(data[:-10])
+    with pytest.raises(Exception):
+        read_checkpoint(str(truncated))
@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from compact_graph import CompactGraph, load_graph
+from dijkstra import dijkstra, find_shortest_path
+from generators import generate_map
+from graph import Graph
+
+
+@pytest.fixture(scope="module")
+def maps(tmp_path_factory):
+    root = tmp_path_factory.mktemp("maps")
+    csv_file = str(root / "geo.csv")
+    generate_map("geometric", 300, csv_file, seed=6)
+    bin_file = str(root / "geo.bin")
+    CompactGraph.from_csv(csv_file).save(bin_file)
+    graph = Graph()
+    graph.load_map_data(csv_file)
+    return graph, csv_file, bin_file
+
+
+def _named_adjacency(compact):
+    name = compact.node_name
+    return {name(u): sorted((name(v), w) for v, w in compact.adjacency_list[u])
+            for u in compact.adjacency_list}
+
+
+def test_binary_round_trip(maps):
+    graph, csv_file, bin_file = maps
+    built = CompactGraph.from_graph(graph)
+    loaded = load_graph(bin_file)
+    assert isinstance(loaded, CompactGraph)
+    assert loaded.node_ids == built.node_ids
+    for name in ("xs", "ys", "offsets", "targets", "weights"):
+        assert list(getattr(loaded, name)) == list(getattr(built, name))
+    assert _named_adjacency(loaded) == {n: sorted(edges) for n, edges in graph.adjacency_list.items()}
+    assert loaded.get_bounds() == graph.get_bounds()
+    for u in range(len(loaded.node_ids)):
+        assert loaded.node_coordinates[u] == graph.node_coordinates[loaded.node_name(u)]
+
+
+def test_searches_match_dict_graph(maps):
+    graph, _, bin_file = maps
+    compact = load_graph(bin_file)
+    index = {n: i for i, n in enumerate(compact.node_ids)}
+    rng = random.Random(0)
+    nodes = sorted(graph.adjacency_list)
+    for _ in range(30):
+        a, b = rng.choice(nodes), rng.choice(nodes)
+        path, cost = find_shortest_path(compact, index[a], index[b])
+        assert cost == pytest.approx(find_shortest_path(graph, a, b)[1])
+        assert compact.node_name(path[0]) == a and compact.node_name(path[-1]) == b
+    source = rng.choice(nodes)
+    backward, _ = dijkstra(compact, index[source], reverse=True)
+    expected, _ = dijkstra(graph, source, reverse=True)
+    assert {compact.node_name(n): d for n, d in backward.items()} == pytest.approx(expected)
+    for _ in range(20):
+        point = (rng.uniform(0, 100), rng.uniform(0, 100))
+        assert compact.node_coordinates[compact.find_nearest_vertex(point)] == \
+            graph.node_coordinates[graph.find_nearest_vertex(point)]
+
+
+def test_weight_updates_leave_the_file_alone(maps):
+    _, _, bin_file = maps
+    compact = load_graph(bin_file)
+    compact.reverse_adjacency()
+    u = 0
+    v, w = next(iter(compact.adjacency_list[u]))
+    assert compact.update_edge_weights([(u, v, w * 3)]) == [(u, v, w, w * 3), (v, u, w, w * 3)]
+    assert (v, w * 3) in compact.adjacency_list[u]
+    assert (u, w * 3) in compact.reverse_adjacency()[v]
+    assert compact.version == 1
+    assert (v, w) in load_graph(bin_file).adjacency_list[u]
+    with pytest.raises(KeyError):
+        compact.set_edge_weight(u, u, 1.0)
+
+
+def test_rejects_other_files(maps):
+    _, csv_file, _ = maps
+    with pytest.raises(ValueError, match="not a binary map file"):
+        CompactGraph.load(csv_file)
@@ -0,0 +1,52 @@
+import math
+import random
+
+import pytest
+
+from dijkstra import dijkstra, find_etas, find_shortest_path
+from generators import generate_map
+from graph import Graph
+
+
+@pytest.fixture(scope="module")
+def one_way(tmp_path_factory):
+    # Every road is one-way, so costs to and from a node differ
+    filename = str(tmp_path_factory.mktemp("map") / "geo.csv")
+    generate_map("geometric", 300, filename, seed=5)
+    graph = Graph()
+    graph.load_map_data(filename, directed=True)
+    return graph
+
+
+def test_etas_match_per_car_searches(one_way):
+    rng = random.Random(1)
+    nodes = sorted(one_way.adjacency_list)
+    for _ in range(20):
+        rider = rng.choice(nodes)
+        cars = rng.sample(nodes, 15)
+        etas = find_etas(one_way, rider, cars)
+        assert set(etas) == set(cars)
+        for car in cars:
+            assert etas[car] == pytest.approx(find_shortest_path(one_way, car, rider)[1])
+
+
+def test_etas_respect_cutoff(one_way):
+    rng = random.Random(2)
+    nodes = sorted(one_way.adjacency_list)
+    rider = rng.choice(nodes)
+    cars = rng.sample(nodes, 40)
+    full = find_etas(one_way, rider, cars)
+    cutoff = sorted(full.values())[20]
+    limited = find_etas(one_way, rider, cars, cutoff=cutoff)
+    for car in cars:
+        assert limited[car] == (full[car] if full[car] <= cutoff else math.inf)
+    assert find_etas(one_way, rider, []) == {}
+
+
+def test_reverse_search_gives_costs_to_source(one_way):
+    source = sorted(one_way.adjacency_list)[0]
+    backward, _ = dijkstra(one_way, source, reverse=True)
+    forward = {n: dijkstra(one_way, n, targets=(source,))[0].get(source, math.inf)
+               for n in list(backward)[:50]}
+    for n, cost in forward.items():
+        assert backward[n] == pytest.approx(cost)
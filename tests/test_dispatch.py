@@ -0,0 +1,57 @@
+import itertools
+import math
+import random
+
+import numpy as np
+import pytest
+
+from dispatch import build_eta_matrix, solve_assignment
+
+
+def _brute_force(cost):
+    # Best (unmatched-by-inf count, total cost) over every full matching of the smaller side
+    n, m = cost.shape
+    best = None
+    if n <= m:
+        matchings = ([(i, c) for i, c in enumerate(cols)] for cols in itertools.permutations(range(m), n))
+    else:
+        matchings = ([(r, j) for j, r in enumerate(rows)] for rows in itertools.permutations(range(n), m))
+    for pairs in matchings:
+        finite = [cost[r, c] for r, c in pairs if math.isfinite(cost[r, c])]
+        key = (len(pairs) - len(finite), sum(finite))
+        if best is None or key[0] < best[0] or (key[0] == best[0] and key[1] < best[1] - 1e-9):
+            best = key
+    return best
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_solve_assignment_matches_brute_force(seed):
+    rng = random.Random(seed)
+    n, m = rng.randint(1, 6), rng.randint(1, 6)
+    # Unreachable cars, ties (small integers) and general ETAs
+    cost = np.array([[rng.choice([math.inf, rng.randint(0, 5), rng.uniform(0, 50), rng.uniform(0, 50)])
+                      for _ in range(m)] for _ in range(n)])
+    pairs = solve_assignment(cost)
+    rows = [r for r, _ in pairs]
+    cols = [c for _, c in pairs]
+    assert len(set(rows)) == len(rows) and len(set(cols)) == len(cols)
+    assert all(math.isfinite(cost[r, c]) for r, c in pairs)
+    unmatched, total = _brute_force(cost)
+    assert len(pairs) == min(n, m) - unmatched
+    assert sum(cost[r, c] for r, c in pairs) == pytest.approx(total)
+
+
+def test_empty_and_all_unreachable():
+    assert solve_assignment(np.zeros((0, 3))) == []
+    assert solve_assignment(np.full((2, 2), np.inf)) == []
+
+
+class _Router:
+    # ETAs as the absolute difference of integer node ids
+    def etas(self, target_node, source_nodes):
+        return {n: abs(n - target_node) if n >= 0 else math.inf for n in source_nodes}
+
+
+def test_eta_matrix_copies_shared_car_nodes():
+    etas = build_eta_matrix(_Router(), [0, 10], [3, 3, -1, 12])
+    assert etas.tolist() == [[3, 3, math.inf, 12], [7, 7, math.inf, 2]]
@@ -0,0 +1,78 @@
+import io
+
+import pytest
+
+from event_log import (DROPOFF, PICKUP, BinarySink, JsonlSink, NullSink, PrintSink, RingBufferSink,
+                       make_sink, read_binary_log, read_jsonl_log)
+from generators import generate_fleet
+from simulation import RideSharingSimulation
+
+RECORDS = [(0.5 * i, PICKUP if i % 2 == 0 else DROPOFF, i % 3, i // 2) for i in range(25)]
+
+
+def test_print_and_ring_buffer_sinks():
+    stream = io.StringIO()
+    sink = PrintSink(stream)
+    sink.log(1.234, PICKUP, 3, 7)
+    sink.log(2.5, DROPOFF, 3, 7)
+    assert stream.getvalue() == ("TIME 1.23: Car 3 picked up Rider 7\n"
+                                 "TIME 2.50: Rider 7 dropped off by Car 3\n")
+    ring = RingBufferSink(capacity=10)
+    for record in RECORDS:
+        ring.log(*record)
+    assert list(ring.records) == RECORDS[-10:]
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_file_sinks_round_trip(tmp_path, background):
+    jsonl = JsonlSink(str(tmp_path / "log.jsonl"), block_records=4, background=background)
+    binary = BinarySink(str(tmp_path / "log.bin"), block_records=4, background=background)
+    for sink in (jsonl, binary):
+        for record in RECORDS:
+            sink.log(*record)
+        sink.flush()
+        sink.close()
+        sink.close()  # closing twice is harmless
+    assert read_jsonl_log(str(tmp_path / "log.jsonl")) == [
+        {"time": t, "kind": ("pickup", "dropoff")[k], "car_id": c, "rider_id": r} for t, k, c, r in RECORDS]
+    log = read_binary_log(str(tmp_path / "log.bin"))
+    assert [tuple(row) for row in log.tolist()] == RECORDS
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_binary_sink_rejects_non_integer_ids(tmp_path, background):
+    sink = BinarySink(str(tmp_path / "log.bin"), block_records=1, background=background)
+    with pytest.raises(ValueError, match="use a .jsonl log"):
+        sink.log(1.0, PICKUP, "cab-a", 1)
+        sink.flush()
+    sink.close()
+    other = tmp_path / "other.bin"
+    other.write_bytes(b"x" * 32)
+    with pytest.raises(ValueError, match="not a binary event log"):
+        read_binary_log(str(other))
+
+
+def test_make_sink(tmp_path):
+    assert type(make_sink("print")) is PrintSink
+    assert type(make_sink("quiet")) is NullSink and not make_sink("quiet").enabled
+    assert type(make_sink("ring")) is RingBufferSink
+    sink = make_sink(str(tmp_path / "log.jsonl"), background=True)
+    assert type(sink) is JsonlSink
+    sink.close()
+    with pytest.raises(ValueError, match="Unknown event log"):
+        make_sink("log.txt")
+
+
+def test_simulation_logs_every_pickup_and_dropoff(city, tmp_path):
+    sink = JsonlSink(str(tmp_path / "run.jsonl"), block_records=16)
+    sim = RideSharingSimulation(max_time=40, map_file=city.map_file, trace_file=city.demand_file, event_log=sink)
+    sim.add_cars(generate_fleet(sim.graph, 20, 1))
+    sim.run()
+    sink.close()
+    records = read_jsonl_log(str(tmp_path / "run.jsonl"))
+    pickups = {(r["car_id"], r["rider_id"]): r["time"] for r in records if r["kind"] == "pickup"}
+    dropoffs = [r for r in records if r["kind"] == "dropoff"]
+    assert len(dropoffs) == sim.calculate_metrics()["total_trips"] > 0
+    for r in dropoffs:
+        assert pickups[(r["car_id"], r["rider_id"])] <= r["time"]
+    assert [r["time"] for r in records] == sorted(r["time"] for r in records)
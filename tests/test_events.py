@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from events import CalendarBackend, Event, EventQueue
+
+
+def _queue(backend):
+    queue = EventQueue(backend)
+    queue.register("tick", lambda: None)
+    return queue
+
+
+@pytest.mark.parametrize("backend", ["heap", "calendar"])
+def test_cancelled_head_does_not_advance_clock(backend):
+    queue = _queue(backend)
+    early = queue.schedule(5.0, "tick")
+    queue.schedule(8.0, "tick")
+    queue.cancel(early)
+    assert queue.pop(until=2.0) is None
+    queue.schedule(3.0, "tick")  # still after the last processed event
+    assert queue.pop().time == 3.0
+    assert queue.pop().time == 8.0
+    assert queue.pop() is None
+
+
+def test_calendar_days_match_push_at_bucket_boundaries():
+    # (day + 1) * width accumulated by repeated addition drifts from
+    # int(time / width); 0.5 must still pop before 0.599
+    width = 0.05000000000000001
+    backend = CalendarBackend(nbuckets=16, width=width)
+    times = [0.599, 0.5, 10 * width, 0.55, 0.6, 0.6]
+    for seq, time in enumerate(times):
+        backend.push((time, seq, Event(time, seq, "tick", None, ())))
+    assert [backend.pop()[0] for _ in times] == sorted(times)
+
+
+def _draw_time(rng, now):
+    # Continuous gaps, repeated times and times on likely bucket boundaries
+    kind = rng.random()
+    if kind < 0.2:
+        return now
+    if kind < 0.5:
+        step = rng.choice([0.05, 0.1, 1 / 3, 0.05000000000000001])
+        return (int(now / step) + rng.randint(0, 30)) * step if now else rng.randint(0, 30) * step
+    return now + rng.expovariate(1.0) * rng.choice([0.1, 1.0, 20.0])
+
+
+def test_calendar_matches_heap_with_cancellations_and_bounded_pops():
+    for trial in range(300):
+        rng = random.Random(trial)
+        queues = [_queue("heap"), _queue("calendar")]
+        pending = [[], []]
+        now = 0.0
+        for _ in range(200):
+            op = rng.random()
+            if op < 0.45:
+                time = max(_draw_time(rng, now), now)
+                for queue, events in zip(queues, pending):
+                    events.append(queue.schedule(time, "tick"))
+            elif op < 0.6 and pending[0]:
+                k = rng.randrange(len(pending[0]))
+                for queue, events in zip(queues, pending):
+                    queue.cancel(events[k])
+            else:
+                until = now + rng.expovariate(0.5)
+                popped = [queue.pop(until) for queue in queues]
+                assert [e and (e.time, e.seq) for e in popped] == \
+                    [popped[0] and (popped[0].time, popped[0].seq)] * 2, trial
+                if popped[0] is not None:
+                    now = popped[0].time
+                else:
+                    now = until
+                assert queues[0].peek_time() == queues[1].peek_time()
+            assert len(queues[0]) == len(queues[1])
+        drained = [[(e.time, e.seq) for e in iter(queue.pop, None)] for queue in queues]
+        assert drained[0] == drained[1]
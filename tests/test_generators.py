@@ -0,0 +1,102 @@
+import gzip
+import json
+import math
+
+import numpy as np
+import pytest
+
+from compact_graph import load_graph
+from dijkstra import dijkstra
+from generators import (generate_demand, generate_fleet, generate_map, generate_traffic, geometric_map,
+                        grid_map)
+
+
+def _read(path):
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("kind", ["grid", "geometric"])
+def test_maps_are_reproducible_for_a_seed(tmp_path, kind):
+    first, again, other = (tmp_path / "a.csv", tmp_path / "b.csv.gz", tmp_path / "c.csv")
+    assert generate_map(kind, 400, str(first), seed=1) == generate_map(kind, 400, str(again), seed=1)
+    generate_map(kind, 400, str(other), seed=2)
+    assert _read(first) == _read(again)
+    assert _read(first) != _read(other)
+
+
+def test_grid_map_shape():
+    xs, ys, u, v, w = grid_map(5, seed=0)
+    assert len(xs) == 25 and len(u) == 2 * 5 * 4
+    assert np.all(np.abs(xs[u] - xs[v]) + np.abs(ys[u] - ys[v]) == 1)
+    assert np.all((w >= 1) & (w < 2))
+
+
+def test_geometric_map_is_one_connected_component(tmp_path):
+    xs, ys, u, v, w = geometric_map(500, seed=4)
+    assert np.all(u != v)
+    assert len(set(zip(np.minimum(u, v).tolist(), np.maximum(u, v).tolist()))) == len(u)
+    length = np.hypot(xs[u] - xs[v], ys[u] - ys[v])
+    assert np.all(length <= math.sqrt(6.0 / math.pi) + 1e-12)
+    assert np.all((w >= length) & (w <= 1.5 * np.maximum(length, 1e-9)))
+
+    filename = str(tmp_path / "geo.csv")
+    nodes, _ = generate_map("geometric", 500, filename, seed=4)
+    graph = load_graph(filename)
+    dist, _ = dijkstra(graph, next(iter(graph.adjacency_list)))
+    assert len(dist) == nodes == len(xs)
+
+
+def test_fleet_placement(tmp_path):
+    filename = str(tmp_path / "grid.csv")
+    generate_map("grid", 100, filename, seed=0)
+    graph = load_graph(filename)
+    fleet = generate_fleet(graph, 30, seed=5)
+    assert [car.car_id for car in fleet] == list(range(1, 31))
+    positions = [car.position for car in fleet]
+    assert len(set(positions)) == 30
+    assert set(positions) <= {tuple(xy) for xy in graph.node_coordinates.values()}
+    assert positions == [car.position for car in generate_fleet(graph, 30, seed=5)]
+    assert len(generate_fleet(graph, 500, seed=5)) == 100  # one car per node at most
+
+    min_x, min_y, max_x, max_y = graph.get_bounds()
+    for car in generate_fleet(graph, 50, seed=5, placement="uniform"):
+        assert min_x <= car.position[0] <= max_x and min_y <= car.position[1] <= max_y
+    with pytest.raises(ValueError, match="Unknown fleet placement"):
+        generate_fleet(graph, 5, placement="edges")
+
+
+def test_demand_trace(tmp_path):
+    bounds = (0.0, 0.0, 50.0, 20.0)
+    first, again = str(tmp_path / "a.jsonl"), str(tmp_path / "b.jsonl")
+    end = generate_demand(first, bounds, 300, 0.5, seed=3, hotspots=2)
+    assert generate_demand(again, bounds, 300, 0.5, seed=3, hotspots=2) == end
+    assert _read(first) == _read(again)
+    requests = [json.loads(line) for line in _read(first).splitlines()]
+    times = [r["time"] for r in requests]
+    assert times[0] == 0.0 and times == sorted(times) and times[-1] == end
+    assert [r["id"] for r in requests] == list(range(1, 301))
+    for r in requests:
+        for x, y in (r["start"], r["dest"]):
+            assert 0 <= x <= 50 and 0 <= y <= 20
+
+
+def test_traffic_restores_previous_roads(tmp_path):
+    filename = str(tmp_path / "grid.csv")
+    generate_map("grid", 100, filename, seed=0)
+    graph = load_graph(filename)
+    weights = {(u, v): w for u in graph.adjacency_list for v, w in graph.adjacency_list[u]}
+    traffic = str(tmp_path / "traffic.jsonl")
+    generate_traffic(traffic, graph, 6, interval=5.0, edges_per_update=8, seed=1, closure_share=0.5)
+    updates = [json.loads(line) for line in _read(traffic).splitlines()]
+    assert [u["time"] for u in updates] == [5.0 * k for k in range(1, 7)]
+    previous = []
+    for update in updates:
+        restored, changed = update["edges"][:len(previous)], update["edges"][len(previous):]
+        assert [(u, v) for u, v, _ in restored] == previous
+        assert all(w == weights[(u, v)] for u, v, w in restored)
+        assert len(changed) == 8
+        assert all(w is None or w > weights[(u, v)] for u, v, w in changed)
+        previous = [(u, v) for u, v, _ in changed]
+    assert any(w is None for update in updates for _, _, w in update["edges"])
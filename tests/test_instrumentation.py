@@ -0,0 +1,78 @@
+import json
+import time
+
+import pytest
+
+from dijkstra import dijkstra
+from event_log import NullSink
+from generators import generate_fleet
+from instrumentation import Instrumentation, profile_call, stats
+from simulation import RideSharingSimulation
+
+
+@pytest.fixture
+def enabled():
+    stats.reset()
+    stats.enable()
+    yield stats
+    stats.disable()
+    stats.reset()
+
+
+def test_counters_timers_and_reports(tmp_path):
+    inst = Instrumentation()
+    inst.count("a")
+    inst.count("a", 4)
+    for seconds in (0.002, 0.001, 0.003):
+        inst.add_time("t", seconds)
+    data = inst.to_dict()
+    assert data["counters"] == {"a": 5}
+    assert data["timers"]["t"] == {"calls": 3, "total_s": pytest.approx(0.006),
+                                   "mean_us": pytest.approx(2000), "max_us": pytest.approx(3000)}
+    table = inst.summary_table().splitlines()
+    assert table[1].split() == ["a", "5"]
+    assert table[-1].split()[:2] == ["t", "3"]
+    inst.export_json(str(tmp_path / "stats.json"), extra={"routing": {"queries": 1}})
+    with open(tmp_path / "stats.json") as f:
+        assert json.load(f) == dict(json.loads(json.dumps(data)), routing={"queries": 1})
+    inst.reset()
+    assert inst.to_dict() == {"counters": {}, "timers": {}}
+
+
+def test_disabled_hot_paths_count_nothing(city):
+    sim = RideSharingSimulation(max_time=20, map_file=city.map_file, trace_file=city.demand_file,
+                                event_log=NullSink())
+    stats.reset()
+    dijkstra(sim.graph, next(iter(sim.graph.adjacency_list)))
+    assert not stats.counters and not stats.timers
+
+
+def test_simulation_reports_hot_path_counters(city, enabled):
+    sim = RideSharingSimulation(max_time=20, map_file=city.map_file, trace_file=city.demand_file,
+                                event_log=NullSink())
+    source = next(iter(sim.graph.adjacency_list))
+    dist, _ = dijkstra(sim.graph, source)
+    assert stats.counters["dijkstra.searches"] == 1
+    assert stats.counters["dijkstra.heap_pops"] >= len(dist)
+    stats.reset()
+
+    sim.add_cars(generate_fleet(sim.graph, 20, 1))
+    sim.run()
+    assert stats.timers["handler.rider_request"][0] == sim.total_riders_generated
+    assert stats.counters["quadtree.knn_queries"] > 0
+    assert stats.counters["spatial.nearest_queries"] > 0
+
+
+def test_profile_call():
+    def work():
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        return 42
+
+    result, report = profile_call(work, "cprofile")
+    assert result == 42 and "work" in report
+    result, report = profile_call(work, "sample")
+    assert result == 42 and "samples over" in report
+    with pytest.raises(ValueError, match="Unknown profiler"):
+        profile_call(work, "perf")
@@ -0,0 +1,61 @@
+import gzip
+import shutil
+
+import pytest
+
+from generators import generate_map
+from map_loader import load_edges
+
+
+def _write(tmp_path, text):
+    path = tmp_path / "map.csv"
+    path.write_text(text)
+    return str(path)
+
+
+@pytest.mark.parametrize("weight", ["-5", "nan", "inf", "abc"])
+def test_bad_weights_are_malformed(tmp_path, weight):
+    filename = _write(tmp_path, f"A,0,0,B,1,0,{weight}\nB,1,0,C,2,0,1.5\n")
+    coords, edges, report = load_edges(filename)
+    assert edges == {("B", "C"): 1.5}
+    assert report.malformed == [(1, f"A,0,0,B,1,0,{weight}")]
+    assert report.rows == 1
+    with pytest.raises(ValueError, match=":1: malformed row"):
+        load_edges(filename, strict=True)
+
+
+def test_duplicates_and_conflicts(tmp_path):
+    filename = _write(tmp_path, "# comment\n\nA,0,0,B,1,0,2\nB,1,0,A,0,0,1\nA,0,0,B,1,0,3\nB,1,5,C,2,0,0\n")
+    coords, edges, report = load_edges(filename)
+    assert edges == {("A", "B"): 1.0, ("B", "C"): 0.0}
+    assert report.duplicates == 2
+    assert report.conflicts == [("B", (1.0, 0.0), (1.0, 5.0), 6)]
+    directed = load_edges(filename, directed=True)[1]
+    assert directed == {("A", "B"): 2.0, ("B", "A"): 1.0, ("B", "C"): 0.0}
+
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_chunked_load_matches_reading_the_whole_file(tmp_path, directed):
+    filename = str(tmp_path / "geo.csv")
+    generate_map("geometric", 400, filename, seed=9)
+    with open(filename) as f:
+        text = f.read()
+    # Extra rows: both directions of an edge, a heavier duplicate, a comment
+    row = text.splitlines()[0].split(",")
+    start, end, weight = row[0:3], row[3:6], row[6]
+    with open(filename, "a") as f:
+        f.write(",".join(end + start + [weight]) + "\n")
+        f.write(",".join(start + end + ["99"]) + "\n")
+        f.write("# end\n")
+    with open(filename, "rb") as src, gzip.open(filename + ".gz", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+
+    whole = load_edges(filename, directed=directed, chunk_bytes=1 << 30)
+    for name, chunk_bytes in ((filename, 97), (filename, 4096), (filename + ".gz", 97)):
+        coords, edges, report = load_edges(name, directed=directed, chunk_bytes=chunk_bytes)
+        assert coords == whole[0]
+        assert list(edges.items()) == list(whole[1].items())  # same first-seen order
+        assert (report.rows, report.duplicates, report.edges) == (whole[2].rows, whole[2].duplicates,
+                                                                  whole[2].edges)
+    assert whole[2].rows == len(text.splitlines()) + 2
+    assert whole[2].duplicates == (1 if directed else 2)
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from metrics import MetricsCollector, RunningStats, TDigest, TimeSeries
+
+QUANTILES = [0.001, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999]
+
+
+def _samples(kind, n, seed):
+    rng = np.random.default_rng(seed)
+    if kind == "uniform":
+        return rng.uniform(0, 10, n)
+    if kind == "exponential":
+        return rng.exponential(3.0, n)
+    return rng.lognormal(1.0, 1.5, n)  # heavy right tail, like wait times under load
+
+
+def _rank_error(values, estimate, q):
+    # How far (as a fraction of the sorted data) the estimate's rank is from q
+    return abs(np.searchsorted(values, estimate) / len(values) - q)
+
+
+@pytest.mark.parametrize("kind", ["uniform", "exponential", "lognormal"])
+def test_tdigest_quantile_error_is_small(kind):
+    values = _samples(kind, 50000, seed=1)
+    digest = TDigest(compression=100)
+    for x in values.tolist():
+        digest.add(x)
+    values.sort()
+    assert digest.count == len(values)
+    assert (digest.min, digest.max) == (values[0], values[-1])
+    assert len(digest.means) < 300  # memory stays bounded
+    for q in QUANTILES:
+        # The k1 scale keeps centroids small near the tails, so the error
+        # bound tightens there: about q(1-q) times a constant
+        assert _rank_error(values, digest.quantile(q), q) <= 0.001 + 0.01 * q * (1 - q), q
+    assert (digest.quantile(0), digest.quantile(1)) == pytest.approx((values[0], values[-1]))
+
+
+def test_merged_tdigests_match_one_digest():
+    values = _samples("lognormal", 40000, seed=2)
+    parts = [TDigest() for _ in range(4)]
+    for i, x in enumerate(values.tolist()):
+        parts[i % 4].add(x)
+    merged = TDigest()
+    for part in parts:
+        merged.merge(part)
+    values.sort()
+    assert merged.count == len(values)
+    for q in QUANTILES:
+        assert _rank_error(values, merged.quantile(q), q) <= 0.0015 + 0.01 * q * (1 - q), q
+    assert np.isnan(TDigest().quantile(0.5))
+    single = TDigest()
+    single.add(4.0)
+    assert single.percentiles() == {"p50": 4.0, "p90": 4.0, "p99": 4.0}
+
+
+def test_running_stats_merge_matches_numpy():
+    values = _samples("exponential", 1001, seed=3)
+    left, right, whole = RunningStats(), RunningStats(), RunningStats()
+    for i, x in enumerate(values.tolist()):
+        (left if i < 400 else right).add(x)
+        whole.add(x)
+    left.merge(right)
+    left.merge(RunningStats())
+    for stats in (left, whole):
+        assert stats.count == len(values)
+        assert stats.mean == pytest.approx(values.mean())
+        assert stats.variance == pytest.approx(values.var(ddof=1))
+        assert (stats.min, stats.max) == (values.min(), values.max())
+
+
+def test_time_series_splits_busy_time_across_intervals():
+    series = TimeSeries(interval=10.0)
+    series.add(3.0, "requests")
+    series.add(12.0, "completed")
+    series.add(12.0, "wait_sum", 4.0)
+    series.add_busy(7.0, 31.0)
+    rows = series.rows(fleet_size=2)
+    assert [row["start"] for row in rows] == [0.0, 10.0, 20.0, 30.0]
+    assert [row["busy_time"] for row in rows] == pytest.approx([3.0, 10.0, 10.0, 1.0])
+    assert rows[1]["utilization"] == pytest.approx(0.5)
+    assert rows[1]["avg_wait_time"] == 4.0 and rows[0]["requests"] == 1
+
+
+def test_collector_busy_time_and_merge():
+    a, b = MetricsCollector(), MetricsCollector()
+    a.on_request(0.0)
+    a.on_assign(1, 0.0)
+    a.on_trip_complete(1, 2.0, 5.0, 8.0)
+    a.on_assign(1, 10.0)  # still under way
+    b.on_request(1.0)
+    b.on_assign(2, 4.0)
+    b.on_cancel(2, 6.0)
+    b.on_assign(2, 6.0, count=False)  # same rider, new car trip
+    assert a.busy_times(15.0) == {1: 13.0}
+    assert b.assigned == 1 and b.cancelled == 1
+    a.merge(b)
+    assert a.busy_times(16.0) == {1: 14.0, 2: 12.0}
+    snapshot = a.snapshot()
+    assert (snapshot["requests"], snapshot["assigned"], snapshot["completed"]) == (2, 3, 1)
@@ -0,0 +1,99 @@
+import math
+import random
+
+import pytest
+
+from compact_graph import CompactGraph, load_graph
+from generators import generate_map
+from path_cache import AllPairsTable, CachedEngine, PathCache
+from routing import DijkstraEngine, make_engine
+
+
+@pytest.fixture(scope="module")
+def map_file(tmp_path_factory):
+    filename = str(tmp_path_factory.mktemp("maps") / "geo.csv")
+    generate_map("geometric", 150, filename, seed=5)
+    return filename
+
+
+def _edges(graph):
+    return [(u, v) for u in graph.adjacency_list for v, _ in graph.adjacency_list[u]]
+
+
+def _batch(rng, edges):
+    return [(*rng.choice(edges), rng.choice([math.inf, rng.uniform(0.01, 1), rng.uniform(1, 50)]))
+            for _ in range(rng.randint(1, 5))]
+
+
+def _path_cost(graph, path):
+    return sum(min(w for n, w in graph.adjacency_list.get(a) if n == b) for a, b in zip(path, path[1:]))
+
+
+def test_lru_eviction_and_discard():
+    cache = PathCache(max_entries=2)
+    cache.put(("a", "b"), 1.0, ["a", "b"])
+    cache.put(("a", "c"), 2.0)
+    assert cache.get_cost(("a", "b")) == 1.0  # now most recently used
+    cache.put(("b", "c"), 3.0)
+    assert cache.get_cost(("a", "c")) is None
+    cache.discard([("a", "b")])
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["invalidations"] == 1
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_recompute_rows_matches_fresh_table(map_file, compact):
+    graph = load_graph(map_file)
+    if compact:
+        graph = CompactGraph.from_graph(graph)
+    table = AllPairsTable(graph)
+    rng = random.Random(2)
+    edges = _edges(graph)
+    recomputed = 0
+    for _ in range(10):
+        changed = graph.update_edge_weights(_batch(rng, edges), directed=rng.random() < 0.3)
+        rows = table.stale_rows(changed)
+        fresh = AllPairsTable(graph)
+        for source in set(table.dist) - rows:
+            assert table.dist[source] == fresh.dist[source]
+        table.recompute_rows(rows)
+        recomputed += len(rows)
+        assert table.dist == fresh.dist
+        for a in rng.sample(sorted(table.dist), 10):
+            for b in rng.sample(sorted(table.dist), 10):
+                path, cost = table.path(a, b)
+                if cost < math.inf:
+                    assert _path_cost(graph, path) == pytest.approx(cost)
+    assert recomputed < 10 * len(table.dist)  # repairs stay selective
+
+
+@pytest.mark.parametrize("name", ["dijkstra", "alt", "ch"])
+@pytest.mark.parametrize("compact", [False, True])
+def test_cached_engine_keeps_only_valid_entries(map_file, name, compact):
+    graph = load_graph(map_file)
+    if compact:
+        graph = CompactGraph.from_graph(graph)
+    engine = CachedEngine(make_engine(name, graph), max_entries=5000)
+    reference = DijkstraEngine(graph)
+    rng = random.Random(1)
+    nodes = sorted(graph.adjacency_list)
+    edges = _edges(graph)
+    kept = 0
+    for _ in range(10):
+        for _ in range(100):
+            a, b = rng.choice(nodes), rng.choice(nodes)
+            if rng.random() < 0.5:
+                engine.shortest_path(a, b)
+            else:
+                engine.etas(b, set(rng.sample(nodes, 4)))
+        before = len(engine.cache.entries)
+        engine.update_weights(_batch(rng, edges), directed=rng.random() < 0.3)
+        kept += len(engine.cache.entries) / max(before, 1)
+        # Every surviving entry must still be exact
+        for (a, b), (cost, path) in list(engine.cache.entries.items()):
+            assert cost == pytest.approx(reference.shortest_path(a, b)[1])
+            if path is not None and cost < math.inf:
+                assert _path_cost(graph, path) == pytest.approx(cost)
+    assert kept / 10 > 0.5  # most entries survive a small batch
+    assert engine.cache.invalidations > 0
@@ -0,0 +1,168 @@
+import math
+import random
+
+import pytest
+
+from car import Car
+from quadtree import Quadtree, Rectangle
+
+SIZE = 100.0
+
+
+def _check(tree, expected):
+    """Structure invariants plus: the tree holds exactly `expected` (car_id -> point)."""
+    seen = {}
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if node.divided:
+            children = (node.nw, node.ne, node.sw, node.se)
+            assert not node.points
+            assert node.count == sum(child.count for child in children)
+            assert node.count > node.capacity  # underfull subtrees are collapsed
+            stack.extend(children)
+        else:
+            assert node.count == len(node.points) == len(node.items) == len(node.keys)
+            for point, car, key in zip(node.points, node.items, node.keys):
+                assert node.boundary.contains(point)
+                assert tree.index[key] is node
+                assert car.car_id == key
+                seen[key] = point
+    assert seen == expected
+    assert len(tree.index) == len(expected) == len(tree)
+
+
+def _brute_knn(expected, query, k):
+    return sorted(math.hypot(x - query[0], y - query[1]) for x, y in expected.values())[:k]
+
+
+def _knn_distances(cars, query):
+    return [math.hypot(car.position[0] - query[0], car.position[1] - query[1]) for car in cars]
+
+
+def _point(rng, hotspots):
+    # Mostly clustered, with many cars on exactly the same spot
+    if rng.random() < 0.3:
+        return rng.choice(hotspots)
+    return (rng.uniform(0, SIZE), rng.uniform(0, SIZE))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_inserts_moves_and_removals(seed):
+    rng = random.Random(seed)
+    hotspots = [(rng.uniform(0, SIZE), rng.uniform(0, SIZE)) for _ in range(3)]
+    tree = Quadtree(Rectangle(0, 0, SIZE, SIZE), capacity=4)
+    cars = {}
+    expected = {}
+    next_id = 0
+    for step in range(1500):
+        op = rng.random()
+        if op < 0.4 or not expected:
+            point = _point(rng, hotspots)
+            car = Car(next_id, point)
+            next_id += 1
+            assert tree.insert(point, car)
+            cars[car.car_id] = car
+            expected[car.car_id] = point
+        elif op < 0.8:
+            car_id = rng.choice(sorted(expected))
+            x, y = expected[car_id]
+            if rng.random() < 0.5:
+                point = (min(max(x + rng.uniform(-1, 1), 0), SIZE - 1e-9),
+                         min(max(y + rng.uniform(-1, 1), 0), SIZE - 1e-9))
+            else:
+                point = _point(rng, hotspots)
+            assert tree.move(car_id, point)
+            cars[car_id].position = point
+            expected[car_id] = point
+        else:
+            car_id = rng.choice(sorted(expected))
+            assert tree.remove_car(car_id)
+            del expected[car_id]
+            assert not tree.remove_car(car_id)
+        if step % 100 == 0:
+            _check(tree, expected)
+            query = (rng.uniform(0, SIZE), rng.uniform(0, SIZE))
+            found = tree.find_k_nearest_cars(query, k=7)
+            assert _knn_distances(found, query) == pytest.approx(_brute_knn(expected, query, 7))
+    _check(tree, expected)
+
+    # Emptying the tree collapses it back to a single leaf
+    for car_id in list(expected):
+        tree.remove_car(car_id)
+    assert not tree.divided and len(tree) == 0 and not tree.index
+
+
+def test_move_outside_boundary_removes():
+    tree = Quadtree(Rectangle(0, 0, 10, 10))
+    car = Car(1, (1, 1))
+    tree.insert(car.position, car)
+    assert not tree.move(1, (20, 20))
+    assert 1 not in tree
+    with pytest.raises(KeyError):
+        tree.move(1, (2, 2))
+
+
+def test_coincident_points_and_duplicate_ids():
+    tree = Quadtree(Rectangle(0, 0, 10, 10), capacity=2, max_depth=6)
+    cars = [Car(i, (5.0, 5.0)) for i in range(20)]
+    for car in cars:
+        tree.insert(car.position, car)
+    _check(tree, {car.car_id: car.position for car in cars})
+    assert len(tree.find_k_nearest_cars((5, 5), k=20)) == 20
+    with pytest.raises(ValueError):
+        tree.insert((1, 1), cars[0])
+
+
+@pytest.mark.parametrize("capacity", [1, 4, 16])
+def test_bulk_load_matches_incremental_inserts(capacity):
+    rng = random.Random(capacity)
+    hotspots = [(50.0, 50.0)]
+    cars = [Car(i, _point(rng, hotspots)) for i in range(800)]
+    boundary = Rectangle(0, 0, SIZE, SIZE)
+    bulk = Quadtree.bulk_load(boundary, [car.position for car in cars], cars, capacity=capacity)
+    incremental = Quadtree(boundary, capacity=capacity)
+    for car in cars:
+        incremental.insert(car.position, car)
+    expected = {car.car_id: car.position for car in cars}
+    _check(bulk, expected)
+    packed = bulk.pack()
+    for _ in range(50):
+        query = (rng.uniform(-10, SIZE + 10), rng.uniform(-10, SIZE + 10))
+        k = rng.randint(1, 12)
+        want = _brute_knn(expected, query, k)
+        for tree in (bulk, incremental, packed):
+            assert _knn_distances(tree.find_k_nearest_cars(query, k=k), query) == pytest.approx(want)
+    # A bulk-loaded tree keeps working under updates
+    for car in cars[:400]:
+        bulk.remove_car(car.car_id)
+        del expected[car.car_id]
+    _check(bulk, expected)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_filtered_knn_matches_brute_force(seed):
+    rng = random.Random(seed)
+    cars = [Car(i, _point(rng, [(20.0, 70.0)])) for i in range(600)]
+    free = {car.car_id for car in cars if rng.random() < 0.3}
+    tree = Quadtree(Rectangle(0, 0, SIZE, SIZE), capacity=4)
+    for car in cars:
+        tree.insert(car.position, car)
+    packed = tree.pack()
+
+    def available(car):
+        return car.car_id in free
+
+    for _ in range(100):
+        query = (rng.uniform(0, SIZE), rng.uniform(0, SIZE))
+        k = rng.randint(1, 10)
+        radius = rng.choice([None, rng.uniform(1, 30)])
+        want = sorted(d for d in _knn_distances([c for c in cars if c.car_id in free], query)
+                      if radius is None or d <= radius)[:k]
+        for index in (tree, packed):
+            found = index.find_k_nearest_cars(query, k=k, predicate=available, max_radius=radius)
+            assert all(car.car_id in free for car in found)
+            assert _knn_distances(found, query) == pytest.approx(want)
+        points = tree.find_k_nearest(query, k=k, max_radius=radius)
+        want = sorted(d for d in _knn_distances(cars, query) if radius is None or d <= radius)[:k]
+        assert [math.hypot(x - query[0], y - query[1]) for x, y in points] == pytest.approx(want)
@@ -0,0 +1,48 @@
+import math
+
+import pytest
+
+import replications
+from replications import SUMMARY_METRICS, replication_seeds, run_replication, summarize, sweep
+
+
+def test_summarize_uses_student_t_for_small_samples():
+    s = summarize([1, 2, 3, 4, 5], confidence=0.95)
+    half_width = 2.776 * math.sqrt(2.5) / math.sqrt(5)
+    assert s["n"] == 5 and s["mean"] == 3.0
+    assert s["std"] == pytest.approx(math.sqrt(2.5))
+    assert (s["ci_low"], s["ci_high"]) == pytest.approx((3 - half_width, 3 + half_width))
+    assert (s["p5"], s["p50"], s["p95"]) == pytest.approx((1.2, 3.0, 4.8))
+
+    large = summarize(range(100), confidence=0.99)
+    assert large["ci_high"] - large["mean"] == pytest.approx(2.576 * large["std"] / 10)
+    single = summarize([7.0])
+    assert single["std"] == 0.0 and math.isinf(single["ci_high"])
+
+
+def test_replication_seeds_are_reproducible_and_distinct():
+    seeds = replication_seeds(4, 10)
+    assert seeds == replication_seeds(4, 10)
+    assert len(set(seeds)) == 10
+    assert replication_seeds(5, 10) != seeds
+
+
+def test_sweep_merges_replications(city):
+    results = sweep(map_file=city.map_file, fleet_sizes=(10, 20), mean_arrival_times=(0.5,),
+                    replications=3, max_time=30, base_seed=1, workers=1)
+    assert [(r["fleet_size"], r["mean_arrival_time"]) for r in results] == [(10, 0.5), (20, 0.5)]
+
+    # Each point summarizes the same runs a worker would produce in-process
+    replications._init_worker(city.map_file, True)
+    seeds = replication_seeds(1, 3)
+    for point in results:
+        runs = [run_replication(dict(fleet_size=point["fleet_size"], mean_arrival_time=0.5,
+                                     max_time=30, seed=s)) for s in seeds]
+        for name in SUMMARY_METRICS:
+            if name != "dispatch_cpu_per_request":  # wall-clock dependent
+                expected = summarize([r[name] for r, _ in runs])
+                assert point["metrics"][name] == pytest.approx(expected, nan_ok=True), name
+        trips = sum(collector.wait_digest.count for _, collector in runs)
+        assert trips == sum(r["total_trips"] for r, _ in runs) > 0
+        waits = point["pooled_wait_time_percentiles"]
+        assert waits["p50"] <= waits["p90"] <= waits["p99"]
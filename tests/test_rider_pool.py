@@ -0,0 +1,67 @@
+import math
+import random
+
+import pytest
+
+from event_log import NullSink
+from generators import generate_fleet
+from rider import Rider
+from rider_pool import RiderPool
+from simulation import RideSharingSimulation
+
+
+def _distances(riders, point):
+    return [math.hypot(r.start_location[0] - point[0], r.start_location[1] - point[1]) for r in riders]
+
+
+@pytest.mark.parametrize("size", [10, 500])  # below and above the plain-scan limit
+def test_nearest_matches_brute_force(size):
+    rng = random.Random(size)
+    pool = RiderPool((0, 0, 100, 50), cells_per_side=16)
+    hotspot = (30.0, 20.0)
+    riders = [Rider(i, hotspot if rng.random() < 0.2 else (rng.uniform(0, 100), rng.uniform(0, 50)), (0, 0))
+              for i in range(size)]
+    for rider in riders:
+        pool.add(rider)
+    for rider in riders[::3]:
+        assert pool.remove(rider)
+        assert not pool.remove(rider)
+    waiting = [r for r in riders if r in pool]
+    assert len(pool) == len(waiting) == size - len(riders[::3])
+    for _ in range(100):
+        point = (rng.uniform(-20, 120), rng.uniform(-20, 70))
+        k = rng.randint(1, 12)
+        found = pool.nearest(point, k=k)
+        assert len(set(found)) == len(found)
+        assert all(r in pool for r in found)
+        assert _distances(found, point) == pytest.approx(sorted(_distances(waiting, point))[:k])
+    assert RiderPool((0, 0, 1, 1)).nearest((0.5, 0.5)) == []
+
+
+def _run(city, patience):
+    sim = RideSharingSimulation(max_time=60, map_file=city.map_file, trace_file=city.demand_file,
+                                event_log=NullSink(), rider_patience=patience)
+    sim.add_cars(generate_fleet(sim.graph, 10, 1))
+    sim.run()
+    return sim, sim.calculate_metrics()
+
+
+@pytest.mark.parametrize("patience", [0, 4.0, math.inf])
+def test_waiting_riders_are_served_or_give_up(city, patience):
+    sim, m = _run(city, patience)
+    dequeued = m["riders_queued"] - m["riders_abandoned"] - m["riders_waiting"]
+    assert m["riders_queued"] > 0
+    assert m["riders_waiting"] == len(sim.waiting)
+    assert m["abandonment_rate"] == pytest.approx(m["riders_abandoned"] / m["total_riders_generated"])
+    assert m["avg_queue_length"] <= m["max_queue_length"]
+    if patience == 0:
+        assert m["riders_abandoned"] == m["riders_queued"] and dequeued == 0
+        assert m["avg_queue_length"] == 0
+    else:
+        assert dequeued > 0  # freed cars took waiting riders
+    if patience == math.inf:
+        assert m["riders_abandoned"] == 0
+    else:
+        # Everyone still waiting asked for a car within the last `patience`
+        assert all(r.request_time > sim.max_time - patience for r in sim.waiting)
+        assert not sim.rider_timeouts.keys() - set(sim.waiting)
@@ -0,0 +1,90 @@
+import math
+import random
+
+import pytest
+
+from compact_graph import load_graph
+from dijkstra import dijkstra
+from generators import generate_map
+from routing import ALTEngine, CHEngine, DijkstraEngine, make_engine
+
+
+@pytest.fixture
+def grid(tmp_path):
+    filename = str(tmp_path / "grid.csv")
+    generate_map("grid", 100, filename, seed=3)
+    return load_graph(filename)
+
+
+def _edges(graph):
+    return [(u, v) for u in graph.adjacency_list for v, _ in graph.adjacency_list[u]]
+
+
+@pytest.mark.parametrize("name", ["dijkstra", "astar", "alt", "ch"])
+def test_engines_agree_with_dijkstra_after_weight_changes(grid, name):
+    rng = random.Random(0)
+    engine = make_engine(name, grid)
+    reference = DijkstraEngine(grid)
+    nodes = sorted(grid.adjacency_list)
+    edges = _edges(grid)
+    for _ in range(5):
+        batch = [(*rng.choice(edges), rng.choice([math.inf, rng.uniform(0.01, 0.5), rng.uniform(2, 20)]))
+                 for _ in range(4)]
+        engine.update_weights(batch)
+        for _ in range(40):
+            a, b = rng.choice(nodes), rng.choice(nodes)
+            assert engine.shortest_path(a, b)[1] == pytest.approx(reference.shortest_path(a, b)[1])
+            assert engine.etas(b, {a})[a] == pytest.approx(reference.etas(b, {a})[a])
+
+
+def test_ch_rebuilds_after_enough_stale_queries(grid):
+    engine = CHEngine(grid, rebuild_after=10)
+    reference = DijkstraEngine(grid)
+    u, v = _edges(grid)[0]
+    engine.update_weights([(u, v, 0.001)])
+    assert engine.stale
+    nodes = sorted(grid.adjacency_list)
+    for a in nodes[:12]:
+        assert engine.shortest_path(a, v)[1] == pytest.approx(reference.shortest_path(a, v)[1])
+    assert not engine.stale
+    assert engine.stats["rebuilds"] == 1
+    assert engine.shortest_path(u, v) == reference.shortest_path(u, v)
+
+
+def _path_cost(graph, path):
+    return sum(min(w for v, w in graph.adjacency_list[a] if v == b) for a, b in zip(path, path[1:]))
+
+
+@pytest.mark.parametrize("name", ["astar", "alt"])
+def test_goal_directed_search_with_asymmetric_weights(tmp_path, name):
+    filename = str(tmp_path / "geo.csv")
+    generate_map("geometric", 300, filename, seed=8)
+    graph = load_graph(filename)
+    rng = random.Random(1)
+    # One direction of a third of the roads is slower, so costs to and from
+    # a node differ and the reverse landmark tables matter
+    for u, v in _edges(graph):
+        if u < v and rng.random() < 0.3:
+            w = next(w for n, w in graph.adjacency_list[u] if n == v)
+            graph.set_edge_weight(u, v, w * rng.uniform(1.5, 4), directed=True)
+    engine = make_engine(name, graph)
+    reference = DijkstraEngine(graph)
+    nodes = sorted(graph.adjacency_list)
+    for _ in range(60):
+        a, b = rng.choice(nodes), rng.choice(nodes)
+        path, cost = engine.shortest_path(a, b)
+        assert cost == pytest.approx(reference.shortest_path(a, b)[1])
+        assert path[0] == a and path[-1] == b
+        assert _path_cost(graph, path) == pytest.approx(cost)
+    # Goal direction pays off: fewer nodes settled for the same answers
+    assert engine.stats["nodes_settled"] < reference.stats["nodes_settled"]
+
+
+def test_alt_heuristic_is_a_lower_bound(grid):
+    engine = ALTEngine(grid, num_landmarks=4)
+    assert len(engine.landmarks) == 4
+    target = sorted(grid.adjacency_list)[17]
+    h = engine._heuristic(target)
+    to_target, _ = dijkstra(grid, target, reverse=True)
+    for n, cost in to_target.items():
+        assert h(n) <= cost + 1e-9
@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+import pytest
+
+from service import DispatchService, run_load
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_requests_go_to_the_nearest_free_car(city):
+    async def scenario():
+        service = DispatchService(city.map_file, speed=0.0)
+        await service.start()
+        try:
+            assert await service.handle_message({"type": "car", "id": "near", "position": [1, 1]}) is None
+            await service.handle_message({"type": "car", "id": 2, "position": [12, 12]})
+            first = await service.handle_message({"type": "request", "id": 10, "start": [0, 0], "dest": [5, 5]})
+            second = await service.handle_message({"type": "request", "id": 11, "start": [0, 1], "dest": [5, 5]})
+            third = await service.handle_message({"type": "request", "start": [0, 2], "dest": [5, 5]})
+            # A busy car ignores position updates; its trip decides where it is
+            await service.handle_message({"type": "car", "id": "near", "position": [14, 0]})
+            info = await service.handle_message({"type": "info"})
+            stats = await service.handle_message({"type": "stats"})
+            with pytest.raises(ValueError, match="unknown message type"):
+                await service.handle_message({"type": "cancel"})
+            return service, first, second, third, info, stats
+        finally:
+            await service.close()
+
+    service, first, second, third, info, stats = _run(scenario())
+    assert (first["rider_id"], first["car_id"]) == (10, "near")
+    assert first["eta"] > 0 and first["pickup_time"] == pytest.approx(first["eta"])
+    assert (second["rider_id"], second["car_id"]) == (11, 2)
+    assert third["car_id"] is None and "eta" not in third
+    assert service.cars["near"].position != (14.0, 0.0)
+    assert info["cars"] == 2 and info["bounds"] == list(service.sim.bounds)
+    assert (stats["requests"], stats["matched"], stats["unmatched"]) == (3, 2, 1)
+    assert stats["free_cars"] == 0 and stats["latency"]["count"] == 3
+
+
+def test_trips_finish_on_the_service_clock(city):
+    async def scenario():
+        service = DispatchService(city.map_file, speed=2000.0, tick=0.01)
+        await service.start()
+        try:
+            await service.handle_message({"type": "car", "id": 1, "position": [3, 3]})
+            reply = await service.handle_message({"type": "request", "id": 1, "start": [4, 4], "dest": [10, 9]})
+            for _ in range(200):
+                stats = await service.stats()
+                if stats["completed_trips"]:
+                    break
+                await asyncio.sleep(0.01)
+            return reply, stats
+        finally:
+            await service.close()
+
+    reply, stats = _run(scenario())
+    assert reply["car_id"] == 1
+    assert stats["completed_trips"] == 1 and stats["free_cars"] == 1
+
+
+def test_tcp_protocol_and_load_generator(city):
+    async def scenario():
+        service = DispatchService(city.map_file, speed=10.0)
+        server = await service.serve_tcp(port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b'not json\n\n{"type": "request", "start": [0]}\n{"type": "info"}\n')
+            await writer.drain()
+            replies = [json.loads(await reader.readline()) for _ in range(3)]
+            writer.close()
+            await writer.wait_closed()
+            report = await run_load("127.0.0.1", port, rate=100.0, duration=0.3, cars=5, seed=1)
+            return replies, report
+        finally:
+            server.close()
+            await server.wait_closed()
+            await service.close()
+
+    replies, report = _run(scenario())
+    errors = [r for r in replies if r["type"] == "error"]
+    assert len(errors) == 2 and any("bad JSON" in r["message"] for r in errors)
+    assert [r["type"] for r in replies].count("info") == 1
+    server = report["server"]
+    assert report["requests"] > 0 and report["round_trip"]["count"] == report["requests"]
+    assert server["requests"] == server["matched"] + server["unmatched"] == report["requests"]
+    assert report["matched"] == server["matched"]
@@ -0,0 +1,56 @@
+import pytest
+
+from compact_graph import load_graph
+from event_log import NullSink
+from generators import generate_fleet
+from sharding import ShardLayout, run_sharded
+from simulation import RideSharingSimulation
+
+KEYS = ("total_trips", "total_riders_generated", "riders_assigned", "avg_wait_time",
+        "avg_trip_duration", "wait_time_percentiles", "rides_per_car", "driver_utilization")
+
+
+def test_layout_splits_bounds_into_regions():
+    layout = ShardLayout((0, 0, 30, 20), 6)
+    assert (layout.rows, layout.cols) == (2, 3)
+    assert layout.region_bounds(4) == (10, 10, 20, 20)
+    assert layout.shard_of((15, 15)) == 4
+    assert layout.shard_of((-5, 50)) == 3 and layout.shard_of((30, 20)) == 5  # clamped to the edge
+    assert layout.border_neighbour((10.5, 15), 4, margin=1.0) == 3
+    assert layout.border_neighbour((15, 10.2), 4, margin=1.0) == 1
+    assert layout.border_neighbour((15, 15), 4, margin=1.0) is None
+    assert ShardLayout((0, 0, 1, 1), 1).border_neighbour((0.5, 0.5), 0, margin=1.0) is None
+    with pytest.raises(ValueError):
+        ShardLayout((0, 0, 1, 1), 0)
+
+
+def _single(city, graph):
+    sim = RideSharingSimulation(max_time=60, map_file=city.map_file, trace_file=city.demand_file,
+                                graph=graph, event_log=NullSink())
+    sim.add_cars(generate_fleet(graph, 30, 1))
+    sim.run()
+    return sim.calculate_metrics()
+
+
+def test_one_shard_matches_single_process_run(city):
+    graph = load_graph(city.map_file)
+    sharded = run_sharded(generate_fleet(graph, 30, 1), shards=1, max_time=60, map_file=city.map_file,
+                          trace_file=city.demand_file)
+    single = _single(city, graph)
+    for key in KEYS:
+        assert sharded[key] == pytest.approx(single[key]), key
+
+
+def test_shards_split_the_trace_and_keep_every_car(city):
+    graph = load_graph(city.map_file)
+    fleet = generate_fleet(graph, 30, 1)
+    sharded = run_sharded(fleet, shards=4, max_time=60, map_file=city.map_file, trace_file=city.demand_file)
+    single = _single(city, graph)
+    assert sharded["shards"] == 4
+    assert sharded["total_riders_generated"] == single["total_riders_generated"]
+    assert sorted(sharded["rides_per_car"]) == sorted(car.car_id for car in fleet)
+    assert sum(sharded["rides_per_car"].values()) == sharded["total_trips"] > 0
+    assert sharded["total_trips"] <= sharded["riders_assigned"]
+    # Forwarded requests reach their neighbour at the next window, except
+    # those forwarded in the last one
+    assert 0 < sharded["riders_received"] <= sharded["riders_forwarded"]
@@ -0,0 +1,24 @@
+import random
+
+from spatial_index import GridIndex
+
+
+def _brute(coords, point):
+    return min(range(len(coords)), key=lambda i: ((coords[i][0] - point[0]) ** 2 + (coords[i][1] - point[1]) ** 2, i))
+
+
+def test_snap_points_matches_linear_scan_on_clustered_map():
+    rng = random.Random(1)
+    # A dense "downtown" cluster inside a sparse map
+    coords = [(rng.uniform(0, 100), rng.uniform(0, 100)) for _ in range(200)]
+    coords += [(50 + rng.uniform(0, 0.01), 50 + rng.uniform(0, 0.01)) for _ in range(2000)]
+    coords += [(10.0, 10.0), (10.0, 10.0)]  # coincident nodes: first one wins
+    index = GridIndex(range(len(coords)), coords)
+    points = [(rng.uniform(-5, 105), rng.uniform(-5, 105)) for _ in range(300)]
+    points += [(50.005, 50.005), (10.0, 10.0)]
+    expected = [_brute(coords, p) for p in points]
+    assert [index.nearest(p) for p in points] == expected
+    assert index.snap_points(points) == expected
+    # Tiny budget: one point per chunk, same answers
+    assert index.snap_points(points, max_candidates=1) == expected
+
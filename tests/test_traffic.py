@@ -0,0 +1,88 @@
+import math
+
+import pytest
+
+from compact_graph import load_graph
+from event_log import NullSink
+from generators import generate_fleet
+from routing import DijkstraEngine
+from simulation import RideSharingSimulation
+from traffic import schedule_traffic
+
+
+class CheckedSimulation(RideSharingSimulation):
+    """Compares every trip with a from-scratch plan after each traffic batch."""
+
+    def handle_edge_weights(self, changes, directed):
+        super().handle_edge_weights(changes, directed)
+        self.checks += check_trips(self)
+
+    def assign_car(self, car, car_node, rider, rider_node, eta):
+        self.matched.add(rider.id)
+        super().assign_car(car, car_node, rider, rider_node, eta)
+
+
+def _cost(graph, path):
+    return sum(min(w for n, w in graph.adjacency_list.get(a) if n == b) for a, b in zip(path, path[1:]))
+
+
+def check_trips(sim):
+    reference = DijkstraEngine(sim.graph)
+    checked = 0
+    for car in sim.cars:
+        if not car.trip_events:
+            continue
+        pickup, dropoff = car.trip_events
+        rider = dropoff.args[1]
+        i, t = sim.route_position(car)
+        route = car.route
+        if pickup.active:
+            p = route.index(rider.start_node, i)
+            best = reference.shortest_path(route[i], rider.start_node)[1]
+            assert _cost(sim.graph, route[i:p + 1]) == pytest.approx(best)
+            assert pickup.time == pytest.approx(t + best)
+            assert dropoff.time == pytest.approx(pickup.time + rider.trip_duration)
+            ride = reference.shortest_path(rider.start_node, rider.dest_node)[1]
+            if ride < math.inf:  # an unreachable destination keeps its old plan
+                assert rider.trip_duration == pytest.approx(ride)
+                assert _cost(sim.graph, route[p:]) == pytest.approx(ride)
+        else:
+            best = reference.shortest_path(route[i], rider.dest_node)[1]
+            if best < math.inf:
+                assert route[-1] == rider.dest_node
+                assert _cost(sim.graph, route[i:]) == pytest.approx(best)
+                assert dropoff.time == pytest.approx(t + best)
+        checked += 1
+    return checked
+
+
+def _run(city, routing, path_cache_size=10000, all_pairs_max_nodes=0, closures=False):
+    sim = CheckedSimulation(max_time=120, map_file=city.map_file, graph=load_graph(city.map_file),
+                            trace_file=city.demand_file, event_log=NullSink(), routing=routing,
+                            path_cache_size=path_cache_size, all_pairs_max_nodes=all_pairs_max_nodes,
+                            rider_patience=20)
+    sim.checks = 0
+    sim.matched = set()
+    sim.add_cars(generate_fleet(sim.graph, 30, 1))
+    schedule_traffic(sim, city.closures_file if closures else city.traffic_file)
+    sim.run()
+    return sim
+
+
+@pytest.mark.parametrize("routing, path_cache_size, all_pairs_max_nodes", [
+    ("dijkstra", 0, 0), ("dijkstra", 10000, 0), ("dijkstra", 10000, 1000), ("alt", 10000, 0), ("ch", 10000, 0),
+])
+def test_repaired_trips_match_fresh_plans(city, routing, path_cache_size, all_pairs_max_nodes):
+    sim = _run(city, routing, path_cache_size, all_pairs_max_nodes)
+    metrics = sim.calculate_metrics()
+    assert sim.checks > 100
+    assert metrics["edge_updates"] == 24  # batches every 5 time units up to max_time
+    assert metrics["trips_rerouted"] > 0
+
+
+def test_reassigned_riders_are_counted_once(city):
+    sim = _run(city, "dijkstra", closures=True)
+    metrics = sim.calculate_metrics()
+    assert metrics["trips_reassigned"] > 0
+    assert metrics["riders_assigned"] == len(sim.matched)
+    assert sim.metrics.assigned == len(sim.matched)
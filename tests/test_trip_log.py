@@ -0,0 +1,47 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from trip_log import TripLog
+
+
+def _fill(log, trips):
+    for trip in trips:
+        log.append(*trip)
+    return log
+
+
+def test_columns_grow_and_match_rows():
+    trips = [(i, i % 3, 0.5 * i, 2.0 + i, 10.0 + i) for i in range(10)]
+    log = _fill(TripLog(capacity=4), trips)
+    assert len(log) == 10
+    assert log.column("rider_id").dtype == np.int64
+    assert log.column("wait_time").tolist() == [0.5 * i for i in range(10)]
+    assert log.rows()[3] == {"rider_id": 3, "car_id": 0, "wait_time": 1.5,
+                             "trip_duration": 5.0, "completion_time": 13.0}
+    assert log.totals_by("car_id", "trip_duration") == {
+        0: pytest.approx(2 + 5 + 8 + 11), 1: pytest.approx(3 + 6 + 9), 2: pytest.approx(4 + 7 + 10)}
+    assert TripLog().totals_by("car_id", "trip_duration") == {}
+
+
+def test_non_integer_ids_switch_to_object_columns():
+    log = _fill(TripLog(capacity=2), [(1, 7, 1.0, 1.0, 1.0), ("trace-2", "cab-a", 2.0, 3.0, 4.0),
+                                      (3, "cab-a", 1.0, 2.0, 5.0)])
+    assert log.column("rider_id").dtype == object
+    assert log.column("rider_id").tolist() == [1, "trace-2", 3]
+    assert log.totals_by("car_id", "trip_duration") == {7: 1.0, "cab-a": 5.0}
+    # bools are not ids
+    flagged = _fill(TripLog(), [(True, 1, 0.0, 0.0, 0.0)])
+    assert flagged.column("rider_id").dtype == object
+
+
+def test_extend_and_pickle():
+    ints = _fill(TripLog(capacity=2), [(i, i, 1.0, 1.0, float(i)) for i in range(3)])
+    named = _fill(TripLog(), [("r", "c", 2.0, 2.0, 9.0)])
+    ints.extend(named)
+    assert [row["car_id"] for row in ints.rows()] == [0, 1, 2, "c"]
+    copy = pickle.loads(pickle.dumps(ints))
+    assert copy.rows() == ints.rows()
+    copy.append(5, 5, 0.0, 0.0, 10.0)
+    assert len(copy) == 5 and len(ints) == 4
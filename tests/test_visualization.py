@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from events import EventQueue
+from graph import Graph
+from visualization import FrameStream
+
+MAP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "map.csv")
+
+
+@pytest.fixture(scope="module")
+def graph():
+    graph = Graph()
+    graph.load_map_data(MAP_FILE)
+    return graph
+
+
+def _write_frames(stream, count):
+    xs, ys = np.array([1.0, 3.0]), np.array([0.5, 2.0])
+    for i in range(count):
+        stream.write(float(i), xs, ys, np.array([i % 2, 1]))
+
+
+def test_gif_frames_are_written_on_close(graph, tmp_path):
+    target = str(tmp_path / "run.gif")
+    stream = FrameStream(target, graph, size=(2, 2), dpi=40)
+    _write_frames(stream, 5)
+    stream.close()
+    with Image.open(target) as gif:
+        assert gif.n_frames == 5
+        assert gif.size == (80, 80)
+
+
+class _Sim:
+    # Just what attach() looks at
+    def __init__(self, max_time):
+        self.max_time = max_time
+        self.current_time = 0.0
+        self.events = EventQueue()
+
+
+def test_gif_frame_cap_is_checked_before_the_run(graph, tmp_path):
+    stream = FrameStream(str(tmp_path / "run.gif"), graph, interval=0.1, max_gif_frames=11, size=(2, 2), dpi=40)
+    stream.attach(_Sim(1.0))  # frames at 0, 0.1, ..., 1.0
+    with pytest.raises(ValueError, match="needs 12 GIF frames, more than 11"):
+        FrameStream(str(tmp_path / "run.gif"), graph, interval=0.1, max_gif_frames=11).attach(_Sim(1.1))
+
+
+def test_gif_frames_past_the_cap_are_dropped(graph, tmp_path, capsys):
+    target = str(tmp_path / "run.gif")
+    stream = FrameStream(target, graph, max_gif_frames=3, size=(2, 2), dpi=40)
+    _write_frames(stream, 5)
+    stream.close()
+    with Image.open(target) as gif:
+        assert gif.n_frames == 3
+    assert "dropped the last 2 frames" in capsys.readouterr().err
+
+
+def test_png_frames(graph, tmp_path):
+    target = str(tmp_path / "frames")
+    stream = FrameStream(target, graph, size=(2, 2), dpi=40)
+    _write_frames(stream, 3)
+    stream.close()
+    assert sorted(os.listdir(target)) == ["frame_00000.png", "frame_00001.png", "frame_00002.png"]
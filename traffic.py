@@ -0,0 +1,51 @@
+# traffic.py
+# Timed edge weight changes (congestion, road closures) for
+# RideSharingSimulation, read from a JSONL file with one batch per line:
+#
+#     {"time": 30.0, "edges": [["A", "B", 6.0], ["B", "C", null]]}
+#
+# Each edge entry is [start, end, weight] with the map's node ids; a null
+# weight closes the road. Edges change in both directions unless the line
+# has "directed": true. Batches become "edge_weights" events (see
+# RideSharingSimulation.schedule_edge_weights).
+import json
+import math
+
+
+def _node_lookup(graph):
+    # Original node id -> graph node (CompactGraph interns ids to integers)
+    if hasattr(graph, "node_ids"):
+        index = {name: i for i, name in enumerate(graph.node_ids)}
+        return index.__getitem__
+    return lambda name: name
+
+
+def read_traffic(filename, graph):
+    """
+    The batches in a traffic file as (time, [(start, end, weight)], directed)
+    tuples in time order, with node ids resolved for graph.
+    """
+    node = _node_lookup(graph)
+    batches = []
+    with open(filename, 'r') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                when = float(record["time"])
+                changes = [(node(u), node(v), math.inf if w is None else float(w))
+                           for u, v, w in record["edges"]]
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                raise ValueError(f"{filename}:{line_no}: bad traffic record ({e})") from e
+            batches.append((when, changes, bool(record.get("directed", False))))
+    batches.sort(key=lambda batch: batch[0])
+    return batches
+
+
+def schedule_traffic(sim, filename):
+    """Schedule every batch of a traffic file on sim; returns how many."""
+    batches = read_traffic(filename, sim.graph)
+    for when, changes, directed in batches:
+        sim.schedule_edge_weights(when, changes, directed)
+    return len(batches)
@@ -0,0 +1,88 @@
+# trip_log.py
+# Columnar record of completed trips. Each trip adds one entry to five
+# NumPy columns (about 40 bytes) instead of a dict plus a tuple per trip.
+import numpy as np
+
+
+class TripLog:
+    """
+    Append-only table of completed trips with one growable NumPy array per
+    field. Integer id columns switch to object dtype if a non-integer id
+    (e.g. a string rider id from a trace) is ever appended.
+    """
+
+    FIELDS = (("rider_id", np.int64), ("car_id", np.int64), ("wait_time", np.float64),
+              ("trip_duration", np.float64), ("completion_time", np.float64))
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in self.FIELDS}
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, needed):
+        capacity = max(needed, 2 * len(self.columns["rider_id"]))
+        for name, old in self.columns.items():
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            self.columns[name] = new
+
+    def _store(self, name, value):
+        column = self.columns[name]
+        if column.dtype == np.int64 and not (isinstance(value, (int, np.integer))
+                                            and not isinstance(value, bool)):
+            column = self.columns[name] = column.astype(object)
+        column[self.size] = value
+
+    def append(self, rider_id, car_id, wait_time, trip_duration, completion_time):
+        if self.size == len(self.columns["rider_id"]):
+            self._grow(self.size + 1)
+        self._store("rider_id", rider_id)
+        self._store("car_id", car_id)
+        self.columns["wait_time"][self.size] = wait_time
+        self.columns["trip_duration"][self.size] = trip_duration
+        self.columns["completion_time"][self.size] = completion_time
+        self.size += 1
+
+    def extend(self, other):
+        # Append every trip of another log (e.g. merging shards)
+        if self.size + other.size > len(self.columns["rider_id"]):
+            self._grow(self.size + other.size)
+        for name, column in self.columns.items():
+            values = other.column(name)
+            if column.dtype != values.dtype:
+                column = self.columns[name] = column.astype(object)
+            column[self.size:self.size + other.size] = values
+        self.size += other.size
+
+    def column(self, name):
+        """View of one field for the trips logged so far."""
+        return self.columns[name][:self.size]
+
+    def totals_by(self, key, value):
+        """{key value: sum of value} over all trips, e.g. busy time per car."""
+        if not self.size:
+            return {}
+        if self.columns[key].dtype == object:
+            # Mixed ids (e.g. trace strings and generated ints) do not sort
+            totals = {}
+            for k, v in zip(self.column(key).tolist(), self.column(value).tolist()):
+                totals[k] = totals.get(k, 0.0) + v
+            return totals
+        keys, inverse = np.unique(self.column(key), return_inverse=True)
+        sums = np.bincount(inverse, weights=self.column(value), minlength=len(keys))
+        return dict(zip(keys.tolist(), sums.tolist()))
+
+    def rows(self):
+        """Trips as dicts, in the layout of the old trip_data list."""
+        names = [name for name, _ in self.FIELDS]
+        columns = [self.column(name).tolist() for name in names]
+        return [dict(zip(names, values)) for values in zip(*columns)]
+
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns.values())
+
+    def __getstate__(self):
+        # Only the filled part is pickled
+        return {"size": self.size, "columns": {name: self.column(name).copy() for name in self.columns}}
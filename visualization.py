@@ -0,0 +1,254 @@
+# visualization.py
+# Rendering for the simulation: the end-of-run summary figure and optional
+# fleet-state frames streamed while the simulation runs.
+#
+# Figures are drawn on the Agg canvas directly (no pyplot), so nothing
+# blocks or needs a display on headless servers. The road map is one
+# LineCollection holding each undirected edge once; maps with more edges
+# than max_edges are decimated first. Frames reuse a cached background of
+# the static map and only redraw the car markers.
+import os
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+from matplotlib.image import imsave
+
+# Upper bound on drawn road segments; beyond a few hundred thousand the
+# lines overlap at any sensible resolution anyway
+MAX_EDGES = 200_000
+
+# A GIF is written in one go on close(), so its frames are held in memory
+# (palettised, about 0.6 MB each at 800x800); longer runs should stream
+# PNG frames or a video instead
+MAX_GIF_FRAMES = 300
+
+
+def edge_segments(graph):
+    """Every undirected edge once, as an (m, 2, 2) array of endpoint coordinates."""
+    if hasattr(graph, "offsets"):
+        # CompactGraph: edges straight from the CSR arrays
+        xs, ys = np.asarray(graph.xs), np.asarray(graph.ys)
+        degree = np.diff(np.asarray(graph.offsets))
+        u = np.repeat(np.arange(len(xs)), degree)
+        v = np.asarray(graph.targets, dtype=np.int64)
+    else:
+        index = {node: i for i, node in enumerate(graph.node_coordinates)}
+        coords = np.array(list(graph.node_coordinates.values()), dtype=float).reshape(-1, 2)
+        xs, ys = coords[:, 0], coords[:, 1]
+        pairs = [(index[a], index[b]) for a, neighbors in graph.adjacency_list.items()
+                 for b, _ in neighbors]
+        u, v = (np.array(side, dtype=np.int64) for side in zip(*pairs)) if pairs else (
+            np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+    # Both directions of an edge collapse to one (min, max) pair
+    lo, hi = np.minimum(u, v), np.maximum(u, v)
+    keys = np.unique(lo * len(xs) + hi)
+    lo, hi = keys // max(len(xs), 1), keys % max(len(xs), 1)
+    return np.stack([np.column_stack((xs[lo], ys[lo])), np.column_stack((xs[hi], ys[hi]))], axis=1)
+
+
+def decimate_segments(segments, max_edges=MAX_EDGES, resolution=2000, seed=0):
+    """
+    Thin a segment array for drawing. Segments whose midpoints share a cell
+    of a resolution x resolution raster and have a similar heading look
+    identical, so only one of them is kept; if more than max_edges remain,
+    a fixed random sample is drawn.
+    """
+    if len(segments) <= max_edges:
+        return segments
+    mid = segments.mean(axis=1)
+    low, high = mid.min(axis=0), mid.max(axis=0)
+    cell = np.floor((mid - low) / np.maximum(high - low, 1e-12) * (resolution - 1)).astype(np.int64)
+    delta = segments[:, 1] - segments[:, 0]
+    heading = ((np.arctan2(delta[:, 1], delta[:, 0]) % np.pi) / np.pi * 8).astype(np.int64) % 8
+    key = (cell[:, 0] * resolution + cell[:, 1]) * 8 + heading
+    _, first = np.unique(key, return_index=True)
+    segments = segments[np.sort(first)]
+    if len(segments) > max_edges:
+        keep = np.random.default_rng(seed).choice(len(segments), max_edges, replace=False)
+        segments = segments[np.sort(keep)]
+    return segments
+
+
+def draw_map(ax, graph, max_edges=MAX_EDGES, color="lightgray", linewidth=0.5):
+    # The road network as a single LineCollection; returns the segment count drawn
+    segments = decimate_segments(edge_segments(graph), max_edges)
+    ax.add_collection(LineCollection(segments, colors=color, linewidths=linewidth))
+    min_x, min_y, max_x, max_y = graph.get_bounds()
+    pad_x, pad_y = 0.02 * (max_x - min_x) or 1.0, 0.02 * (max_y - min_y) or 1.0
+    ax.set_xlim(min_x - pad_x, max_x + pad_x)
+    ax.set_ylim(min_y - pad_y, max_y + pad_y)
+    return len(segments)
+
+
+def summary_text(metrics, max_cars=20):
+    # Right-hand panel of the summary figure; long fleets are truncated
+    lines = ["SIMULATION RESULTS", "",
+             f"Total Riders: {metrics['total_riders_generated']}",
+             f"Completed Trips: {metrics['total_trips']}",
+             f"Avg Wait Time: {metrics['avg_wait_time']:.2f}",
+             f"Avg Trip Duration: {metrics['avg_trip_duration']:.2f}",
+             "", "RIDES PER CAR:"]
+    rides = list(metrics['rides_per_car'].items())
+    lines += [f"Car {car_id}: {n} rides" for car_id, n in rides[:max_cars]]
+    if len(rides) > max_cars:
+        lines.append(f"... {len(rides) - max_cars} more cars")
+    lines += ["", "DRIVER UTILIZATION:"]
+    util = list(metrics['driver_utilization'].items())
+    lines += [f"Car {car_id}: {u:.2%}" for car_id, u in util[:max_cars]]
+    if len(util) > max_cars:
+        lines.append(f"... {len(util) - max_cars} more cars (mean {np.mean([u for _, u in util]):.2%})")
+    return "\n".join(lines)
+
+
+def summary_figure(graph, car_xy, metrics, max_edges=MAX_EDGES):
+    """Map with final car positions next to the metrics summary, on an Agg canvas."""
+    fig = Figure(figsize=(15, 6))
+    FigureCanvasAgg(fig)
+    ax1, ax2 = fig.subplots(1, 2)
+
+    draw_map(ax1, graph, max_edges)
+    ax1.scatter(car_xy[:, 0], car_xy[:, 1], c='red', s=100 if len(car_xy) <= 200 else 4,
+                marker='s', label='Cars')
+    ax1.set_title('Final Car Locations')
+    ax1.set_xlabel('X Coordinate')
+    ax1.set_ylabel('Y Coordinate')
+    ax1.legend()
+    ax1.grid(True)
+
+    ax2.text(0.1, 0.9, summary_text(metrics), fontsize=10, verticalalignment='top',
+             fontfamily='monospace', transform=ax2.transAxes)
+    ax2.set_xlim(0, 1)
+    ax2.set_ylim(0, 1)
+    ax2.axis('off')
+    fig.tight_layout()
+    return fig
+
+
+class FrameRenderer:
+    """
+    Fleet-state frames over a static map. The map is drawn once and its
+    pixels cached; each frame restores them and draws only the car markers
+    and the clock, so a frame costs about the same on a 1M-edge map as on
+    a small one.
+    """
+
+    def __init__(self, graph, size=(8, 8), dpi=100, max_edges=MAX_EDGES):
+        self.fig = Figure(figsize=size, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot(1, 1, 1)
+        draw_map(self.ax, graph, max_edges)
+        self.ax.set_aspect('equal', adjustable='box')
+        self.ax.set_xticks([])
+        self.ax.set_yticks([])
+        self.busy = self.ax.scatter([], [], c='tab:red', s=12, marker='s', animated=True)
+        self.free = self.ax.scatter([], [], c='tab:green', s=12, marker='s', animated=True)
+        self.clock = self.ax.text(0.02, 0.98, "", transform=self.ax.transAxes, va='top',
+                                  fontfamily='monospace', animated=True)
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+
+    def render(self, time, xs, ys, available):
+        """Draw one frame; returns it as an (h, w, 4) uint8 RGBA array."""
+        self.canvas.restore_region(self.background)
+        self.busy.set_offsets(np.column_stack((xs[~available], ys[~available])))
+        self.free.set_offsets(np.column_stack((xs[available], ys[available])))
+        self.clock.set_text(f"t = {time:8.2f}   free {int(available.sum())}/{len(xs)}")
+        for artist in (self.busy, self.free, self.clock):
+            self.ax.draw_artist(artist)
+        return np.asarray(self.canvas.buffer_rgba())
+
+
+class FrameStream:
+    """
+    Frames written while a simulation runs, one every `interval` of
+    simulated time, to:
+
+      a directory      numbered PNG files
+      name.mp4/.webm   a video piped to ffmpeg frame by frame
+      name.gif         an animated GIF (frames are held until close, at
+                       most max_gif_frames of them)
+
+    attach() schedules the frames as events on the simulation's queue; a
+    GIF run that would need more than max_gif_frames frames is rejected
+    there, before the simulation starts.
+    """
+
+    def __init__(self, target, graph, interval=1.0, fps=10, max_gif_frames=MAX_GIF_FRAMES,
+                 **renderer_kwargs):
+        self.target = target
+        self.interval = interval
+        self.fps = fps
+        self.max_gif_frames = max_gif_frames
+        self.renderer = FrameRenderer(graph, **renderer_kwargs)
+        self.frames = 0
+        self.gif_frames = []
+        self.dropped = 0
+        self.ffmpeg = None
+        ext = os.path.splitext(target)[1].lower()
+        self.mode = {".mp4": "video", ".webm": "video", ".gif": "gif"}.get(ext, "png")
+        if self.mode == "png":
+            os.makedirs(target, exist_ok=True)
+
+    def attach(self, sim):
+        if self.mode == "gif":
+            needed = self.frames + int((sim.max_time - sim.current_time) / self.interval + 1e-9) + 1
+            if needed > self.max_gif_frames:
+                raise ValueError(f"{self.target}: the run needs {needed} GIF frames, more than "
+                                 f"{self.max_gif_frames}; raise the frame interval, or stream to a "
+                                 f"directory of PNGs or an .mp4")
+        self.sim = sim
+        sim.events.register("render_frame", self.handle_frame)
+        sim.events.schedule(sim.current_time, "render_frame")
+
+    def handle_frame(self):
+        sim = self.sim
+        n = len(sim.fleet)
+        self.write(sim.current_time, sim.fleet.x[:n], sim.fleet.y[:n], sim.fleet.available[:n])
+        if sim.current_time + self.interval <= sim.max_time:
+            sim.events.schedule(sim.current_time + self.interval, "render_frame")
+
+    def write(self, time, xs, ys, available):
+        if self.mode == "gif" and len(self.gif_frames) >= self.max_gif_frames:
+            self.dropped += 1  # only without attach()'s check; reported on close
+            return
+        rgba = self.renderer.render(time, xs, ys, available.astype(bool))
+        if self.mode == "png":
+            imsave(os.path.join(self.target, f"frame_{self.frames:05d}.png"), rgba)
+        elif self.mode == "gif":
+            from PIL import Image  # installed with matplotlib
+            # Palettised now (as the GIF stores it): a third of the RGB size
+            frame = Image.fromarray(np.ascontiguousarray(rgba[:, :, :3]))
+            self.gif_frames.append(frame.convert("P", palette=Image.Palette.ADAPTIVE))
+        else:
+            if self.ffmpeg is None:
+                self.ffmpeg = self._start_ffmpeg(rgba.shape[1], rgba.shape[0])
+            self.ffmpeg.stdin.write(rgba.tobytes())
+        self.frames += 1
+
+    def _start_ffmpeg(self, width, height):
+        executable = shutil.which("ffmpeg")
+        if executable is None:
+            raise RuntimeError(f"ffmpeg is needed to write {self.target}; stream to a directory or .gif instead")
+        return subprocess.Popen([executable, "-y", "-loglevel", "error", "-f", "rawvideo",
+                                 "-pix_fmt", "rgba", "-s", f"{width}x{height}", "-r", str(self.fps),
+                                 "-i", "-", "-pix_fmt", "yuv420p", self.target],
+                                stdin=subprocess.PIPE)
+
+    def close(self):
+        if self.ffmpeg is not None:
+            self.ffmpeg.stdin.close()
+            self.ffmpeg.wait()
+            self.ffmpeg = None
+        if self.gif_frames:
+            images = self.gif_frames
+            images[0].save(self.target, save_all=True, append_images=images[1:],
+                           duration=int(1000 / self.fps), loop=0)
+            self.gif_frames = []
+        if self.dropped:
+            print(f"{self.target}: dropped the last {self.dropped} frames past max_gif_frames",
+                  file=sys.stderr)